@@ -0,0 +1,438 @@
+"""
+Нагрузочный бенчмарк лент, страницы поста и записи.
+
+Заполняет отдельную БД SQLite командой seed (по умолчанию 100 тыс.
+пользователей и 1 млн постов; подписки и авторство распределены
+по степенному закону, тексты — Faker), затем гоняет сценарии index,
+group_posts, profile, post_view, follow_index, new_post и add_comment
+через тестовый клиент Django, через локальный WSGI-сервер (поток
+на соединение) или через ASGI-точку входа yatube.asgi за минимальным
+HTTP-сервером на asyncio (--asgi, Django в пуле из ASGI_THREADS
+потоков). Для каждого сценария считает p50/p95/p99, запросы
+в секунду, SQL-запросов на ответ и пиковый RSS процесса, пишет всё
+в JSON и при --baseline падает с кодом 1, если результат хуже прошлого.
+
+    python benchmarks/load.py --users 1000 --posts 10000 --requests 200 \\
+        --concurrency 4 --output after.json --baseline before.json
+    python benchmarks/load.py --wsgi --concurrency 200 --requests 2000
+    python benchmarks/load.py --asgi --concurrency 200 --requests 2000
+
+Заполненная БД переиспользуется между запусками (--db, --reseed).
+"""
+import argparse
+import asyncio
+import http.client
+import json
+import os
+import platform
+import random
+import resource
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from http import HTTPStatus
+from socketserver import ThreadingMixIn
+from urllib.parse import unquote, urlencode
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.contrib.auth import get_user_model  # noqa: E402
+from django.core.management import call_command  # noqa: E402
+from django.core.wsgi import get_wsgi_application  # noqa: E402
+from django.db import DEFAULT_DB_ALIAS, connection, connections  # noqa: E402
+from django.test import Client  # noqa: E402
+from django.utils.crypto import get_random_string  # noqa: E402
+
+from posts.models import Follow, Group, Post  # noqa: E402
+from yatube.asgi import WsgiBridge  # noqa: E402
+
+User = get_user_model()
+
+DEFAULT_DB = os.path.join(tempfile.gettempdir(), 'yatube-bench.sqlite3')
+GROUPS = 50
+SCENARIOS = ('index', 'group_posts', 'profile', 'post_view', 'follow_index',
+             'new_post', 'add_comment')
+
+
+class Targets:
+    """Случайные, но существующие объекты для URL сценариев."""
+
+    def __init__(self, rng):
+        self.rng = rng
+        self.slugs = list(Group.objects.values_list('slug', flat=True))
+        self.posts = list(
+            Post.objects.order_by('?').values_list('pk', 'author__username')
+            [:1000])
+        self.readers = list(User.objects.filter(follower__isnull=False)
+                            .distinct().order_by('?')[:100])
+
+    def request(self, name):
+        """Метод, путь и данные запроса сценария."""
+        post_id, username = self.rng.choice(self.posts)
+        text = f'Нагрузочный текст {self.rng.random()}'
+        return {
+            'index': ('GET', '/', None),
+            'group_posts': ('GET', f'/group/{self.rng.choice(self.slugs)}/',
+                            None),
+            'profile': ('GET', f'/{username}/', None),
+            'post_view': ('GET', f'/{username}/{post_id}/', None),
+            'follow_index': ('GET', '/follow/', None),
+            'new_post': ('POST', '/new/', {'text': text}),
+            'add_comment': ('POST', f'/{username}/{post_id}/comment/',
+                            {'text': text}),
+        }[name]
+
+
+class QueryCounter:
+    """Считает SQL-запросы, кроме прагм настройки нового соединения."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        if not sql.startswith('PRAGMA'):
+            self.count += 1
+        return execute(sql, params, many, context)
+
+
+class ClientWorker:
+    """Запросы через django.test.Client в текущем потоке."""
+
+    def __init__(self, user):
+        self.client = Client()
+        self.client.force_login(user)
+
+    def send(self, method, path, data):
+        counter = QueryCounter()
+        with connection.execute_wrapper(counter):
+            if method == 'GET':
+                response = self.client.get(path)
+            else:
+                response = self.client.post(path, data)
+        return response.status_code, counter.count
+
+    def close(self):
+        connections.close_all()
+
+
+class CountingApplication:
+    """WSGI-приложение, отдающее число SQL-запросов в заголовке."""
+
+    def __init__(self, application):
+        self.application = application
+
+    def __call__(self, environ, start_response):
+        counter = QueryCounter()
+
+        def counting_start_response(status, headers, exc_info=None):
+            headers.append(('X-Bench-Queries', str(counter.count)))
+            return start_response(status, headers, exc_info)
+
+        with connection.execute_wrapper(counter):
+            return self.application(environ, counting_start_response)
+
+
+class ThreadingServer(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+class AsgiServer:
+    """
+    HTTP/1.1 без keep-alive на asyncio: ровно столько, сколько нужно
+    ServerWorker, чтобы гонять ASGI-приложение без uvicorn.
+    """
+
+    def __init__(self, application):
+        self.application = application
+        self.loop = asyncio.new_event_loop()
+        self.server = self.loop.run_until_complete(asyncio.start_server(
+            self.handle, '127.0.0.1', 0, backlog=1024))
+        self.server_address = self.server.sockets[0].getsockname()[:2]
+
+    def serve_forever(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def shutdown(self):
+        asyncio.run_coroutine_threadsafe(self.close(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+    async def close(self):
+        """Закрывает сокет и дожидается уже принятых соединений."""
+        self.server.close()
+        await asyncio.gather(*asyncio.all_tasks() - {asyncio.current_task()})
+
+    async def handle(self, reader, writer):
+        method, target, version = (
+            (await reader.readline()).decode('latin-1').split())
+        headers = []
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b''):
+                break
+            name, value = line.decode('latin-1').split(':', 1)
+            headers.append((name.strip().lower().encode('latin-1'),
+                            value.strip().encode('latin-1')))
+        length = int(dict(headers).get(b'content-length', 0))
+        body = await reader.readexactly(length)
+        path, _, query = target.partition('?')
+        messages = iter([{'type': 'http.request', 'body': body}])
+
+        async def receive():
+            return next(messages, {'type': 'http.disconnect'})
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                status = message['status']
+                writer.write(f'HTTP/1.1 {status} {HTTPStatus(status).phrase}'
+                             f'\r\n'.encode())
+                for name, value in message['headers']:
+                    writer.write(name + b': ' + value + b'\r\n')
+                writer.write(b'Connection: close\r\n\r\n')
+            else:
+                writer.write(message.get('body', b''))
+            await writer.drain()
+
+        scope = {'type': 'http', 'asgi': {'version': '3.0'},
+                 'http_version': version.split('/')[1], 'method': method,
+                 'scheme': 'http', 'path': unquote(path),
+                 'query_string': query.encode('latin-1'), 'root_path': '',
+                 'headers': headers,
+                 'client': writer.get_extra_info('peername')[:2],
+                 'server': self.server_address}
+        try:
+            await self.application(scope, receive, send)
+        finally:
+            writer.close()
+
+
+class ServerWorker:
+    """Запросы по HTTP к локальному WSGI-серверу."""
+
+    def __init__(self, user, address):
+        self.address = address
+        client = Client()
+        client.force_login(user)
+        self.csrf = get_random_string(64)
+        session = client.cookies[settings.SESSION_COOKIE_NAME].value
+        self.cookie = (f'{settings.SESSION_COOKIE_NAME}={session}; '
+                       f'{settings.CSRF_COOKIE_NAME}={self.csrf}')
+
+    def send(self, method, path, data):
+        headers = {'Cookie': self.cookie, 'X-CSRFToken': self.csrf}
+        body = None
+        if data is not None:
+            body = urlencode(data)
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        conn = http.client.HTTPConnection(*self.address)
+        try:
+            conn.request(method, path, body, headers)
+            response = conn.getresponse()
+            response.read()
+            return (response.status,
+                    int(response.getheader('X-Bench-Queries', 0)))
+        finally:
+            conn.close()
+
+    def close(self):
+        connections.close_all()
+
+
+def percentile(values, fraction):
+    index = int(round(fraction * (len(values) - 1)))
+    return values[min(len(values) - 1, index)]
+
+
+def run_scenario(name, targets, make_worker, requests, concurrency):
+    latencies, queries, errors = [], [], []
+    lock = threading.Lock()
+    per_worker = max(requests // concurrency, 1)
+
+    def work(user):
+        worker = make_worker(user)
+        try:
+            for _ in range(per_worker):
+                with lock:
+                    method, path, data = targets.request(name)
+                started = time.perf_counter()
+                status, count = worker.send(method, path, data)
+                elapsed = time.perf_counter() - started
+                with lock:
+                    latencies.append(elapsed)
+                    queries.append(count)
+                    if status >= 400:
+                        errors.append(status)
+        finally:
+            worker.close()
+
+    threads = [threading.Thread(target=work, args=(targets.readers[
+        number % len(targets.readers)],)) for number in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'errors': len(errors),
+        'rps': round(len(latencies) / elapsed, 1),
+        'mean_ms': round(statistics.mean(latencies) * 1000, 2),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+        'queries_per_request': round(statistics.mean(queries), 2),
+        'max_rss_mb': round(
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def regressions(results, baseline, tolerance):
+    """Сценарии, у которых p95 или число запросов выросли сверх допуска."""
+    found = []
+    for key in ('mode', 'concurrency', 'database'):
+        if results['meta'][key] != baseline['meta'].get(key):
+            sys.exit(f'Нельзя сравнивать: {key} {baseline["meta"].get(key)} '
+                     f'и {results["meta"][key]}')
+    for name, current in results['scenarios'].items():
+        previous = baseline.get('scenarios', {}).get(name)
+        if previous is None:
+            continue
+        if current['p95_ms'] > previous['p95_ms'] * (1 + tolerance):
+            found.append(f'{name}: p95 {previous["p95_ms"]} → '
+                         f'{current["p95_ms"]} мс')
+        if current['queries_per_request'] > previous['queries_per_request']:
+            found.append(f'{name}: SQL-запросов '
+                         f'{previous["queries_per_request"]} → '
+                         f'{current["queries_per_request"]}')
+    return found
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--db', default=DEFAULT_DB,
+                        help='файл БД SQLite для бенчмарка')
+    parser.add_argument('--reseed', action='store_true',
+                        help='заполнить БД заново')
+    parser.add_argument('--users', type=int, default=100000)
+    parser.add_argument('--posts', type=int, default=1000000)
+    parser.add_argument('--comments', type=int, default=200000)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS,
+                        default=list(SCENARIOS))
+    parser.add_argument('--requests', type=int, default=200,
+                        help='запросов на сценарий')
+    parser.add_argument('--concurrency', type=int, default=4)
+    server = parser.add_mutually_exclusive_group()
+    server.add_argument('--wsgi', action='store_true',
+                        help='через локальный WSGI-сервер, а не Client')
+    server.add_argument('--asgi', action='store_true',
+                        help='через yatube.asgi и сервер на asyncio')
+    parser.add_argument('--no-page-cache', action='store_true')
+    parser.add_argument('--output', help='куда записать результаты JSON')
+    parser.add_argument('--baseline', help='JSON прошлого запуска')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='допустимый рост p95, доля')
+    return parser.parse_args()
+
+
+def prepare_database(options):
+    connections.close_all()
+    connections.databases[DEFAULT_DB_ALIAS]['NAME'] = options.db
+    if options.reseed and os.path.exists(options.db):
+        os.remove(options.db)
+    call_command('migrate', verbosity=0)
+    if not Post.objects.exists():
+        started = time.perf_counter()
+        call_command('seed', users=options.users, groups=GROUPS,
+                     posts=options.posts, comments=options.comments,
+                     seed=options.seed, stdout=sys.stderr)
+        print(f'БД заполнена за {time.perf_counter() - started:.0f} с',
+              file=sys.stderr)
+
+
+def start_server(options):
+    """Локальный WSGI- или ASGI-сервер в фоновом потоке, если нужен."""
+    application = CountingApplication(get_wsgi_application())
+    if options.wsgi:
+        server = make_server('127.0.0.1', 0, application,
+                             server_class=ThreadingServer,
+                             handler_class=QuietHandler)
+    elif options.asgi:
+        server = AsgiServer(WsgiBridge(application,
+                                       max_workers=settings.ASGI_THREADS))
+    else:
+        return None
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    options = parse_args()
+    prepare_database(options)
+    if options.no_page_cache:
+        settings.PAGE_CACHE_TIMEOUT = 0
+    targets = Targets(random.Random(options.seed))
+    server = start_server(options)
+    if server is not None:
+
+        def make_worker(user):
+            return ServerWorker(user, server.server_address)
+    else:
+        make_worker = ClientWorker
+    results = {
+        'meta': {
+            'mode': ('wsgi' if options.wsgi
+                     else 'asgi' if options.asgi else 'client'),
+            'concurrency': options.concurrency,
+            'requests': options.requests,
+            'posts': Post.objects.count(),
+            'users': User.objects.count(),
+            'follows': Follow.objects.count(),
+            'page_cache': bool(settings.PAGE_CACHE_TIMEOUT),
+            'python': platform.python_version(),
+            'database': connection.vendor,
+        },
+        'scenarios': {},
+    }
+    try:
+        for name in options.scenarios:
+            results['scenarios'][name] = run_scenario(
+                name, targets, make_worker, options.requests,
+                options.concurrency)
+            print(name, json.dumps(results['scenarios'][name],
+                                   ensure_ascii=False))
+    finally:
+        if server is not None:
+            server.shutdown()
+    if options.output:
+        with open(options.output, 'w') as output:
+            json.dump(results, output, ensure_ascii=False, indent=2)
+    if options.baseline:
+        with open(options.baseline) as baseline:
+            found = regressions(results, json.load(baseline),
+                                options.tolerance)
+        for line in found:
+            print('Регрессия:', line, file=sys.stderr)
+        if found:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+"""
+Чтения лент в секунду при постоянной записи комментариев.
+
+Сравнивает SQLite в режиме rollback journal (как было до SQLITE_PRAGMAS)
+с WAL и прагмами из settings.SQLITE_PRAGMAS. Для каждого режима
+создаётся отдельный файл БД во временной папке, читатели в потоках
+открывают ленту и комментарии случайного поста, писатель добавляет
+комментарии с заданной частотой, как add_comment.
+
+    python benchmarks/sqlite_concurrency.py [--seconds 10] [--readers 4]
+                                            [--writes 20] [--posts 2000]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.contrib.auth import get_user_model  # noqa: E402
+from django.core.management import call_command  # noqa: E402
+from django.db import (DEFAULT_DB_ALIAS, OperationalError,  # noqa: E402
+                       connections, transaction)
+
+from posts.models import Comment, Group, Post  # noqa: E402
+
+User = get_user_model()
+
+MODES = {
+    'journal': {'journal_mode': 'delete', 'synchronous': 'full'},
+    'wal': settings.SQLITE_PRAGMAS,
+}
+
+
+def prepare(path, pragmas, posts):
+    connections.close_all()
+    settings.SQLITE_PRAGMAS = pragmas
+    connections.databases[DEFAULT_DB_ALIAS]['NAME'] = path
+    call_command('migrate', verbosity=0)
+    User.objects.bulk_create(
+        User(username=f'user{number}') for number in range(20))
+    users = list(User.objects.all())
+    group = Group.objects.create(title='Группа', slug='group',
+                                 description='Для нагрузки')
+    rng = random.Random(0)
+    Post.objects.bulk_create(
+        Post(author=rng.choice(users), group=group, text=f'Пост {number}')
+        for number in range(posts))
+    connections.close_all()
+
+
+def reader(stop, results):
+    rng = random.Random()
+    post_ids = list(Post.objects.values_list('pk', flat=True))
+    reads = errors = 0
+    try:
+        while not stop.is_set():
+            try:
+                list(Post.objects.feed()[:10])
+                list(Comment.objects.filter(post_id=rng.choice(post_ids))
+                     .select_related('author').order_by('created', 'id')[:50])
+                reads += 1
+            except OperationalError:
+                errors += 1
+    finally:
+        connections.close_all()
+    results.append(('read', reads, errors))
+
+
+def writer(stop, results, per_second):
+    rng = random.Random(1)
+    post_ids = list(Post.objects.values_list('pk', flat=True))
+    author = User.objects.first()
+    writes = errors = 0
+    started = time.monotonic()
+    try:
+        while not stop.is_set():
+            try:
+                with transaction.atomic():
+                    Comment.objects.create(post_id=rng.choice(post_ids),
+                                           author=author, text='Комментарий')
+                writes += 1
+            except OperationalError:
+                errors += 1
+            delay = started + (writes + errors) / per_second - time.monotonic()
+            if delay > 0:
+                stop.wait(delay)
+    finally:
+        connections.close_all()
+    results.append(('write', writes, errors))
+
+
+def run(seconds, readers, writes):
+    stop = threading.Event()
+    results = []
+    threads = [threading.Thread(target=reader, args=(stop, results))
+               for _ in range(readers)]
+    threads.append(threading.Thread(target=writer,
+                                    args=(stop, results, writes)))
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    totals = {'read': [0, 0], 'write': [0, 0]}
+    for kind, done, errors in results:
+        totals[kind][0] += done
+        totals[kind][1] += errors
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--writes', type=float, default=20,
+                        help='комментариев в секунду')
+    parser.add_argument('--posts', type=int, default=2000)
+    options = parser.parse_args()
+    with tempfile.TemporaryDirectory() as directory:
+        for mode, pragmas in MODES.items():
+            prepare(os.path.join(directory, f'{mode}.sqlite3'), pragmas,
+                    options.posts)
+            totals = run(options.seconds, options.readers, options.writes)
+            reads, read_errors = totals['read']
+            writes, write_errors = totals['write']
+            print(f'{mode:8} {reads / options.seconds:9.1f} чтений/с  '
+                  f'{writes / options.seconds:6.1f} записей/с  '
+                  f'ошибок: {read_errors + write_errors}')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,35 +1,74 @@
 from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.db.models import Q
 
 from .models import Comment, Follow, Group, Post
+from .paginator import EstimatedCountPaginator
+from .search import search
+
+User = get_user_model()
 
 
 class PostAdmin(admin.ModelAdmin):
     list_display = ('text', 'pub_date', 'author')
+    list_select_related = ('author',)
     search_fields = ('text',)
     list_filter = ('pub_date',)
+    date_hierarchy = 'pub_date'
+    autocomplete_fields = ('author', 'group')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        """Ищет по поисковому индексу вместо LIKE по всей таблице."""
+        if not search_term:
+            return queryset, False
+        return queryset.filter(pk__in=search(search_term)), False
+
 
 class GroupAdmin(admin.ModelAdmin):
     list_display = ('title', 'slug', 'description')
-    search_fields = ('description',)
+    search_fields = ('title', 'description')
     list_filter = ('title',)
     empty_value_display = '-пусто-'
 
 
 class CommentAdmin(admin.ModelAdmin):
     list_display = ('text', 'author', 'post')
+    list_select_related = ('author', 'post')
     search_fields = ('text',)
     list_filter = ('created',)
+    date_hierarchy = 'created'
+    autocomplete_fields = ('author',)
+    raw_id_fields = ('post',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     empty_value_display = '-пусто-'
 
 
 class FollowAdmin(admin.ModelAdmin):
     list_display = ('user', 'author')
-    search_fields = ('user', 'author')
-    list_filter = ('user',)
+    list_select_related = ('user', 'author')
+    search_fields = ('user__username', 'author__username')
+    autocomplete_fields = ('user', 'author')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        """
+        Ищет по точному имени пользователя: пользователь находится
+        по уникальному индексу username, подписки — по индексам
+        на user_id и author_id, без LIKE по всей таблице.
+        """
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        user_ids = User.objects.filter(username=search_term).values('pk')
+        return queryset.filter(Q(user_id__in=user_ids)
+                               | Q(author_id__in=user_ids)), False
+
 
 admin.site.register(Post, PostAdmin)
 admin.site.register(Group, GroupAdmin)
@@ -0,0 +1,251 @@
+"""
+JSON API: ленты, страница поста и комментарии, пакетная запись.
+
+Ленты берутся теми же запросами, что и HTML-страницы, и листаются
+CursorPaginator по ссылкам next/previous. Строки читаются через values()
+только из нужных столбцов и превращаются в словари заранее выбранными
+функциями полей, без моделей и обхода их полей на каждом объекте.
+Параметр ?fields=id,text оставляет в ответе и в SELECT только
+перечисленные поля, ?limit= задаёт размер страницы.
+
+Запись — только пакетами через batch, см. posts.batch.
+
+Ответ сжимается brotli (если установлен пакет brotli) или gzip,
+в зависимости от Accept-Encoding.
+"""
+import json
+import re
+from functools import partial, wraps
+from urllib.parse import urlencode
+
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.http import Http404, HttpResponse
+from django.shortcuts import get_object_or_404
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_string
+
+from .batch import MAX_OPERATIONS, Batch
+from .models import Comment, Group, Post, UserStats
+from .paginator import CursorPaginator
+from .timeline import TimelinePaginator
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+User = get_user_model()
+
+PAGE_SIZE = 20
+MAX_PAGE_SIZE = 50
+# Ответы короче не сжимаются: заголовки и накладные расходы больше выгоды.
+COMPRESS_MIN_LENGTH = 200
+BROTLI_QUALITY = 4
+ACCEPTS_BR_RE = re.compile(r'\bbr\b')
+ACCEPTS_GZIP_RE = re.compile(r'\bgzip\b')
+
+
+def isoformat(value):
+    return value.isoformat()
+
+
+def media_url(name):
+    return default_storage.url(name) if name else None
+
+
+# Имя поля в ответе: (столбец values(), преобразование значения).
+POST_FIELDS = {
+    'id': ('id', None),
+    'text': ('text', None),
+    'pub_date': ('pub_date', isoformat),
+    'author': ('author__username', None),
+    'group': ('group__slug', None),
+    'image': ('image', media_url),
+    'comment_count': ('comment_count', None),
+}
+COMMENT_FIELDS = {
+    'id': ('id', None),
+    'text': ('text', None),
+    'created': ('created', isoformat),
+    'author': ('author__username', None),
+}
+POST_ORDERING = ('-pub_date', '-id')
+COMMENT_ORDERING = ('created', 'id')
+
+
+class ApiError(Exception):
+    def __init__(self, status, detail):
+        super().__init__(detail)
+        self.status = status
+        self.detail = detail
+
+
+def select_fields(request, fields):
+    """Поля из ?fields= в порядке объявления или все поля."""
+    requested = request.GET.get('fields')
+    if not requested:
+        return [(name, *spec) for name, spec in fields.items()]
+    names = set(requested.split(','))
+    unknown = names - fields.keys()
+    if unknown:
+        raise ApiError(400, f'Неизвестные поля: {", ".join(sorted(unknown))}')
+    return [(name, *spec) for name, spec in fields.items() if name in names]
+
+
+def serialize(rows, fields):
+    return [{name: (row[column] if convert is None
+                    else convert(row[column]))
+             for name, column, convert in fields}
+            for row in rows]
+
+
+def page_size(request):
+    try:
+        size = int(request.GET.get('limit', PAGE_SIZE))
+    except ValueError:
+        raise ApiError(400, 'limit должен быть числом')
+    if not 1 <= size <= MAX_PAGE_SIZE:
+        raise ApiError(400, f'limit должен быть от 1 до {MAX_PAGE_SIZE}')
+    return size
+
+
+def page_link(request, cursor):
+    if not cursor:
+        return None
+    params = request.GET.copy()
+    params['cursor'] = cursor
+    return request.build_absolute_uri(f'?{urlencode(params)}')
+
+
+def paginate(request, queryset, fields, ordering=POST_ORDERING,
+             make_paginator=None):
+    """Страница по курсору ?cursor= со ссылками на соседние страницы."""
+    fields = select_fields(request, fields)
+    columns = {column for _, column, _ in fields}
+    columns.update(key.lstrip('-') for key in ordering)
+    if make_paginator is None:
+        make_paginator = partial(CursorPaginator, ordering=ordering)
+    paginator = make_paginator(queryset.values(*columns), page_size(request))
+    page = paginator.get_page(cursor=request.GET.get('cursor'))
+    return {'results': serialize(page.object_list, fields),
+            'next': page_link(request, paginator.next_cursor),
+            'previous': page_link(request, paginator.previous_cursor)}
+
+
+def compress(request, response):
+    content = response.content
+    if len(content) < COMPRESS_MIN_LENGTH:
+        return
+    patch_vary_headers(response, ('Accept-Encoding',))
+    accepted = request.META.get('HTTP_ACCEPT_ENCODING', '')
+    if brotli is not None and ACCEPTS_BR_RE.search(accepted):
+        response.content = brotli.compress(content, quality=BROTLI_QUALITY)
+        response['Content-Encoding'] = 'br'
+    elif ACCEPTS_GZIP_RE.search(accepted):
+        response.content = compress_string(content)
+        response['Content-Encoding'] = 'gzip'
+    else:
+        return
+    response['Content-Length'] = str(len(response.content))
+
+
+def json_response(data, status=200):
+    content = json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+    return HttpResponse(content.encode(), status=status,
+                        content_type='application/json')
+
+
+def api_view(methods=('GET', 'HEAD')):
+    """Разрешённые методы, ошибки в JSON, сжатие ответа."""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in methods:
+                response = json_response({'detail': 'Метод не разрешён'},
+                                         405)
+                response['Allow'] = ', '.join(methods)
+                return response
+            try:
+                response = json_response(view(request, *args, **kwargs))
+            except ApiError as error:
+                response = json_response({'detail': error.detail},
+                                         error.status)
+            except Http404:
+                response = json_response({'detail': 'Не найдено'}, 404)
+            compress(request, response)
+            return response
+        return wrapper
+    return decorator
+
+
+@api_view()
+def posts(request):
+    return paginate(request, Post.objects.all(), POST_FIELDS)
+
+
+@api_view()
+def group_posts(request, slug):
+    group = get_object_or_404(Group, slug=slug)
+    return {'group': {'slug': group.slug, 'title': group.title,
+                      'description': group.description},
+            **paginate(request, group.posts.all(), POST_FIELDS)}
+
+
+@api_view()
+def profile(request, username):
+    author = get_object_or_404(User.objects.select_related('stats'),
+                               username=username)
+    stats = UserStats.for_user(author)
+    return {'author': {'username': author.username,
+                       'full_name': author.get_full_name(),
+                       'posts_count': stats.posts_count,
+                       'followers_count': stats.followers_count,
+                       'following_count': stats.following_count},
+            **paginate(request, author.posts.all(), POST_FIELDS)}
+
+
+@api_view()
+def follow_posts(request):
+    if not request.user.is_authenticated:
+        raise ApiError(401, 'Нужно войти')
+    return paginate(request, Post.objects.all(), POST_FIELDS,
+                    make_paginator=partial(TimelinePaginator,
+                                           user=request.user))
+
+
+@api_view()
+def post(request, post_id):
+    fields = select_fields(request, POST_FIELDS)
+    row = (Post.objects.filter(pk=post_id)
+           .values(*{column for _, column, _ in fields}).first())
+    if row is None:
+        raise Http404
+    return serialize([row], fields)[0]
+
+
+@api_view()
+def comments(request, post_id):
+    get_object_or_404(Post.objects.only('pk'), pk=post_id)
+    return paginate(request, Comment.objects.filter(post_id=post_id),
+                    COMMENT_FIELDS, ordering=COMMENT_ORDERING)
+
+
+@api_view(methods=('POST',))
+def batch(request):
+    """
+    Пакет операций {"operations": [{"type": "post", "text": ...,
+    "group": slug}, {"type": "comment", "post": id, "text": ...},
+    {"type": "follow", "author": username}]}, результаты в том же порядке.
+    """
+    if not request.user.is_authenticated:
+        raise ApiError(401, 'Нужно войти')
+    try:
+        operations = json.loads(request.body)['operations']
+    except (ValueError, TypeError, KeyError):
+        raise ApiError(400, 'Ожидается JSON вида {"operations": [...]}')
+    if not isinstance(operations, list):
+        raise ApiError(400, 'operations должен быть списком')
+    if len(operations) > MAX_OPERATIONS:
+        raise ApiError(400, f'Не больше {MAX_OPERATIONS} операций за раз')
+    return {'results': Batch(request.user, operations).run()}
@@ -0,0 +1,240 @@
+"""
+Пакетное создание постов, комментариев и подписок.
+
+Операции проверяются по тем же правилам, что и формы сайта (PostForm,
+CommentForm, подписка на себя запрещена), объекты, на которые они
+ссылаются, читаются одним запросом на тип. Корректные операции
+записываются bulk_create в одной транзакции, а то, что для одиночного
+объекта делают сигналы posts.signals (счётчики, ленты подписок,
+поисковый индекс, сброс кэша страниц), выполняется один раз на пачку.
+Некорректные операции не мешают остальным и возвращаются с ошибками.
+"""
+from collections import Counter
+
+from django.contrib.auth import get_user_model
+from django.db import (IntegrityError, connections, models, router,
+                       transaction)
+
+from . import pagecache, search, timeline
+from .forms import CommentForm, PostForm
+from .models import Comment, Follow, Group, Post, UserStats
+from .signals import change_stats
+
+User = get_user_model()
+
+MAX_OPERATIONS = 100
+# CharField форм приводит к строке что угодно, а форма сайта присылает
+# только строки, поэтому текст другого типа из JSON — ошибка.
+NOT_A_STRING = 'Ожидается строка'
+
+
+def create_all(model, objs):
+    """
+    Сохраняет объекты одним bulk_create и заполняет их pk. Возвращает
+    False, если СУБД так не умеет и объекты сохранены по одному
+    обычным save(): тогда всё остальное уже сделали сигналы.
+    """
+    connection = connections[router.db_for_write(model)]
+    if connection.features.can_return_ids_from_bulk_insert:
+        model.objects.bulk_create(objs)
+        return True
+    if connection.vendor == 'sqlite':
+        # SQLite не возвращает pk из bulk_create, но пишет транзакции
+        # строго по одной, поэтому pk новых строк идут подряд
+        # и заканчиваются на last_insert_rowid().
+        model.objects.bulk_create(objs)
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT last_insert_rowid()')
+            last = cursor.fetchone()[0]
+        for pk, obj in enumerate(objs, start=last - len(objs) + 1):
+            obj.pk = pk
+        return True
+    for obj in objs:
+        obj.save()
+    return False
+
+
+def invalid(errors):
+    return {'status': 'invalid', 'errors': errors}
+
+
+def is_id(value):
+    """Целый pk из JSON: bool в Python тоже int, но pk он не считается."""
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def form_errors(form):
+    return {field: [error['message'] for error in errors]
+            for field, errors in form.errors.get_json_data().items()}
+
+
+class Batch:
+    def __init__(self, user, operations):
+        self.user = user
+        self.operations = operations
+        self.results = [None] * len(operations)
+        self.posts = []
+        self.comments = []
+        self.follows = []
+
+    def run(self):
+        self.validate()
+        if self.posts or self.comments or self.follows:
+            with transaction.atomic():
+                self.create_posts()
+                self.create_comments()
+                self.create_follows()
+                transaction.on_commit(pagecache.invalidate)
+        return self.results
+
+    def validate(self):
+        by_type = {'post': [], 'comment': [], 'follow': []}
+        for index, operation in enumerate(self.operations):
+            kind = (operation.get('type')
+                    if isinstance(operation, dict) else None)
+            if isinstance(kind, str) and kind in by_type:
+                by_type[kind].append((index, operation))
+            else:
+                self.results[index] = invalid(
+                    {'type': ['Неизвестная операция']})
+        self.validate_posts(by_type['post'])
+        self.validate_comments(by_type['comment'])
+        self.validate_follows(by_type['follow'])
+
+    def validate_posts(self, operations):
+        # Ключи поиска из JSON могут быть любого типа, в том числе
+        # нехешируемыми списками: в запрос идут только строки.
+        groups = Group.objects.in_bulk(
+            {op.get('group') for _, op in operations
+             if isinstance(op.get('group'), str) and op.get('group')},
+            field_name='slug')
+        for index, operation in operations:
+            text = operation.get('text', '')
+            form = PostForm(data={'text': text})
+            group = operation.get('group')
+            if not isinstance(text, str):
+                self.results[index] = invalid({'text': [NOT_A_STRING]})
+            elif not form.is_valid():
+                self.results[index] = invalid(form_errors(form))
+            elif group and (not isinstance(group, str)
+                            or group not in groups):
+                self.results[index] = invalid({'group': [str(
+                    form.fields['group'].error_messages['invalid_choice'])]})
+            else:
+                post = form.save(commit=False)
+                post.author = self.user
+                post.group = groups.get(group)
+                self.posts.append((index, post))
+
+    def validate_comments(self, operations):
+        posts = Post.objects.in_bulk(
+            {op.get('post') for _, op in operations if is_id(op.get('post'))})
+        for index, operation in operations:
+            text = operation.get('text', '')
+            form = CommentForm(data={'text': text})
+            post_id = operation.get('post')
+            post = posts.get(post_id) if is_id(post_id) else None
+            if not isinstance(text, str):
+                self.results[index] = invalid({'text': [NOT_A_STRING]})
+            elif not form.is_valid():
+                self.results[index] = invalid(form_errors(form))
+            elif post is None:
+                self.results[index] = invalid({'post': ['Пост не найден']})
+            else:
+                comment = form.save(commit=False)
+                comment.post = post
+                comment.author = self.user
+                self.comments.append((index, comment))
+
+    def validate_follows(self, operations):
+        authors = User.objects.in_bulk(
+            {op.get('author') for _, op in operations
+             if isinstance(op.get('author'), str)},
+            field_name='username')
+        followed = set(Follow.objects.filter(
+            user=self.user, author__in=authors.values(),
+        ).values_list('author_id', flat=True))
+        for index, operation in operations:
+            username = operation.get('author')
+            author = (authors.get(username) if isinstance(username, str)
+                      else None)
+            if author is None:
+                self.results[index] = invalid(
+                    {'author': ['Пользователь не найден']})
+            elif author == self.user:
+                self.results[index] = invalid(
+                    {'author': ['Нельзя подписаться на себя']})
+            elif author.pk in followed:
+                self.results[index] = {'status': 'exists'}
+            else:
+                followed.add(author.pk)
+                self.follows.append((index, Follow(user=self.user,
+                                                   author=author)))
+
+    def created(self, items):
+        for index, obj in items:
+            self.results[index] = {'status': 'created', 'id': obj.pk}
+
+    def create_posts(self):
+        posts = [post for _, post in self.posts]
+        if not posts:
+            return
+        if create_all(Post, posts):
+            change_stats(self.user.pk, 'posts_count', len(posts))
+            timeline.fan_out_many(posts)
+            search.index_new_posts(posts)
+        self.created(self.posts)
+
+    def create_comments(self):
+        comments = [comment for _, comment in self.comments]
+        if not comments:
+            return
+        if create_all(Comment, comments):
+            for post_id, count in Counter(
+                    comment.post_id for comment in comments).items():
+                Post.objects.filter(pk=post_id).update(
+                    comment_count=models.F('comment_count') + count,
+                    version=models.F('version') + 1)
+            search.add_comments(comments)
+        self.created(self.comments)
+
+    def insert_follows(self):
+        """
+        Вставляет подписки и возвращает те, что вставлены этим запросом.
+        Если кто-то подписал пользователя параллельно, такие подписки
+        отмечаются как существующие, а остальные вставляются заново.
+        """
+        pending = self.follows
+        while pending:
+            try:
+                with transaction.atomic():
+                    Follow.objects.bulk_create(
+                        [follow for _, follow in pending])
+                return pending
+            except IntegrityError:
+                existing = set(Follow.objects.filter(
+                    user=self.user,
+                    author_id__in=[follow.author_id for _, follow in pending],
+                ).values_list('author_id', flat=True))
+                if not existing:
+                    raise
+                for index, follow in pending:
+                    if follow.author_id in existing:
+                        self.results[index] = {'status': 'exists'}
+                pending = [(index, follow) for index, follow in pending
+                           if follow.author_id not in existing]
+        return pending
+
+    def create_follows(self):
+        if not self.follows:
+            return
+        inserted = self.insert_follows()
+        if not inserted:
+            return
+        authors = [follow.author_id for _, follow in inserted]
+        change_stats(self.user.pk, 'following_count', len(inserted))
+        UserStats.objects.filter(user_id__in=authors).update(
+            followers_count=models.F('followers_count') + 1)
+        timeline.backfill_many(self.user.pk, authors)
+        for index, _ in inserted:
+            self.results[index] = {'status': 'created'}
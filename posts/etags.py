@@ -0,0 +1,76 @@
+"""
+Условные GET-запросы для лент и страниц постов.
+
+Контекст страницы строится один раз за запрос (request_cached): по нему
+сначала считается ETag, и если он совпал с If-None-Match, клиент
+получает 304 без рендеринга шаблона. В ETag попадают пользователь,
+номер версии каждого поста на странице (растёт при правке, новом
+комментарии, смене группы или готовых копиях картинки), текст и авторы
+показанных комментариев, состав страниц и счётчики профиля, поэтому
+он безопасен для авторизованных страниц.
+Для страниц из общего кэша ETag ставит posts.pagecache.
+"""
+import datetime
+import hashlib
+from functools import wraps
+
+from django.contrib.auth import get_user_model
+from django.core.paginator import Page
+from django.db import models
+
+from .models import Comment, Group, Post
+
+User = get_user_model()
+
+# Поля, от которых зависит отрисовка объекта на странице.
+ETAG_FIELDS = {
+    Post: ('version',),
+    Comment: ('text', 'author'),
+    Group: ('title', 'slug', 'description'),
+    User: ('username', 'first_name', 'last_name'),
+}
+
+
+def request_cached(build):
+    """Кэширует результат построения контекста на время запроса."""
+    @wraps(build)
+    def wrapper(request, *args, **kwargs):
+        contexts = request.__dict__.setdefault('_view_contexts', {})
+        if build not in contexts:
+            contexts[build] = build(request, *args, **kwargs)
+        return contexts[build]
+    return wrapper
+
+
+def etag_state(value):
+    if isinstance(value, Page):
+        return ([etag_state(item) for item in value.object_list],
+                value.has_previous(), value.has_next())
+    if isinstance(value, dict):
+        return sorted((key, etag_state(item)) for key, item in value.items())
+    if isinstance(value, models.Model):
+        fields = ETAG_FIELDS.get(type(value), ())
+        return (value._meta.label, value.pk,
+                *[etag_state(getattr(value, field)) for field in fields])
+    if isinstance(value, models.QuerySet) and value.model in ETAG_FIELDS:
+        # Шаблон перебирает тот же QuerySet, так что запрос не лишний:
+        # результат остаётся в его кэше.
+        return [etag_state(item) for item in value]
+    if isinstance(value, (str, int, float, bool, type(None),
+                          datetime.date)):
+        return value
+    # Формы и прочие ленивые QuerySet определяются остальным контекстом.
+    return None
+
+
+def context_etag(build):
+    """etag_func для django.views.decorators.http.condition."""
+    def etag_func(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return None
+        context = build(request, *args, **kwargs)
+        user = request.user
+        state = repr(([user.pk, user.get_username()],
+                      etag_state(context)))
+        return hashlib.md5(state.encode()).hexdigest()
+    return etag_func
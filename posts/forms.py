@@ -12,12 +12,28 @@ class PostForm(forms.ModelForm):
         error_messages = {'text': {'required': 'Пост обязательно должен '
                                                'содержать текст!'}}
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Картинку, отклонённую ещё при потоковой загрузке, не проверяем
+        # повторно, а показываем причину отказа.
+        image = self.files.get('image')
+        self.upload_error = getattr(image, 'upload_error', None)
+        if self.upload_error:
+            self.files = self.files.copy()
+            self.files.pop('image')
+
     def clean_text(self):
         data = self.cleaned_data['text']
         if data == '':
             raise forms.ValidationError('Пост не должен быть пустым!')
         return data
 
+    def clean_image(self):
+        if self.upload_error:
+            raise forms.ValidationError(self.upload_error,
+                                        code='invalid_image')
+        return self.cleaned_data['image']
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
@@ -0,0 +1,30 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = ('Показывает число попаданий, промахов и вытеснений '
+            'для каждого кэша из settings.CACHES.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true',
+                            help='Обнулить счётчики после вывода.')
+
+    def handle(self, *args, **options):
+        for alias in settings.CACHES:
+            cache = caches[alias]
+            if not hasattr(cache, 'stats'):
+                self.stdout.write(f'{alias}: статистика не собирается '
+                                  f'({type(cache).__name__})')
+                continue
+            stats = cache.stats()
+            requests = stats['hits'] + stats['misses']
+            hit_rate = stats['hits'] / requests * 100 if requests else 0
+            self.stdout.write(
+                f'{alias} ({cache.backend_name}): '
+                f'hits={stats["hits"]} misses={stats["misses"]} '
+                f'hit_rate={hit_rate:.1f}% evictions={stats["evictions"]}'
+            )
+            if options['reset']:
+                cache.reset_stats()
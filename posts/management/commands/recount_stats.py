@@ -0,0 +1,71 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import models, transaction
+from django.db.models.functions import Coalesce
+
+from posts.models import Follow, Post, UserStats
+
+User = get_user_model()
+
+COUNTERS = ('posts_count', 'followers_count', 'following_count')
+
+
+def count_of(model, field):
+    rows = (model.objects.filter(**{field: models.OuterRef('pk')})
+            .order_by()
+            .values(field)
+            .annotate(count=models.Count('pk'))
+            .values('count'))
+    return Coalesce(
+        models.Subquery(rows, output_field=models.IntegerField()), 0)
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счётчики UserStats и исправляет расхождения.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Только показать расхождения.')
+
+    def handle(self, *args, **options):
+        users = User.objects.order_by('pk').annotate(
+            posts_count=count_of(Post, 'author'),
+            followers_count=count_of(Follow, 'author'),
+            following_count=count_of(Follow, 'user'),
+        ).values('pk', *COUNTERS)
+        checked = fixed = created = 0
+        last_pk = 0
+        while True:
+            batch = list(users.filter(pk__gt=last_pk)
+                         [:options['batch_size']])
+            if not batch:
+                break
+            last_pk = batch[-1]['pk']
+            checked += len(batch)
+            stats = UserStats.objects.in_bulk(
+                [row['pk'] for row in batch], field_name='user_id')
+            changed, missing = [], []
+            for row in batch:
+                real = {field: row[field] for field in COUNTERS}
+                current = stats.get(row['pk'])
+                if current is None:
+                    missing.append(UserStats(user_id=row['pk'], **real))
+                    continue
+                if any(getattr(current, field) != value
+                       for field, value in real.items()):
+                    for field, value in real.items():
+                        setattr(current, field, value)
+                    changed.append(current)
+            fixed += len(changed)
+            created += len(missing)
+            if options['dry_run']:
+                continue
+            with transaction.atomic():
+                UserStats.objects.bulk_update(changed, COUNTERS)
+                UserStats.objects.bulk_create(missing,
+                                              ignore_conflicts=True)
+        self.stdout.write(
+            f'Проверено пользователей: {checked}, '
+            f'исправлено: {fixed}, создано: {created}.'
+        )
@@ -0,0 +1,380 @@
+"""
+Генерирует синтетические данные для проверки производительности.
+
+Строки пишутся bulk_create пачками по --batch-size. Каждая пачка —
+отдельная задача для пула процессов со своим генератором случайных
+чисел, зависящим только от --seed и номера пачки, поэтому результат
+не зависит от числа процессов. Первичные ключи пользователей, постов
+и комментариев назначаются явно (сразу после уже существующих), чтобы
+процессы могли ссылаться на строки, которые пишут соседи, а порядок
+строк не зависел от того, какой процесс закончил раньше.
+"""
+import io
+import math
+import os
+import random
+import time
+from datetime import datetime, timedelta
+from multiprocessing import Pool
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.core.management.color import no_style
+from django.conf import settings
+from django.db import connection, connections, models, transaction
+from django.utils import timezone
+from faker import Faker
+from PIL import Image, ImageDraw
+
+from posts import pagecache, search
+from posts.models import (Comment, Follow, Group, Post, TimelineEntry,
+                          UserStats)
+
+User = get_user_model()
+
+# Показатель степенного закона популярности авторов.
+POPULARITY_POWER = 1.1
+# Хвост распределения числа подписок: среднее у Pareto(1.5) равно 3.
+FOLLOW_ALPHA = 1.5
+GROUP_SHARE = 0.3
+SENTENCES = 2000
+IMAGES = 10
+
+# Кэш данных, общих для всех пачек одного процесса.
+_shared = {}
+
+
+def chunk_rng(plan, phase, index):
+    return random.Random(f'{plan["seed"]}:{phase}:{index}')
+
+
+def fake(plan):
+    faker = Faker('ru_RU')
+    faker.seed_instance(plan['seed'])
+    return faker
+
+
+def sentences(plan):
+    key = ('sentences', plan['seed'])
+    if key not in _shared:
+        faker = fake(plan)
+        _shared[key] = [faker.sentence(nb_words=12) for _ in range(SENTENCES)]
+    return _shared[key]
+
+
+def popularity(plan):
+    """Накопленные веса авторов: немногие очень популярны."""
+    key = ('popularity', plan['seed'], plan['users'])
+    if key not in _shared:
+        rng = random.Random(f'{plan["seed"]}:popularity')
+        weights = [1 / (rank + 1) ** POPULARITY_POWER
+                   for rank in range(plan['users'])]
+        rng.shuffle(weights)
+        total = 0
+        cumulative = []
+        for weight in weights:
+            total += weight
+            cumulative.append(total)
+        _shared[key] = cumulative
+    return _shared[key]
+
+
+def pick_users(plan, rng, count):
+    offsets = rng.choices(range(plan['users']),
+                          cum_weights=popularity(plan), k=count)
+    return [plan['user_base'] + offset for offset in offsets]
+
+
+def pub_date(plan, index):
+    start = datetime.fromisoformat(plan['start'])
+    return start + timedelta(seconds=plan['step'] * index)
+
+
+class explicit_dates:
+    """Позволяет задать pub_date и created вместо текущего времени."""
+    fields = ((Post, 'pub_date'), (Comment, 'created'))
+
+    def __enter__(self):
+        for model, name in self.fields:
+            model._meta.get_field(name).auto_now_add = False
+
+    def __exit__(self, *exc_info):
+        for model, name in self.fields:
+            model._meta.get_field(name).auto_now_add = True
+
+
+def make_users(plan, index, start, stop):
+    rng = chunk_rng(plan, 'users', index)
+    faker = fake(plan)
+    first_names = [faker.first_name() for _ in range(100)]
+    last_names = [faker.last_name() for _ in range(100)]
+    User.objects.bulk_create(
+        User(pk=plan['user_base'] + number,
+             username=f'user{plan["user_base"] + number}',
+             password=plan['password'],
+             first_name=rng.choice(first_names),
+             last_name=rng.choice(last_names))
+        for number in range(start, stop))
+    return stop - start
+
+
+def make_posts(plan, index, start, stop):
+    rng = chunk_rng(plan, 'posts', index)
+    texts = sentences(plan)
+    authors = pick_users(plan, rng, stop - start)
+    posts = []
+    for number, author_id in zip(range(start, stop), authors):
+        group_id = (rng.choice(plan['group_ids'])
+                    if rng.random() < GROUP_SHARE else None)
+        image = (rng.choice(plan['images'])
+                 if rng.random() < plan['image_share'] else None)
+        posts.append(Post(pk=plan['post_base'] + number, author_id=author_id,
+                          group_id=group_id, image=image,
+                          text=' '.join(rng.sample(texts, rng.randint(1, 5))),
+                          pub_date=pub_date(plan, number)))
+    with explicit_dates():
+        Post.objects.bulk_create(posts)
+    return len(posts)
+
+
+def make_follows(plan, index, start, stop):
+    rng = chunk_rng(plan, 'follows', index)
+    scale = plan['follows'] / (FOLLOW_ALPHA / (FOLLOW_ALPHA - 1))
+    follows = []
+    for number in range(start, stop):
+        user_id = plan['user_base'] + number
+        count = min(int(rng.paretovariate(FOLLOW_ALPHA) * scale),
+                    plan['users'] - 1)
+        for author_id in set(pick_users(plan, rng, count)):
+            if author_id != user_id:
+                follows.append(Follow(user_id=user_id, author_id=author_id))
+    Follow.objects.bulk_create(follows, ignore_conflicts=True)
+    return len(follows)
+
+
+def make_comments(plan, index, start, stop):
+    rng = chunk_rng(plan, 'comments', index)
+    texts = sentences(plan)
+    authors = pick_users(plan, rng, stop - start)
+    comments = []
+    for pk, author_id in zip(range(start, stop), authors):
+        number = rng.randrange(plan['posts'])
+        comments.append(Comment(
+            pk=plan['comment_base'] + pk,
+            post_id=plan['post_base'] + number, author_id=author_id,
+            text=rng.choice(texts),
+            created=(pub_date(plan, number)
+                     + timedelta(minutes=rng.randint(1, 24 * 60)))))
+    with explicit_dates():
+        Comment.objects.bulk_create(comments)
+    return len(comments)
+
+
+def count_comments(plan, index, start, stop):
+    counts = (Comment.objects.filter(post=models.OuterRef('pk')).order_by()
+              .values('post').annotate(count=models.Count('pk'))
+              .values('count'))
+    pk_range = (plan['post_base'] + start, plan['post_base'] + stop - 1)
+    return Post.objects.filter(
+        pk__range=pk_range,
+        pk__in=Comment.objects.filter(post__pk__range=pk_range)
+        .values('post_id'),
+    ).update(comment_count=models.Subquery(counts))
+
+
+def fill_timelines(plan, index, start, stop):
+    """
+    То же, что timeline.backfill для каждой подписки пачки, но посты
+    автора читаются один раз, а строки лент пишутся executemany без
+    создания объектов модели: на миллионах строк ORM тут в десятки раз
+    медленнее самой БД.
+    """
+    follows = list(Follow.objects.filter(pk__range=(start, stop - 1))
+                   .values_list('user_id', 'author_id'))
+    authors = {author_id for _, author_id in follows}
+    heavy = set(UserStats.objects.filter(
+        user_id__in=authors,
+        followers_count__gt=settings.TIMELINE_FANOUT_THRESHOLD,
+    ).values_list('user_id', flat=True))
+    adapt = connection.ops.adapt_datetimefield_value
+    posts = {}
+    for author_id in authors - heavy:
+        posts[author_id] = [
+            (post_id, adapt(date)) for post_id, date in
+            Post.objects.filter(author_id=author_id)
+            .order_by('-pub_date', '-id')
+            .values_list('pk', 'pub_date')
+            [:settings.TIMELINE_BACKFILL_LIMIT]]
+    rows = [(user_id, post_id, date)
+            for user_id, author_id in follows
+            for post_id, date in posts.get(author_id, ())]
+    sql = (f'{connection.ops.insert_statement(ignore_conflicts=True)} '
+           f'{TimelineEntry._meta.db_table} (user_id, post_id, pub_date) '
+           f'VALUES (%s, %s, %s) '
+           f'{connection.ops.ignore_conflicts_suffix_sql(True)}')
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.executemany(sql, rows)
+    return len(follows)
+
+
+def index_posts(plan, index, start, stop):
+    return search.rebuild_index(pk_range=(plan['post_base'] + start,
+                                          plan['post_base'] + stop - 1))
+
+
+PHASES = {
+    'users': make_users,
+    'posts': make_posts,
+    'follows': make_follows,
+    'comments': make_comments,
+    'comment_counts': count_comments,
+    'timelines': fill_timelines,
+    'search': index_posts,
+}
+
+
+def init_worker():
+    # Соединения родителя не переживают fork, у каждого процесса свои.
+    connections.close_all()
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            # Писатель в SQLite один, остальные процессы ждут очереди.
+            cursor.execute('PRAGMA busy_timeout = 600000')
+
+
+def run_task(task):
+    # Без общей транзакции: bulk_create и так атомарен, а в SQLite
+    # транзакция, начатая чтением, не может стать пишущей, пока пишут
+    # соседние процессы.
+    phase, plan, index, start, stop = task
+    return PHASES[phase](plan, index, start, stop)
+
+
+def seed_images(plan_seed):
+    """Несколько картинок, на которые ссылаются посты."""
+    rng = random.Random(f'{plan_seed}:images')
+    names = []
+    for number in range(IMAGES):
+        name = f'posts/seed-{plan_seed}-{number}.jpg'
+        if not default_storage.exists(name):
+            image = Image.new('RGB', (800, 600), tuple(
+                rng.randrange(256) for _ in range(3)))
+            ImageDraw.Draw(image).ellipse(
+                (100, 100, 700, 500),
+                fill=tuple(rng.randrange(256) for _ in range(3)))
+            content = io.BytesIO()
+            image.save(content, 'JPEG', quality=85)
+            default_storage.save(name, ContentFile(content.getvalue()))
+        names.append(name)
+    return names
+
+
+def next_pk(model):
+    return (model.objects.aggregate(last=models.Max('pk'))['last'] or 0) + 1
+
+
+class Command(BaseCommand):
+    help = ('Заполняет БД синтетическими пользователями, группами, постами, '
+            'комментариями и подписками.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=20)
+        parser.add_argument('--posts', type=int, default=10000)
+        parser.add_argument('--comments', type=int, default=20000)
+        parser.add_argument('--follows', type=float, default=10,
+                            help='Подписок на пользователя в среднем.')
+        parser.add_argument('--images', type=float, default=0,
+                            help='Доля постов с картинкой, от 0 до 1.')
+        parser.add_argument('--days', type=int, default=365,
+                            help='За сколько последних дней посты.')
+        parser.add_argument('--password',
+                            help='Пароль всех пользователей; без него '
+                                 'войти под ними нельзя.')
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                            help='Число процессов; 1 — без пула. '
+                                 'SQLite всё равно пишет в один поток.')
+
+    def handle(self, *args, **options):
+        plan = self.make_plan(options)
+        batch_size = options['batch_size']
+        self.run_phase('users', plan, plan['users'], batch_size, options)
+        self.run_phase('posts', plan, plan['posts'], batch_size, options)
+        self.run_phase('follows', plan, plan['users'],
+                       max(batch_size // max(int(plan['follows']), 1), 1),
+                       options)
+        self.run_phase('comments', plan, plan['comments'], batch_size,
+                       options)
+        self.reset_sequences()
+        self.run_phase('comment_counts', plan, plan['posts'], batch_size,
+                       options)
+        call_command('recount_stats', stdout=self.stdout)
+        follows = Follow.objects.filter(pk__gte=plan['follow_base'])
+        last_follow = follows.aggregate(last=models.Max('pk'))['last']
+        if last_follow is not None:
+            self.run_phase('timelines', plan, last_follow + 1,
+                           max(batch_size // 10, 1), options,
+                           first=plan['follow_base'])
+        self.run_phase('search', plan, plan['posts'], 1000, options)
+        pagecache.invalidate()
+
+    def make_plan(self, options):
+        days = timedelta(days=options['days'])
+        first_group = next_pk(Group)
+        groups = [Group(title=f'Группа {number}', slug=f'seed-group-{number}',
+                        description=f'Синтетическая группа {number}')
+                  for number in range(first_group,
+                                      first_group + options['groups'])]
+        Group.objects.bulk_create(groups)
+        group_ids = list(Group.objects.filter(
+            slug__in=[group.slug for group in groups])
+            .order_by('pk').values_list('pk', flat=True))
+        password = options['password']
+        return {
+            'seed': options['seed'],
+            'users': options['users'],
+            'posts': options['posts'],
+            'comments': options['comments'],
+            'follows': options['follows'],
+            'user_base': next_pk(User),
+            'post_base': next_pk(Post),
+            'comment_base': next_pk(Comment),
+            'follow_base': next_pk(Follow),
+            'group_ids': group_ids,
+            'password': make_password(password) if password else '!',
+            'image_share': options['images'],
+            'images': (seed_images(options['seed'])
+                       if options['images'] else []),
+            'start': (timezone.now() - days).isoformat(),
+            'step': days.total_seconds() / max(options['posts'], 1),
+        }
+
+    def run_phase(self, phase, plan, total, batch_size, options, first=0):
+        tasks = [(phase, plan, index, start, min(start + batch_size, total))
+                 for index, start in enumerate(range(first, total,
+                                                     batch_size))]
+        started = time.perf_counter()
+        if options['workers'] > 1 and len(tasks) > 1:
+            connections.close_all()
+            with Pool(min(options['workers'], len(tasks)),
+                      initializer=init_worker) as pool:
+                done = sum(pool.imap_unordered(run_task, tasks))
+        else:
+            done = sum(map(run_task, tasks))
+        self.stdout.write(f'{phase}: {done} за '
+                          f'{time.perf_counter() - started:.1f} с '
+                          f'({math.ceil((total - first) / batch_size)} пачек)')
+
+    def reset_sequences(self):
+        """Явные pk не двигают последовательности PostgreSQL и Oracle."""
+        statements = connection.ops.sequence_reset_sql(
+            no_style(), [User, Post, Comment])
+        with connection.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql)
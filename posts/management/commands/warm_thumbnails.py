@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from posts import thumbnails
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Строит копии картинок для уже загруженных постов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        posts = (Post.objects.exclude(image='').exclude(image=None)
+                 .order_by('pk').only('pk', 'image', 'image_renditions'))
+        built = skipped = failed = 0
+        last_pk = 0
+        while True:
+            batch = list(posts.filter(pk__gt=last_pk)
+                         [:options['batch_size']])
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+            for post in batch:
+                if thumbnails.renditions_for(post) is not None:
+                    skipped += 1
+                    continue
+                if thumbnails.generate(post.pk):
+                    built += 1
+                else:
+                    failed += 1
+        self.stdout.write(f'Построено: {built}, уже были готовы: {skipped}, '
+                          f'не удалось: {failed}.')
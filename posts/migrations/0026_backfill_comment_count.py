@@ -0,0 +1,46 @@
+from django.db import migrations, models, transaction
+
+BATCH_SIZE = 1000
+
+
+def backfill_comment_count(apps, schema_editor):
+    """
+    Заполняет Post.comment_count пачками постов по первичному ключу,
+    каждая пачка в своей короткой транзакции, чтобы не держать
+    блокировку на всю таблицу.
+    """
+    Post = apps.get_model('posts', 'Post')
+    Comment = apps.get_model('posts', 'Comment')
+    db_alias = schema_editor.connection.alias
+    last_pk = 0
+    while True:
+        ids = list(Post.objects.using(db_alias)
+                   .filter(pk__gt=last_pk)
+                   .order_by('pk')
+                   .values_list('pk', flat=True)[:BATCH_SIZE])
+        if not ids:
+            break
+        counts = dict(Comment.objects.using(db_alias)
+                      .filter(post_id__in=ids)
+                      .order_by()
+                      .values('post_id')
+                      .annotate(count=models.Count('pk'))
+                      .values_list('post_id', 'count'))
+        with transaction.atomic(using=db_alias):
+            for post_id, count in counts.items():
+                Post.objects.using(db_alias).filter(pk=post_id).update(
+                    comment_count=count)
+        last_pk = ids[-1]
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('posts', '0025_post_comment_count'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_comment_count,
+                             migrations.RunPython.noop),
+    ]
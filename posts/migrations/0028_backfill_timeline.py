@@ -0,0 +1,56 @@
+from django.conf import settings
+from django.db import migrations, transaction
+
+BATCH_SIZE = 1000
+INSERT_BATCH_SIZE = 300  # строк в INSERT, в пределах лимитов SQLite
+
+
+def backfill_timeline(apps, schema_editor):
+    """
+    Раскладывает существующие посты по лентам подписчиков,
+    пропуская авторов выше порога fan-out.
+    """
+    Follow = apps.get_model('posts', 'Follow')
+    Post = apps.get_model('posts', 'Post')
+    TimelineEntry = apps.get_model('posts', 'TimelineEntry')
+    db_alias = schema_editor.connection.alias
+    follows = (Follow.objects.using(db_alias)
+               .exclude(user=None)
+               .exclude(author=None)
+               .filter(author__stats__followers_count__lte=(
+                   settings.TIMELINE_FANOUT_THRESHOLD))
+               .order_by('pk'))
+    last_pk = 0
+    while True:
+        batch = list(follows.filter(pk__gt=last_pk)
+                     .values_list('pk', 'user_id', 'author_id')
+                     [:BATCH_SIZE])
+        if not batch:
+            break
+        with transaction.atomic(using=db_alias):
+            for _, user_id, author_id in batch:
+                posts = (Post.objects.using(db_alias)
+                         .filter(author_id=author_id)
+                         .order_by('-pub_date', '-id')
+                         .values_list('pk', 'pub_date')
+                         [:settings.TIMELINE_BACKFILL_LIMIT])
+                TimelineEntry.objects.using(db_alias).bulk_create(
+                    [TimelineEntry(user_id=user_id, post_id=post_id,
+                                   pub_date=pub_date)
+                     for post_id, pub_date in posts],
+                    batch_size=INSERT_BATCH_SIZE,
+                    ignore_conflicts=True,
+                )
+        last_pk = batch[-1][0]
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('posts', '0027_timelineentry'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_timeline, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,52 @@
+from django.db import migrations, transaction
+
+from posts.search import document_weights
+
+BATCH_SIZE = 1000
+INSERT_BATCH_SIZE = 300  # строк в INSERT, в пределах лимитов SQLite
+
+
+def backfill_search_index(apps, schema_editor):
+    """Строит поисковый индекс существующих постов пачками."""
+    Post = apps.get_model('posts', 'Post')
+    Comment = apps.get_model('posts', 'Comment')
+    SearchTerm = apps.get_model('posts', 'SearchTerm')
+    db_alias = schema_editor.connection.alias
+    posts = (Post.objects.using(db_alias)
+             .order_by('pk')
+             .values('pk', 'text', 'group__title'))
+    last_pk = 0
+    while True:
+        batch = list(posts.filter(pk__gt=last_pk)[:BATCH_SIZE])
+        if not batch:
+            break
+        comments = {}
+        for post_id, text in (Comment.objects.using(db_alias)
+                              .filter(post_id__in=[row['pk']
+                                                   for row in batch])
+                              .values_list('post_id', 'text')):
+            comments.setdefault(post_id, []).append(text)
+        with transaction.atomic(using=db_alias):
+            SearchTerm.objects.using(db_alias).bulk_create(
+                [SearchTerm(term=term, post_id=row['pk'], weight=weight)
+                 for row in batch
+                 for term, weight in document_weights(
+                     row['text'], row['group__title'],
+                     comments.get(row['pk'], ())).items()],
+                batch_size=INSERT_BATCH_SIZE,
+                ignore_conflicts=True,
+            )
+        last_pk = batch[-1]['pk']
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('posts', '0031_searchterm'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_search_index,
+                             migrations.RunPython.noop),
+    ]
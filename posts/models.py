@@ -13,6 +13,12 @@ class Group(models.Model):
         return self.title
 
 
+class PostQuerySet(models.QuerySet):
+    def feed(self):
+        """Посты для ленты: автор и группа подтягиваются одним JOIN."""
+        return self.select_related('author', 'group')
+
+
 class Post(models.Model):
     text = models.TextField('Текст поста', help_text='Содержание поста')
     pub_date = models.DateTimeField('date published', auto_now_add=True)
@@ -27,12 +33,45 @@ class Post(models.Model):
                               blank=True,
                               null=True)
     image = models.ImageField(upload_to='posts/', blank=True, null=True)
+    comment_count = models.PositiveIntegerField('Комментариев', default=0,
+                                                editable=False)
+    version = models.PositiveIntegerField('Версия', default=1,
+                                          editable=False)
+    image_renditions = models.TextField('Копии картинки', blank=True,
+                                        default='', editable=False)
+
+    objects = PostQuerySet.as_manager()
+
+    # Меняются только F()-выражениями из posts.signals.
+    DENORMALIZED_FIELDS = ('comment_count', 'version', 'image_renditions')
 
     def __str__(self):
         return self.text[:15]
 
+    def save(self, *args, **kwargs):
+        """
+        При редактировании не перезаписывает денормализованные поля
+        устаревшими значениями из памяти.
+        """
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.DENORMALIZED_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
     class Meta:
         ordering = ['-pub_date']
+        # Порядок лент — ('-pub_date', '-id'), см. posts.paginator.
+        indexes = [
+            models.Index(fields=['-pub_date', '-id'],
+                         name='post_pub_date'),
+            models.Index(fields=['group', '-pub_date', '-id'],
+                         name='post_group_pub_date'),
+            models.Index(fields=['author', '-pub_date', '-id'],
+                         name='post_author_pub_date'),
+        ]
 
 
 class Comment(models.Model):
@@ -46,13 +85,22 @@ class Comment(models.Model):
                                related_name='comments')
     text = models.TextField('Текст комментария',
                             help_text='Содержание комментария')
-    created = models.DateTimeField('Добавлен', auto_now_add=True)
+    created = models.DateTimeField('Добавлен', auto_now_add=True,
+                                   db_index=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['post', 'created', 'id'],
+                                name='comment_post_created')]
 
 
 class Follow(models.Model):
     class Meta:
+        # Уникальный индекс (user, author) покрывает подписки пользователя,
+        # (author, user) — подписчиков автора при fan-out.
         constraints = [models.UniqueConstraint(fields=['user', 'author'],
                        name='unique_follow')]
+        indexes = [models.Index(fields=['author', 'user'],
+                                name='follow_author_user')]
     user = models.ForeignKey(User,
                              on_delete=models.CASCADE,
                              related_name='follower',
@@ -61,3 +109,79 @@ class Follow(models.Model):
                                on_delete=models.CASCADE,
                                related_name='following',
                                null=True)
+
+
+class UserStats(models.Model):
+    """
+    Денормализованные счётчики пользователя. Обновляются сигналами
+    из posts.signals, расхождения исправляет команда recount_stats.
+    """
+    user = models.OneToOneField(User,
+                                on_delete=models.CASCADE,
+                                related_name='stats')
+    posts_count = models.PositiveIntegerField('Записей', default=0)
+    followers_count = models.PositiveIntegerField('Подписчиков', default=0)
+    following_count = models.PositiveIntegerField('Подписок', default=0)
+
+    def __str__(self):
+        return f'Статистика {self.user_id}'
+
+    @staticmethod
+    def real_counts(user_id):
+        return {
+            'posts_count': Post.objects.filter(author_id=user_id).count(),
+            'followers_count': Follow.objects.filter(
+                author_id=user_id).count(),
+            'following_count': Follow.objects.filter(
+                user_id=user_id).count(),
+        }
+
+    @classmethod
+    def for_user(cls, user):
+        """
+        Счётчики пользователя; если строки ещё нет, она создаётся
+        по фактическим данным.
+        """
+        try:
+            return user.stats
+        except cls.DoesNotExist:
+            stats, _ = cls.objects.get_or_create(
+                user=user, defaults=cls.real_counts(user.pk))
+            return stats
+
+
+class TimelineEntry(models.Model):
+    """
+    Материализованная лента подписок: строка на каждого подписчика
+    для каждого поста автора (fan-out on write).
+    """
+    user = models.ForeignKey(User,
+                             on_delete=models.CASCADE,
+                             related_name='timeline_entries')
+    post = models.ForeignKey(Post,
+                             on_delete=models.CASCADE,
+                             related_name='timeline_entries')
+    pub_date = models.DateTimeField('date published')
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['user', 'post'],
+                       name='unique_timeline_entry')]
+        # Порядок ленты — ('-pub_date', '-post'), см. TimelinePaginator.
+        indexes = [models.Index(fields=['user', '-pub_date', '-post'],
+                                name='timeline_user_pub_date')]
+
+
+class SearchTerm(models.Model):
+    """
+    Инвертированный индекс для поиска: вес основы слова в посте.
+    Заполняется функциями из posts.search.
+    """
+    term = models.CharField('Основа слова', max_length=64)
+    post = models.ForeignKey(Post,
+                             on_delete=models.CASCADE,
+                             related_name='search_terms')
+    weight = models.PositiveIntegerField('Вес')
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['term', 'post'],
+                       name='unique_search_term')]
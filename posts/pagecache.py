@@ -0,0 +1,171 @@
+"""
+Общий кэш страниц с «дырками» для данных пользователя.
+
+Страницы, помеченные декоратором shared_page, кэшируются целиком
+по пути и строке запроса, одни и те же для всех посетителей.
+Всё, что зависит от пользователя (меню, кнопки, форма комментария
+с CSRF-токеном), шаблоны выводят тегом {% hole %}: вместо фрагмента
+в страницу попадает маркер, а PageCacheMiddleware заполняет маркеры
+для каждого запроса, рендеря маленькие шаблоны из HOLES.
+
+Кэш сбрасывается сменой поколения (invalidate) при сохранении
+и удалении моделей, которые видны на страницах, см. posts.signals;
+внутри транзакции поколение меняется ещё раз после её фиксации
+(invalidate_on_commit).
+"""
+import base64
+import hashlib
+import json
+import re
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse
+from django.template.loader import render_to_string
+from django.utils.cache import get_conditional_response, patch_vary_headers
+
+from .forms import CommentForm
+
+GENERATION_KEY = 'page_cache:generation'
+HOLE_RE = re.compile(rb'<!--hole:(\w+):([\w=-]*)-->')
+
+
+def comment_form_context(request):
+    return {'form': CommentForm(request.POST or None)}
+
+
+# Имя дырки: (шаблон фрагмента, функция дополнительного контекста).
+HOLES = {
+    'nav': ('holes/nav.html', None),
+    'menu': ('posts/holes/menu.html', None),
+    'post_buttons': ('posts/holes/post_buttons.html', None),
+    'follow_button': ('posts/holes/follow_button.html', None),
+    'comment_form': ('posts/holes/comment_form.html', comment_form_context),
+}
+
+
+def shared_page(view):
+    """Помечает представление, страницы которого кэшируются для всех."""
+    view.shared_page = True
+    return view
+
+
+def hole_marker(name, params):
+    payload = base64.urlsafe_b64encode(
+        json.dumps(params, separators=(',', ':')).encode()).decode()
+    return f'<!--hole:{name}:{payload}-->'
+
+
+def fill_holes(request, content):
+    """Подставляет в страницу фрагменты для текущего пользователя."""
+    rendered = {}
+
+    def render_hole(match):
+        if match.group(0) not in rendered:
+            template, extra = HOLES[match.group(1).decode()]
+            context = json.loads(base64.urlsafe_b64decode(match.group(2)))
+            if extra is not None:
+                context.update(extra(request))
+            rendered[match.group(0)] = render_to_string(
+                template, context, request=request).encode()
+        return rendered[match.group(0)]
+
+    return HOLE_RE.sub(render_hole, content)
+
+
+def generation():
+    return cache.get_or_set(GENERATION_KEY, 1, timeout=None)
+
+
+def invalidate():
+    """Делает недействительными все закэшированные страницы."""
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        cache.set(GENERATION_KEY, 2, timeout=None)
+
+
+def invalidate_on_commit(using=None):
+    """
+    Сбрасывает кэш сразу — своё соединение уже видит новые строки —
+    и ещё раз после фиксации транзакции: страница, которую параллельный
+    запрос успел собрать из старых строк под новым поколением, иначе
+    отдавалась бы до PAGE_CACHE_TIMEOUT.
+    """
+    invalidate()
+    if transaction.get_connection(using).in_atomic_block:
+        transaction.on_commit(invalidate, using=using)
+
+
+def cache_key(request):
+    path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    return f'page_cache:{generation()}:{path}'
+
+
+def page_etag(request, digest):
+    """
+    ETag общей страницы: содержимое из кэша плюс всё, от чего зависят
+    дырки, поэтому 304 отдаётся без их рендеринга.
+    """
+    user = request.user
+    state = repr((digest, user.pk, user.get_username(),
+                  request.COOKIES.get(settings.CSRF_COOKIE_NAME)))
+    return '"{}"'.format(hashlib.md5(state.encode()).hexdigest())
+
+
+class PageCacheMiddleware:
+    """
+    Отдаёт страницы shared_page из кэша и заполняет дырки во всех
+    HTML-ответах. Для общих страниц ставит свой ETag вместо ETag
+    представления, одинаковый для страницы из кэша и только что
+    отрендеренной. Должен стоять после AuthenticationMiddleware
+    и CsrfViewMiddleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if (hasattr(request, 'page_cache_digest')
+                and response.status_code == 200
+                and not response.streaming):
+            response = self.process_shared_page(request, response)
+            if response.status_code == 304:
+                return response
+        if (response.streaming
+                or not response.get('Content-Type', '').startswith(
+                    'text/html')
+                or b'<!--hole:' not in response.content):
+            return response
+        response.content = fill_holes(request, response.content)
+        patch_vary_headers(response, ('Cookie',))
+        return response
+
+    def process_shared_page(self, request, response):
+        digest = request.page_cache_digest
+        if digest is None:
+            digest = hashlib.md5(response.content).hexdigest()
+            if not response.cookies:
+                cache.set(request.page_cache_key,
+                          (response.content, response['Content-Type'],
+                           digest),
+                          settings.PAGE_CACHE_TIMEOUT)
+        response['ETag'] = page_etag(request, digest)
+        patch_vary_headers(response, ('Cookie',))
+        return get_conditional_response(request, etag=response['ETag'],
+                                        response=response)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if (not getattr(view_func, 'shared_page', False)
+                or request.method not in ('GET', 'HEAD')
+                or not settings.PAGE_CACHE_TIMEOUT):
+            return None
+        request.page_cache_key = cache_key(request)
+        cached = cache.get(request.page_cache_key)
+        if cached is None:
+            request.page_cache_digest = None
+            return None
+        content, content_type, request.page_cache_digest = cached
+        return HttpResponse(content, content_type=content_type)
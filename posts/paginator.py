@@ -0,0 +1,224 @@
+import base64
+import binascii
+import json
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import Page, Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+class CursorPaginator(Paginator):
+    """
+    Постраничный вывод по ключу (keyset) вместо OFFSET.
+
+    Страница выбирается условием вида ``(pub_date, id) < (x, y)``,
+    поэтому стоимость запроса не зависит от глубины страницы
+    и COUNT(*) не выполняется. Один экземпляр обслуживает одну страницу:
+    ``num_pages`` подбирается так, чтобы методы обычного ``Page``
+    (``has_next``, ``has_previous``) отвечали без подсчёта строк,
+    а курсоры соседних страниц лежат в ``next_cursor``/``previous_cursor``.
+    """
+
+    def __init__(self, object_list, per_page, ordering=('-pub_date', '-id')):
+        self.ordering = tuple(ordering)
+        self.keys = tuple(key.lstrip('-') for key in self.ordering)
+        self.cursor = ''
+        self.next_cursor = ''
+        self.previous_cursor = ''
+        self._num_pages = None
+        super().__init__(object_list.order_by(*self.ordering), per_page)
+
+    @property
+    def num_pages(self):
+        if self._num_pages is None:
+            return super().num_pages
+        return self._num_pages
+
+    def get_page(self, number=None, cursor=None):
+        """
+        Возвращает страницу по курсору, по номеру (старые ссылки ?page=N)
+        или первую страницу, если ни то, ни другое не подходит.
+        """
+        if cursor:
+            try:
+                return self.cursor_page(cursor)
+            except InvalidCursor:
+                pass
+        if number:
+            try:
+                return self.number_page(int(number))
+            except (TypeError, ValueError):
+                pass
+        return self.number_page(1)
+
+    def fetch(self, limit, offset=0, position=None, backwards=False):
+        """
+        Строки после позиции (или с начала) в порядке сортировки,
+        при backwards — в обратном. Наследники переопределяют, если
+        страница собирается не одним запросом.
+        """
+        queryset = self.object_list
+        if position is not None:
+            queryset = queryset.filter(
+                self._seek_filter(position, backwards))
+        if backwards:
+            queryset = queryset.order_by(*self.order_keys(backwards=True))
+        return list(queryset[offset:offset + limit])
+
+    def number_page(self, number):
+        number = max(number, 1)
+        bottom = (number - 1) * self.per_page
+        items = self.fetch(self.per_page + 1, offset=bottom)
+        if not items and number > 1:
+            # Номер за последней страницей (старая ссылка ?page=999):
+            # пустая страница без курсора назад вела бы на ?cursor=,
+            # поэтому отдаётся первая.
+            return self.number_page(1)
+        return self._make_page(items, number,
+                               has_previous=number > 1,
+                               has_next=len(items) > self.per_page)
+
+    def cursor_page(self, cursor):
+        position, backwards = self.decode_cursor(cursor)
+        items = self.fetch(self.per_page + 1, position=position,
+                           backwards=backwards)
+        has_more = len(items) > self.per_page
+        self.cursor = cursor
+        if backwards:
+            items = items[:self.per_page][::-1]
+            return self._make_page(items, 2 if has_more else 1,
+                                   has_previous=has_more, has_next=True)
+        return self._make_page(items, 2,
+                               has_previous=True, has_next=has_more)
+
+    def _make_page(self, items, number, has_previous, has_next):
+        items = items[:self.per_page]
+        self._num_pages = number + 1 if has_next else number
+        if items and has_next:
+            self.next_cursor = self.encode_cursor(items[-1])
+        if items and has_previous:
+            self.previous_cursor = self.encode_cursor(items[0],
+                                                      backwards=True)
+        return Page(items, number, self)
+
+    def encode_cursor(self, item, backwards=False):
+        values = [self._key_value(item, key) for key in self.keys]
+        payload = json.dumps({'k': values, 'b': int(backwards)},
+                             separators=(',', ':'), default=str)
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        try:
+            padding = '=' * (-len(cursor) % 4)
+            payload = json.loads(base64.urlsafe_b64decode(cursor + padding))
+            values = payload['k']
+            backwards = bool(payload['b'])
+        except (binascii.Error, ValueError, TypeError, KeyError):
+            raise InvalidCursor(cursor)
+        if not isinstance(values, list) or len(values) != len(self.keys):
+            raise InvalidCursor(cursor)
+        opts = self.object_list.model._meta
+        try:
+            position = [opts.get_field(key).to_python(value)
+                        for key, value in zip(self.keys, values)]
+        except ValidationError:
+            raise InvalidCursor(cursor)
+        if any(value is None for value in position):
+            raise InvalidCursor(cursor)
+        return position, backwards
+
+    def order_keys(self, keys=None, backwards=False):
+        """Аргументы order_by() для порядка страницы по полям keys."""
+        keys = keys or self.keys
+        return [self._reverse(key) if ordering.startswith('-') != backwards
+                else key for ordering, key in zip(self.ordering, keys)]
+
+    def _seek_filter(self, position, backwards=False, keys=None):
+        """
+        Строит условие «строго после позиции» в порядке сортировки:
+        a >= x AND ((a > x) OR (a = x AND b > y) OR ...).
+        Первое условие позволяет СУБД начать чтение индекса с позиции,
+        а не фильтровать его с начала. keys — имена полей ключа, если
+        ищется не по самим object_list, а по другой таблице.
+        """
+        keys = keys or self.keys
+        condition = Q()
+        for index, ordering in enumerate(self.ordering):
+            key = keys[index]
+            descending = ordering.startswith('-') != backwards
+            lookup = f'{key}__lt' if descending else f'{key}__gt'
+            term = Q(**{lookup: position[index]})
+            for prev_key, prev_value in zip(keys[:index], position[:index]):
+                term &= Q(**{prev_key: prev_value})
+            condition |= term
+        descending = self.ordering[0].startswith('-') != backwards
+        lookup = 'lte' if descending else 'gte'
+        return Q(**{f'{keys[0]}__{lookup}': position[0]}) & condition
+
+    @staticmethod
+    def _reverse(ordering):
+        return ordering[1:] if ordering.startswith('-') else f'-{ordering}'
+
+    @staticmethod
+    def _key_value(item, key):
+        if isinstance(item, dict):
+            return item[key]
+        return getattr(item, key)
+
+
+def estimate_rows(model, using):
+    """
+    Оценка числа строк таблицы по статистике СУБД без COUNT(*)
+    или None, если СУБД её не даёт.
+    """
+    connection = connections[using]
+    table = model._meta.db_table
+    queries = {
+        'postgresql': ('SELECT reltuples::bigint FROM pg_class '
+                       'WHERE oid = %s::regclass', [table]),
+        'mysql': ('SELECT table_rows FROM information_schema.tables '
+                  'WHERE table_schema = DATABASE() AND table_name = %s',
+                  [table]),
+        # Для SQLite берётся максимальный rowid: удалённые строки
+        # не учитываются, зато это один шаг по B-дереву.
+        'sqlite': (f'SELECT MAX(_rowid_) FROM '
+                   f'{connection.ops.quote_name(table)}', []),
+    }
+    if connection.vendor not in queries:
+        return None
+    sql, params = queries[connection.vendor]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        row = cursor.fetchone()
+    if row is None or row[0] is None:
+        return None
+    return max(int(row[0]), 0)
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator для больших таблиц в админке.
+
+    Для всей таблицы число строк берётся из статистики СУБД, если строк
+    больше exact_limit; для отфильтрованного списка строки считаются
+    не дальше exact_limit. Номера последних страниц поэтому приблизительны.
+    """
+
+    def __init__(self, *args, exact_limit=10000, **kwargs):
+        self.exact_limit = exact_limit
+        super().__init__(*args, **kwargs)
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.has_filters():
+            estimate = estimate_rows(queryset.model, queryset.db)
+            if estimate is not None and estimate > self.exact_limit:
+                return estimate
+        return queryset.order_by()[:self.exact_limit].count()
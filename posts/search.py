@@ -0,0 +1,247 @@
+"""
+Полнотекстовый поиск по постам.
+
+Индекс хранится в таблице SearchTerm: строка на каждую пару
+(основа слова, пост) с весом — сколько раз основа встречается в тексте
+поста, названии группы и комментариях, с учётом веса поля. Индекс
+обновляется сигналами из posts.signals, полностью его пересобирает
+команда rebuild_search_index. Результаты ранжируются по TF-IDF.
+"""
+import math
+import re
+from collections import Counter
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, models, router, transaction
+
+from .models import Comment, Post, SearchTerm
+from .paginator import estimate_rows
+from .stemmer import stem
+
+WORD_RE = re.compile(r'\w+')
+CYRILLIC_RE = re.compile('[а-яё]')
+MAX_TERM_LENGTH = 64
+
+# Вес слова в зависимости от того, где оно встретилось.
+GROUP_WEIGHT = 3
+POST_WEIGHT = 2
+COMMENT_WEIGHT = 1
+
+# Сколько секунд хранится точное число постов для СУБД без статистики.
+POST_TOTAL_TIMEOUT = 60 * 60
+
+STOP_WORDS = frozenset((
+    'а', 'без', 'бы', 'в', 'во', 'вот', 'да', 'для', 'до', 'ее', 'её', 'же',
+    'за', 'и', 'из', 'или', 'к', 'как', 'ко', 'ли', 'на', 'над', 'не', 'ни',
+    'но', 'о', 'об', 'от', 'по', 'под', 'при', 'с', 'со', 'так', 'то',
+    'у', 'что', 'это',
+))
+
+
+def tokenize(text):
+    """Основы слов текста без стоп-слов."""
+    terms = []
+    for word in WORD_RE.findall(text.lower()):
+        if word in STOP_WORDS or word.isdigit() and len(word) < 2:
+            continue
+        if CYRILLIC_RE.search(word):
+            word = stem(word)
+        terms.append(word[:MAX_TERM_LENGTH])
+    return terms
+
+
+def document_weights(post_text, group_title='', comment_texts=()):
+    """Веса основ слов для поста с его группой и комментариями."""
+    weights = Counter()
+    for term in tokenize(group_title or ''):
+        weights[term] += GROUP_WEIGHT
+    for term in tokenize(post_text):
+        weights[term] += POST_WEIGHT
+    for text in comment_texts:
+        for term in tokenize(text):
+            weights[term] += COMMENT_WEIGHT
+    return weights
+
+
+def index_post(post_id):
+    """Полностью перестраивает индекс одного поста."""
+    post = (Post.objects.filter(pk=post_id)
+            .values('text', 'group__title').first())
+    if post is None:
+        return
+    comments = (Comment.objects.filter(post_id=post_id)
+                .values_list('text', flat=True))
+    weights = document_weights(post['text'], post['group__title'], comments)
+    with transaction.atomic():
+        SearchTerm.objects.filter(post_id=post_id).delete()
+        SearchTerm.objects.bulk_create(
+            SearchTerm(term=term, post_id=post_id, weight=weight)
+            for term, weight in weights.items())
+
+
+def add_comment(comment):
+    """Добавляет слова нового комментария к индексу его поста."""
+    add_comments([comment])
+
+
+def add_comments(comments):
+    """Добавляет слова новых комментариев к индексу их постов."""
+    texts = {}
+    for comment in comments:
+        texts.setdefault(comment.post_id, []).append(comment.text)
+    for post_id, post_texts in texts.items():
+        weights = document_weights('', comment_texts=post_texts)
+        if not weights:
+            continue
+        with transaction.atomic():
+            rows = SearchTerm.objects.filter(post_id=post_id,
+                                             term__in=weights)
+            existing = set(rows.values_list('term', flat=True))
+            if existing:
+                rows.filter(term__in=existing).update(
+                    weight=models.F('weight')
+                    + _weight_case(weights, existing))
+            SearchTerm.objects.bulk_create(
+                SearchTerm(term=term, post_id=post_id, weight=weight)
+                for term, weight in weights.items() if term not in existing)
+
+
+def index_new_posts(posts):
+    """Индексирует только что созданные посты: комментариев у них нет."""
+    _insert_terms([
+        (term, post.pk, weight)
+        for post in posts
+        for term, weight in document_weights(
+            post.text, post.group.title if post.group else '').items()])
+
+
+def remove_comment(comment):
+    """
+    Вычитает слова удалённого комментария из индекса его поста.
+    Новые строки не создаются, поэтому это безопасно и при каскадном
+    удалении самого поста.
+    """
+    weights = document_weights('', comment_texts=[comment.text])
+    if not weights:
+        return
+    rows = SearchTerm.objects.filter(post_id=comment.post_id)
+    with transaction.atomic():
+        rows.filter(reduce(or_, (
+            models.Q(term=term, weight__lte=weight)
+            for term, weight in weights.items()))).delete()
+        rows.filter(term__in=weights).update(
+            weight=models.F('weight') - _weight_case(weights, weights))
+
+
+def _weight_case(weights, terms):
+    return models.Case(
+        *[models.When(term=term, then=models.Value(weights[term]))
+          for term in terms],
+        default=models.Value(0),
+        output_field=models.IntegerField(),
+    )
+
+
+def search(query):
+    """
+    Идентификаторы постов, содержащих все слова запроса, от более
+    к менее релевантным; не больше settings.SEARCH_MAX_RESULTS.
+    """
+    terms = list(dict.fromkeys(tokenize(query)))
+    if not terms:
+        return []
+    frequencies = dict(SearchTerm.objects.filter(term__in=terms)
+                       .order_by()
+                       .values('term')
+                       .annotate(count=models.Count('pk'))
+                       .values_list('term', 'count'))
+    if len(frequencies) < len(terms):
+        return []
+    total = max(post_total(), 1)
+    idf = models.Case(
+        *[models.When(term=term, then=models.Value(
+            math.log(1 + total / count)))
+          for term, count in frequencies.items()],
+        output_field=models.FloatField(),
+    )
+    rows = (SearchTerm.objects.filter(term__in=terms)
+            .order_by()
+            .values('post_id')
+            .annotate(matched=models.Count('pk'),
+                      score=models.Sum(
+                          models.F('weight') * idf,
+                          output_field=models.FloatField()))
+            .filter(matched=len(terms))
+            .order_by('-score', '-post_id')
+            .values_list('post_id', flat=True))
+    return list(rows[:settings.SEARCH_MAX_RESULTS])
+
+
+def post_total():
+    """
+    Число постов для IDF. Точное значение не нужно, поэтому оно берётся
+    из статистики СУБД, а где её нет — из кэша, а не COUNT(*) на каждый
+    поисковый запрос.
+    """
+    total = estimate_rows(Post, router.db_for_read(Post))
+    if total is None:
+        total = cache.get_or_set('search:post-total', Post.objects.count,
+                                 POST_TOTAL_TIMEOUT)
+    return total
+
+
+def _insert_terms(rows):
+    """
+    Вставляет строки (term, post_id, weight) через executemany: при
+    пересборке индекса их миллионы, и создание объектов модели
+    занимает больше времени, чем сама запись в БД.
+    """
+    connection = connections[router.db_for_write(SearchTerm)]
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'INSERT INTO {SearchTerm._meta.db_table} (term, post_id, weight) '
+            f'VALUES (%s, %s, %s)', rows)
+
+
+def rebuild_index(batch_size=1000, pk_range=None):
+    """
+    Пересобирает индекс всех постов (или постов с pk из pk_range)
+    пачками; возвращает число постов.
+    """
+    posts = Post.objects.all()
+    if pk_range is not None:
+        posts = posts.filter(pk__range=pk_range)
+    return reindex_posts(posts, batch_size)
+
+
+def reindex_posts(posts, batch_size=1000):
+    """
+    Пересобирает индекс постов из QuerySet posts пачками по batch_size:
+    несколько запросов на пачку, а не на каждый пост. Возвращает число
+    постов.
+    """
+    posts = posts.order_by('pk').values('pk', 'text', 'group__title')
+    indexed = 0
+    last_pk = 0
+    while True:
+        batch = list(posts.filter(pk__gt=last_pk)[:batch_size])
+        if not batch:
+            return indexed
+        last_pk = batch[-1]['pk']
+        ids = [post['pk'] for post in batch]
+        comments = {}
+        for post_id, text in (Comment.objects.filter(post_id__in=ids)
+                              .values_list('post_id', 'text')):
+            comments.setdefault(post_id, []).append(text)
+        rows = [(term, post['pk'], weight)
+                for post in batch
+                for term, weight in document_weights(
+                    post['text'], post['group__title'],
+                    comments.get(post['pk'], ())).items()]
+        with transaction.atomic():
+            SearchTerm.objects.filter(post_id__in=ids).delete()
+            _insert_terms(rows)
+        indexed += len(batch)
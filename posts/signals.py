@@ -0,0 +1,190 @@
+import threading
+
+from django.contrib.auth import get_user_model
+from django.db.models import F
+from django.db.models.signals import (post_delete, post_save, pre_delete,
+                                      pre_save)
+from django.dispatch import receiver
+
+from . import pagecache, search, timeline
+from .models import Comment, Follow, Group, Post, UserStats
+
+User = get_user_model()
+
+# Посты, которые удаляются в этом потоке прямо сейчас: каскадное
+# удаление их комментариев не трогает ни счётчик, ни поисковый индекс.
+_deleting = threading.local()
+
+
+def deleting_posts():
+    if not hasattr(_deleting, 'post_ids'):
+        _deleting.post_ids = set()
+    return _deleting.post_ids
+
+
+def change_stats(user_id, field, delta):
+    """Атомарно сдвигает счётчик пользователя на delta."""
+    if user_id is None:
+        return
+    stats = UserStats.objects.filter(user_id=user_id)
+    if delta < 0:
+        stats = stats.filter(**{f'{field}__gte': -delta})
+    stats.update(**{field: F(field) + delta})
+
+
+def bump_versions(posts):
+    """
+    Увеличивает версию постов: закэшированные карточки со старой
+    версией в ключе больше не используются.
+    """
+    posts.update(version=F('version') + 1)
+
+
+PAGE_FIELDS = {'username', 'first_name', 'last_name'}
+
+
+@receiver(pre_save, sender=User)
+def user_saving(sender, instance, raw=False, update_fields=None, **kwargs):
+    """
+    Запоминает прежние видимые на страницах поля: смена пароля или входа
+    не должна сбрасывать кэш карточек и страниц.
+    """
+    if raw or instance.pk is None:
+        return
+    if update_fields is not None and not PAGE_FIELDS & set(update_fields):
+        instance.previous_page_fields = None
+        return
+    instance.previous_page_fields = (User.objects.filter(pk=instance.pk)
+                                     .values(*PAGE_FIELDS).first())
+
+
+def changed_page_fields(instance):
+    """Какие из PAGE_FIELDS пользователя изменило последнее сохранение."""
+    previous = getattr(instance, 'previous_page_fields', None)
+    if previous is None:
+        return set()
+    return {field for field in PAGE_FIELDS
+            if previous[field] != getattr(instance, field)}
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        UserStats.objects.get_or_create(user=instance)
+    elif 'username' in changed_page_fields(instance):
+        bump_versions(Post.objects.filter(author=instance))
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        change_stats(instance.author_id, 'posts_count', 1)
+        timeline.fan_out(instance)
+    else:
+        bump_versions(Post.objects.filter(pk=instance.pk))
+    search.index_post(instance.pk)
+
+
+@receiver(pre_delete, sender=Post)
+def post_deleting(sender, instance, **kwargs):
+    deleting_posts().add(instance.pk)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    deleting_posts().discard(instance.pk)
+    change_stats(instance.author_id, 'posts_count', -1)
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        change_stats(instance.user_id, 'following_count', 1)
+        change_stats(instance.author_id, 'followers_count', 1)
+        timeline.backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    change_stats(instance.user_id, 'following_count', -1)
+    change_stats(instance.author_id, 'followers_count', -1)
+    timeline.cleanup(instance.user_id, instance.author_id)
+    timeline.restore_fan_out(instance.author_id)
+
+
+@receiver(post_save, sender=Comment)
+def comment_created(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        Post.objects.filter(pk=instance.post_id).update(
+            comment_count=F('comment_count') + 1,
+            version=F('version') + 1)
+        search.add_comment(instance)
+    else:
+        search.index_post(instance.post_id)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    if instance.post_id in deleting_posts():
+        return
+    Post.objects.filter(pk=instance.post_id, comment_count__gt=0).update(
+        comment_count=F('comment_count') - 1,
+        version=F('version') + 1)
+    search.remove_comment(instance)
+
+
+@receiver(pre_save, sender=Group)
+def group_saving(sender, instance, raw=False, **kwargs):
+    """Запоминает прежнее название: от него зависит поисковый индекс."""
+    if not raw and instance.pk is not None:
+        instance.previous_title = (Group.objects.filter(pk=instance.pk)
+                                   .values_list('title', flat=True).first())
+
+
+@receiver(post_save, sender=Group)
+def group_saved(sender, instance, created, raw=False, **kwargs):
+    if created or raw:
+        return
+    posts = Post.objects.filter(group=instance)
+    bump_versions(posts)
+    if getattr(instance, 'previous_title', None) != instance.title:
+        search.reindex_posts(posts)
+
+
+@receiver(pre_delete, sender=Group)
+def group_deleted(sender, instance, **kwargs):
+    posts = Post.objects.filter(group=instance)
+    instance.post_ids = list(posts.values_list('pk', flat=True))
+    bump_versions(posts)
+
+
+@receiver(post_delete, sender=Group)
+def group_removed(sender, instance, **kwargs):
+    post_ids = getattr(instance, 'post_ids', ())
+    if post_ids:
+        search.reindex_posts(Post.objects.filter(pk__in=post_ids))
+
+
+def pages_changed(sender, instance, signal, raw=False, created=False,
+                  using=None, **kwargs):
+    """Сбрасывает общий кэш страниц при изменении видимых на них данных."""
+    if raw:
+        return
+    if sender is Comment and instance.post_id in deleting_posts():
+        # Кэш сбросит удаление самого поста.
+        return
+    if (sender is User and signal is post_save and not created
+            and not changed_page_fields(instance)):
+        return
+    pagecache.invalidate_on_commit(using)
+
+
+for model in (User, Post, Comment, Group, Follow):
+    post_save.connect(pages_changed, sender=model)
+    post_delete.connect(pages_changed, sender=model)
@@ -0,0 +1,120 @@
+"""
+Стеммер русского языка по алгоритму Snowball (Портер).
+
+https://snowballstem.org/algorithms/russian/stemmer.html
+"""
+from functools import lru_cache
+
+# Частые слова повторяются постоянно, их основы запоминаются.
+STEM_CACHE_SIZE = 100000
+VOWELS = 'аеиоуыэюя'
+
+PERFECTIVE_GERUND = (
+    ('в', 'вши', 'вшись'),
+    ('ив', 'ивши', 'ившись', 'ыв', 'ывши', 'ывшись'),
+)
+ADJECTIVE = (
+    (),
+    ('ее', 'ие', 'ые', 'ое', 'ими', 'ыми', 'ей', 'ий', 'ый', 'ой', 'ем',
+     'им', 'ым', 'ом', 'его', 'ого', 'ему', 'ому', 'их', 'ых', 'ую', 'юю',
+     'ая', 'яя', 'ою', 'ею'),
+)
+PARTICIPLE = (
+    ('ем', 'нн', 'вш', 'ющ', 'щ'),
+    ('ивш', 'ывш', 'ующ'),
+)
+REFLEXIVE = ((), ('ся', 'сь'))
+VERB = (
+    ('ла', 'на', 'ете', 'йте', 'ли', 'й', 'л', 'ем', 'н', 'ло', 'но', 'ет',
+     'ют', 'ны', 'ть', 'ешь', 'нно'),
+    ('ила', 'ыла', 'ена', 'ейте', 'уйте', 'ите', 'или', 'ыли', 'ей', 'уй',
+     'ил', 'ыл', 'им', 'ым', 'ен', 'ило', 'ыло', 'ено', 'ят', 'ует', 'уют',
+     'ит', 'ыт', 'ены', 'ить', 'ыть', 'ишь', 'ую', 'ю'),
+)
+NOUN = (
+    (),
+    ('а', 'ев', 'ов', 'ие', 'ье', 'е', 'иями', 'ями', 'ами', 'еи', 'ии',
+     'и', 'ией', 'ей', 'ой', 'ий', 'й', 'иям', 'ям', 'ием', 'ем', 'ам',
+     'ом', 'о', 'у', 'ах', 'иях', 'ях', 'ы', 'ь', 'ию', 'ью', 'ю', 'ия',
+     'ья', 'я'),
+)
+SUPERLATIVE = ('ейше', 'ейш')
+DERIVATIONAL = ('ость', 'ост')
+
+
+def _region_start(word, start):
+    """Начало области после первой согласной, следующей за гласной."""
+    for index in range(start + 1, len(word)):
+        if word[index] not in VOWELS and word[index - 1] in VOWELS:
+            return index + 1
+    return len(word)
+
+
+def _strip(rv, groups):
+    """
+    Отрезает самое длинное подходящее окончание. Окончания первой группы
+    должны идти после «а» или «я». Возвращает None, если отрезать нечего.
+    """
+    first, second = groups
+    matches = [(len(ending), needs_vowel)
+               for needs_vowel, endings in ((True, first), (False, second))
+               for ending in endings if rv.endswith(ending)]
+    if not matches:
+        return None
+    length, needs_vowel = max(matches)
+    if needs_vowel and not rv[:-length].endswith(('а', 'я')):
+        return None
+    return rv[:-length]
+
+
+def _strip_adjectival(rv):
+    stripped = _strip(rv, ADJECTIVE)
+    if stripped is None:
+        return None
+    participle = _strip(stripped, PARTICIPLE)
+    return stripped if participle is None else participle
+
+
+def _step1(rv):
+    """Окончания деепричастий, прилагательных, глаголов и существительных."""
+    stripped = _strip(rv, PERFECTIVE_GERUND)
+    if stripped is not None:
+        return stripped
+    reflexive = _strip(rv, REFLEXIVE)
+    if reflexive is not None:
+        rv = reflexive
+    for stripped in (_strip_adjectival(rv), _strip(rv, VERB),
+                     _strip(rv, NOUN)):
+        if stripped is not None:
+            return stripped
+    return rv
+
+
+def _step4(rv):
+    """Удвоенная «н», превосходная степень и мягкий знак."""
+    if rv.endswith('нн'):
+        return rv[:-1]
+    for ending in SUPERLATIVE:
+        if rv.endswith(ending):
+            rv = rv[:-len(ending)]
+            return rv[:-1] if rv.endswith('нн') else rv
+    if rv.endswith('ь'):
+        return rv[:-1]
+    return rv
+
+
+@lru_cache(maxsize=STEM_CACHE_SIZE)
+def stem(word):
+    word = word.lower().replace('ё', 'е')
+    rv_start = next((index + 1 for index, letter in enumerate(word)
+                     if letter in VOWELS), len(word))
+    r2 = _region_start(word, _region_start(word, 0))
+    prefix, rv = word[:rv_start], _step1(word[rv_start:])
+    if rv.endswith('и'):
+        rv = rv[:-1]
+    for ending in DERIVATIONAL:
+        if (rv.endswith(ending)
+                and rv_start + len(rv) - len(ending) >= r2):
+            rv = rv[:-len(ending)]
+            break
+    return prefix + _step4(rv)
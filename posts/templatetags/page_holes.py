@@ -0,0 +1,17 @@
+from django import template
+from django.utils.safestring import mark_safe
+
+from posts.pagecache import HOLES, hole_marker
+
+register = template.Library()
+
+
+@register.simple_tag
+def hole(name, **params):
+    """
+    Маркер фрагмента, который зависит от пользователя; его заполняет
+    posts.pagecache.PageCacheMiddleware.
+    """
+    if name not in HOLES:
+        raise template.TemplateSyntaxError(f'Неизвестная дырка {name!r}')
+    return mark_safe(hole_marker(name, params))
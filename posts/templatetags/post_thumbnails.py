@@ -0,0 +1,39 @@
+from django import template
+from django.conf import settings
+
+from posts import thumbnails
+
+register = template.Library()
+
+
+@register.filter
+def card_timeout(post):
+    return thumbnails.card_timeout(post)
+
+
+@register.inclusion_tag('posts/picture.html')
+def post_picture(post):
+    """
+    Разметка <picture> с srcset по готовым копиям картинки поста.
+    Если копий ещё нет, ставит их построение в очередь и выводит заглушку.
+    """
+    renditions = thumbnails.renditions_for(post)
+    if renditions is None:
+        thumbnails.submit(post.pk)
+        return {'sources': [], 'config': settings.POST_IMAGE_RENDITIONS}
+    sources = {}
+    for item in renditions['items']:
+        sources.setdefault(item['format'], []).append(item)
+    fallback = sources.pop('jpeg', None) or sources.popitem()[1]
+    return {
+        'config': settings.POST_IMAGE_RENDITIONS,
+        'sources': [(items[0]['type'], srcset(items))
+                    for items in sources.values()],
+        'img': min(fallback, key=lambda item: abs(
+            item['width'] - settings.POST_IMAGE_RENDITIONS['width'])),
+        'img_srcset': srcset(fallback),
+    }
+
+
+def srcset(items):
+    return ', '.join(f'{item["url"]} {item["width"]}w' for item in items)
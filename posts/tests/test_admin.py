@@ -0,0 +1,90 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Post
+from posts.paginator import EstimatedCountPaginator
+
+User = get_user_model()
+
+
+class AdminChangelistTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='admin')
+        cls.users = [User.objects.create_user(username=f'user{number}')
+                     for number in range(5)]
+        for user in cls.users:
+            post = Post.objects.create(author=user, text=f'Пост {user}')
+            Comment.objects.create(post=post, author=user, text='Коммент')
+        for user in cls.users[1:]:
+            Follow.objects.create(user=user, author=cls.users[0])
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.admin)
+
+    def changelist(self, model, **params):
+        url = reverse(f'admin:posts_{model}_changelist')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return response, [query['sql'] for query in queries]
+
+    def test_no_queries_per_row(self):
+        """Число запросов списка не зависит от числа строк."""
+        for model in ('post', 'comment', 'follow'):
+            with self.subTest(model=model):
+                _, before = self.changelist(model)
+                user = User.objects.create_user(username=f'extra_{model}')
+                post = Post.objects.create(author=user, text='Ещё пост')
+                Comment.objects.create(post=post, author=user, text='Ещё')
+                Follow.objects.create(user=user, author=self.users[1])
+                _, after = self.changelist(model)
+                self.assertEqual(len(before), len(after))
+
+    def test_large_table_is_not_counted(self):
+        """Для большой таблицы число строк берётся из оценки СУБД."""
+        with mock.patch('posts.paginator.estimate_rows',
+                        return_value=10 ** 7):
+            response, queries = self.changelist('post')
+        self.assertFalse(any('COUNT(' in sql for sql in queries))
+        self.assertEqual(response.context['cl'].result_count, 10 ** 7)
+
+    def test_follow_search_by_username(self):
+        """Поиск подписок идёт по точному имени пользователя."""
+        response, queries = self.changelist('follow', q='user0')
+        self.assertEqual(response.context['cl'].result_count, 4)
+        self.assertFalse(any('LIKE' in sql for sql in queries))
+        response, _ = self.changelist('follow', q='user')
+        self.assertEqual(response.context['cl'].result_count, 0)
+
+    def test_post_search_uses_index(self):
+        """Поиск постов в админке идёт через поисковый индекс."""
+        response, queries = self.changelist('post', q='пост user3')
+        self.assertEqual(list(response.context['cl'].result_list),
+                         [Post.objects.get(author=self.users[3])])
+        self.assertFalse(any('LIKE' in sql for sql in queries))
+
+
+class EstimatedCountPaginatorTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(username='author')
+        Post.objects.bulk_create(Post(author=author, text=str(number))
+                                 for number in range(15))
+
+    def test_small_table_counted_exactly(self):
+        paginator = EstimatedCountPaginator(Post.objects.all(), 10)
+        self.assertEqual(paginator.count, 15)
+        self.assertEqual(paginator.num_pages, 2)
+
+    def test_filtered_count_is_capped(self):
+        paginator = EstimatedCountPaginator(
+            Post.objects.filter(text__startswith='1'), 5, exact_limit=3)
+        self.assertEqual(paginator.count, 3)
@@ -0,0 +1,149 @@
+import gzip
+import json
+from unittest import skipIf
+
+from django.contrib.auth import get_user_model
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts import api
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class ApiTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author',
+                                              first_name='Лев',
+                                              last_name='Толстой')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(title='Группа', slug='group',
+                                         description='Описание')
+        cls.posts = [Post.objects.create(author=cls.author, text=f'Пост {n}',
+                                         group=None if n % 2 else cls.group)
+                     for n in range(5)]
+        cls.comments = [Comment.objects.create(post=cls.posts[0],
+                                               author=cls.reader,
+                                               text=f'Комментарий {n}')
+                        for n in range(3)]
+
+    def setUp(self):
+        self.client = Client()
+
+    def get_json(self, url, **extra):
+        response = self.client.get(url, **extra)
+        return response.status_code, json.loads(response.content)
+
+    def test_posts(self):
+        """Лента отдаёт посты от новых к старым со всеми полями."""
+        status, data = self.get_json(reverse('api:posts'))
+        self.assertEqual(status, 200)
+        self.assertEqual([post['id'] for post in data['results']],
+                         [post.pk for post in reversed(self.posts)])
+        first = data['results'][0]
+        self.assertEqual(set(first), set(api.POST_FIELDS))
+        self.assertEqual(first['author'], 'author')
+        self.assertEqual(first['group'], 'group')
+        self.assertIsNone(first['image'])
+        self.assertIsNone(data['next'])
+
+    def test_cursor_pagination(self):
+        """Ссылки next и previous листают ленту без повторов."""
+        status, first = self.get_json(reverse('api:posts') + '?limit=2')
+        status, second = self.get_json(first['next'])
+        status, back = self.get_json(second['previous'])
+        self.assertEqual(len(second['results']), 2)
+        self.assertLess(second['results'][0]['id'],
+                        first['results'][-1]['id'])
+        self.assertEqual(back['results'], first['results'])
+        self.assertIn('limit=2', first['next'])
+
+    def test_sparse_fields(self):
+        """?fields= оставляет только перечисленные поля."""
+        status, data = self.get_json(reverse('api:posts')
+                                     + '?fields=id,author')
+        self.assertEqual(set(data['results'][0]), {'id', 'author'})
+        status, data = self.get_json(reverse('api:posts') + '?fields=foo')
+        self.assertEqual(status, 400)
+
+    def test_limit(self):
+        for limit in ('0', '51', 'x'):
+            with self.subTest(limit=limit):
+                status, data = self.get_json(reverse('api:posts')
+                                             + f'?limit={limit}')
+                self.assertEqual(status, 400)
+                self.assertIn('detail', data)
+
+    def test_page_is_one_query(self):
+        with self.assertNumQueries(1):
+            self.client.get(reverse('api:posts') + '?limit=50')
+
+    def test_group_posts(self):
+        status, data = self.get_json(reverse('api:group_posts',
+                                             args=['group']))
+        self.assertEqual(data['group']['title'], 'Группа')
+        self.assertEqual(len(data['results']), 3)
+        status, data = self.get_json(reverse('api:group_posts',
+                                             args=['missing']))
+        self.assertEqual(status, 404)
+
+    def test_profile(self):
+        status, data = self.get_json(reverse('api:profile',
+                                             args=['author']))
+        self.assertEqual(data['author']['full_name'], 'Лев Толстой')
+        self.assertEqual(data['author']['posts_count'], 5)
+        self.assertEqual(len(data['results']), 5)
+
+    def test_follow_posts(self):
+        """Лента подписок только для вошедших пользователей."""
+        status, data = self.get_json(reverse('api:follow_posts'))
+        self.assertEqual(status, 401)
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.client.force_login(self.reader)
+        status, data = self.get_json(reverse('api:follow_posts'))
+        self.assertEqual(len(data['results']), 5)
+
+    def test_post(self):
+        post = self.posts[0]
+        status, data = self.get_json(reverse('api:post', args=[post.pk]))
+        self.assertEqual(data['text'], post.text)
+        self.assertEqual(data['comment_count'], 3)
+        status, data = self.get_json(reverse('api:post', args=[0]))
+        self.assertEqual(status, 404)
+
+    def test_comments(self):
+        """Комментарии идут от старых к новым."""
+        status, data = self.get_json(
+            reverse('api:comments', args=[self.posts[0].pk]) + '?limit=2')
+        self.assertEqual([comment['text'] for comment in data['results']],
+                         ['Комментарий 0', 'Комментарий 1'])
+        status, data = self.get_json(data['next'])
+        self.assertEqual(data['results'][0]['author'], 'reader')
+
+    def test_read_only(self):
+        response = self.client.post(reverse('api:posts'))
+        self.assertEqual(response.status_code, 405)
+
+    def test_gzip(self):
+        response = self.client.get(reverse('api:posts'),
+                                   HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        data = json.loads(gzip.decompress(response.content))
+        self.assertEqual(len(data['results']), 5)
+
+    @skipIf(api.brotli is None, 'пакет brotli не установлен')
+    def test_brotli(self):
+        response = self.client.get(reverse('api:posts'),
+                                   HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertEqual(response['Content-Encoding'], 'br')
+        data = json.loads(api.brotli.decompress(response.content))
+        self.assertEqual(len(data['results']), 5)
+
+    def test_short_responses_are_not_compressed(self):
+        response = self.client.get(reverse('api:posts') + '?fields=id',
+                                   HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(response.has_header('Content-Encoding'))
@@ -0,0 +1,159 @@
+import asyncio
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import (SimpleTestCase, TransactionTestCase,
+                         override_settings)
+
+from posts.models import Post
+from yatube import asgi
+
+User = get_user_model()
+
+
+def scope(path='/', method='GET', query=b'', headers=()):
+    return {'type': 'http', 'asgi': {'version': '3.0'},
+            'http_version': '1.1', 'method': method, 'scheme': 'http',
+            'path': path, 'query_string': query, 'root_path': '',
+            'headers': list(headers), 'client': ('10.0.0.1', 5000),
+            'server': ('testserver', 80)}
+
+
+def call(application, scope, messages=None):
+    """Прогоняет одно соединение и возвращает отправленные сообщения."""
+    if messages is None:
+        messages = [{'type': 'http.request', 'body': b''}]
+    incoming = iter(messages)
+    sent = []
+
+    async def receive():
+        return next(incoming)
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(application(scope, receive, send))
+    return sent
+
+
+class ClosingBody:
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.closed = False
+
+    def __iter__(self):
+        return self.chunks
+
+    def close(self):
+        self.closed = True
+
+
+class WsgiBridgeTest(SimpleTestCase):
+    def setUp(self):
+        self.environ = None
+        self.body = ClosingBody([b'first', b'second'])
+        self.bridge = asgi.WsgiBridge(self.wsgi, max_workers=2)
+
+    def tearDown(self):
+        self.bridge.executor.shutdown()
+
+    def wsgi(self, environ, start_response):
+        self.environ = dict(environ, body=environ['wsgi.input'].read())
+        start_response('201 Created', [('Content-Type', 'text/plain'),
+                                       ('X-Test', '1')])
+        return self.body
+
+    def test_environ(self):
+        """Путь, строка запроса, заголовки и тело доходят до WSGI."""
+        call(self.bridge,
+             scope('/группа/', 'POST', b'page=2',
+                   [(b'content-type', b'text/plain'),
+                    (b'content-length', b'10'),
+                    (b'accept', b'text/html'), (b'accept', b'*/*')]),
+             [{'type': 'http.request', 'body': b'hello ', 'more_body': True},
+              {'type': 'http.request', 'body': b'asgi'}])
+        environ = self.environ
+        self.assertEqual(environ['REQUEST_METHOD'], 'POST')
+        self.assertEqual(environ['PATH_INFO'].encode('latin-1').decode(),
+                         '/группа/')
+        self.assertEqual(environ['QUERY_STRING'], 'page=2')
+        self.assertEqual(environ['CONTENT_TYPE'], 'text/plain')
+        self.assertEqual(environ['CONTENT_LENGTH'], '10')
+        self.assertEqual(environ['HTTP_ACCEPT'], 'text/html,*/*')
+        self.assertEqual(environ['REMOTE_ADDR'], '10.0.0.1')
+        self.assertEqual(environ['SERVER_NAME'], 'testserver')
+        self.assertEqual(environ['body'], b'hello asgi')
+
+    def test_response_is_streamed(self):
+        """Ответ уходит по кускам, а итератор WSGI закрывается."""
+        sent = call(self.bridge, scope())
+        self.assertEqual(sent[0], {'type': 'http.response.start',
+                                   'status': 201,
+                                   'headers': [(b'content-type',
+                                                b'text/plain'),
+                                               (b'x-test', b'1')]})
+        self.assertEqual([(m['body'], m['more_body']) for m in sent[1:]],
+                         [(b'first', True), (b'second', False)])
+        self.assertTrue(self.body.closed)
+
+    def test_empty_response(self):
+        self.body = ClosingBody([])
+        sent = call(self.bridge, scope())
+        self.assertEqual(sent[1], {'type': 'http.response.body',
+                                   'body': b'', 'more_body': False})
+
+    def test_disconnect_before_body(self):
+        """Клиент ушёл, не дослав тело: Django не вызывается."""
+        sent = call(self.bridge, scope(method='POST'),
+                    [{'type': 'http.request', 'body': b'x',
+                      'more_body': True},
+                     {'type': 'http.disconnect'}])
+        self.assertEqual(sent, [])
+        self.assertIsNone(self.environ)
+
+    @override_settings(DATA_UPLOAD_MAX_MEMORY_SIZE=10,
+                       POST_IMAGE_MAX_BYTES=10)
+    def test_body_too_large(self):
+        """Тело больше лимитов загрузки отклоняется до вызова Django."""
+        sent = call(self.bridge, scope(method='POST',
+                                       headers=[(b'content-length', b'21')]))
+        self.assertEqual(sent[0]['status'], 413)
+        sent = call(self.bridge, scope(method='POST'),
+                    [{'type': 'http.request', 'body': b'x' * 15,
+                      'more_body': True},
+                     {'type': 'http.request', 'body': b'x' * 15}])
+        self.assertEqual(sent[0]['status'], 413)
+        self.assertIsNone(self.environ)
+        sent = call(self.bridge, scope(method='POST'),
+                    [{'type': 'http.request', 'body': b'x' * 20}])
+        self.assertEqual(sent[0]['status'], 201)
+        self.assertEqual(self.environ['body'], b'x' * 20)
+
+    def test_lifespan(self):
+        sent = call(self.bridge, {'type': 'lifespan'},
+                    [{'type': 'lifespan.startup'},
+                     {'type': 'lifespan.shutdown'}])
+        self.assertEqual([message['type'] for message in sent],
+                         ['lifespan.startup.complete',
+                          'lifespan.shutdown.complete'])
+
+
+class AsgiApplicationTest(TransactionTestCase):
+    """Django в потоках пула видит только закоммиченные данные."""
+
+    def setUp(self):
+        cache.clear()
+        author = User.objects.create_user(username='author')
+        Post.objects.create(author=author, text='Пост через ASGI')
+
+    def test_index(self):
+        sent = call(asgi.application, scope())
+        self.assertEqual(sent[0]['status'], 200)
+        content = b''.join(message.get('body', b'') for message in sent)
+        self.assertIn('Пост через ASGI'.encode(), content)
+
+    def test_login_required(self):
+        sent = call(asgi.application, scope('/new/'))
+        self.assertEqual(sent[0]['status'], 302)
+        self.assertIn((b'location', b'/auth/login/?next=/new/'),
+                      sent[0]['headers'])
@@ -0,0 +1,192 @@
+import json
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts import pagecache, search
+from posts.models import Comment, Follow, Group, Post, TimelineEntry
+
+User = get_user_model()
+
+
+class BatchApiTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='importer')
+        cls.author = User.objects.create_user(username='author')
+        cls.follower = User.objects.create_user(username='follower')
+        cls.group = Group.objects.create(title='Группа', slug='group',
+                                         description='Описание')
+        cls.post = Post.objects.create(author=cls.author, text='Старый пост')
+        Follow.objects.create(user=cls.follower, author=cls.user)
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def send(self, operations):
+        response = self.client.post(reverse('api:batch'),
+                                    json.dumps({'operations': operations}),
+                                    content_type='application/json')
+        return response.status_code, json.loads(response.content)
+
+    def test_creates_objects_in_order(self):
+        """Результаты идут в порядке операций и ссылаются на новые pk."""
+        status, data = self.send([
+            {'type': 'post', 'text': 'Первый пост'},
+            {'type': 'comment', 'post': self.post.pk, 'text': 'Отлично'},
+            {'type': 'post', 'text': 'Второй пост', 'group': 'group'},
+            {'type': 'follow', 'author': 'author'},
+        ])
+        self.assertEqual(status, 200)
+        results = data['results']
+        self.assertEqual([result['status'] for result in results],
+                         ['created'] * 4)
+        self.assertEqual(Post.objects.get(pk=results[0]['id']).text,
+                         'Первый пост')
+        second = Post.objects.get(pk=results[2]['id'])
+        self.assertEqual((second.text, second.group, second.author),
+                         ('Второй пост', self.group, self.user))
+        self.assertEqual(Comment.objects.get(pk=results[1]['id']).text,
+                         'Отлично')
+        self.assertTrue(Follow.objects.filter(user=self.user,
+                                              author=self.author).exists())
+
+    def test_downstream_effects(self):
+        """Счётчики, ленты, индекс и кэш страниц обновляются как от форм."""
+        with mock.patch('django.db.transaction.on_commit') as on_commit:
+            status, data = self.send(
+                [{'type': 'post', 'text': f'Пакетный пост {n}'}
+                 for n in range(3)]
+                + [{'type': 'comment', 'post': self.post.pk,
+                    'text': 'Комментарий про лыжи'}] * 2
+                + [{'type': 'follow', 'author': 'author'}])
+        on_commit.assert_called_once_with(pagecache.invalidate)
+        post_ids = {result['id'] for result in data['results'][:3]}
+        self.user.stats.refresh_from_db()
+        self.assertEqual(self.user.stats.posts_count, 3)
+        self.assertEqual(self.user.stats.following_count, 1)
+        self.author.stats.refresh_from_db()
+        self.assertEqual(self.author.stats.followers_count, 1)
+        self.assertEqual(
+            set(TimelineEntry.objects.filter(user=self.follower)
+                .values_list('post_id', flat=True)), post_ids)
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.user, post=self.post).exists())
+        self.assertEqual(set(search.search('пакетный')), post_ids)
+        self.assertEqual(search.search('лыжи'), [self.post.pk])
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 2)
+        self.assertEqual(self.post.version, 2)
+
+    def test_queries_do_not_grow_with_batch_size(self):
+        def queries(count):
+            operations = [{'type': 'post', 'text': f'Пост {n}'}
+                          for n in range(count)]
+            with CaptureQueriesContext(connection) as context:
+                self.send(operations)
+            return len(context)
+
+        self.assertEqual(queries(5), queries(50))
+
+    def test_invalid_operations(self):
+        """Ошибочные операции не мешают остальным."""
+        status, data = self.send([
+            {'type': 'post', 'text': ''},
+            {'type': 'post', 'text': 'Пост', 'group': 'missing'},
+            {'type': 'comment', 'post': 0, 'text': 'Текст'},
+            {'type': 'follow', 'author': 'importer'},
+            {'type': 'follow', 'author': 'nobody'},
+            {'type': 'like'},
+            'post',
+            {'type': 'post', 'text': 'Правильный пост'},
+        ])
+        results = data['results']
+        self.assertEqual([result['status'] for result in results],
+                         ['invalid'] * 7 + ['created'])
+        self.assertEqual(list(results[0]['errors']), ['text'])
+        self.assertEqual(list(results[1]['errors']), ['group'])
+        self.assertEqual(list(results[2]['errors']), ['post'])
+        self.assertEqual(Post.objects.filter(author=self.user).count(), 1)
+
+    def test_lookup_keys_of_wrong_type(self):
+        """Ссылки и текст не того типа — ошибка операции, а не 500."""
+        status, data = self.send([
+            {'type': 'post', 'text': 'Пост', 'group': ['group']},
+            {'type': 'post', 'text': 'Пост', 'group': {'slug': 'group'}},
+            {'type': 'comment', 'post': [self.post.pk], 'text': 'Текст'},
+            {'type': 'comment', 'post': True, 'text': 'Текст'},
+            {'type': 'comment', 'post': str(self.post.pk), 'text': 'Текст'},
+            {'type': 'follow', 'author': ['author']},
+            {'type': 'follow', 'author': 1},
+            {'type': ['post']},
+            {'type': 'post', 'text': ['Пост']},
+            {'type': 'comment', 'post': self.post.pk, 'text': 42},
+        ])
+        self.assertEqual(status, 200)
+        results = data['results']
+        self.assertEqual([result['status'] for result in results],
+                         ['invalid'] * 10)
+        self.assertEqual([list(result['errors']) for result in results],
+                         [['group'], ['group'], ['post'], ['post'], ['post'],
+                          ['author'], ['author'], ['type'], ['text'],
+                          ['text']])
+
+    def test_follow_created_concurrently(self):
+        """Подписка, появившаяся после проверки, не считается дважды."""
+        def follow_concurrently(batch):
+            Follow.objects.create(user=self.user, author=self.author)
+
+        with mock.patch('posts.batch.Batch.create_posts', autospec=True,
+                        side_effect=follow_concurrently):
+            status, data = self.send([
+                {'type': 'follow', 'author': 'author'},
+                {'type': 'follow', 'author': 'follower'},
+            ])
+        self.assertEqual([result['status'] for result in data['results']],
+                         ['exists', 'created'])
+        self.user.stats.refresh_from_db()
+        self.assertEqual(self.user.stats.following_count, 2)
+        self.author.stats.refresh_from_db()
+        self.assertEqual(self.author.stats.followers_count, 1)
+        self.follower.stats.refresh_from_db()
+        self.assertEqual(self.follower.stats.followers_count, 1)
+
+    def test_existing_follow(self):
+        status, data = self.send([{'type': 'follow', 'author': 'author'}] * 2)
+        self.assertEqual([result['status'] for result in data['results']],
+                         ['created', 'exists'])
+        self.user.stats.refresh_from_db()
+        self.assertEqual(self.user.stats.following_count, 1)
+
+    def test_request_errors(self):
+        status, data = self.send([{'type': 'post', 'text': 'Пост'}] * 101)
+        self.assertEqual(status, 400)
+        response = self.client.post(reverse('api:batch'), 'не json',
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get(reverse('api:batch'))
+        self.assertEqual(response.status_code, 405)
+        self.client.logout()
+        status, data = self.send([{'type': 'post', 'text': 'Пост'}])
+        self.assertEqual(status, 401)
+        self.assertFalse(Post.objects.filter(author=self.user).exists())
+
+    def test_one_by_one_without_bulk_pks(self):
+        """Если СУБД не возвращает pk, посты сохраняются по одному."""
+        with mock.patch.object(connection, 'vendor', 'mysql'):
+            status, data = self.send([{'type': 'post', 'text': 'Пост 1'},
+                                      {'type': 'post', 'text': 'Пост 2'}])
+        ids = [result['id'] for result in data['results']]
+        self.assertEqual(
+            list(Post.objects.filter(pk__in=ids).order_by('pk')
+                 .values_list('text', flat=True)), ['Пост 1', 'Пост 2'])
+        self.user.stats.refresh_from_db()
+        self.assertEqual(self.user.stats.posts_count, 2)
+        self.assertEqual(TimelineEntry.objects.filter(
+            user=self.follower).count(), 2)
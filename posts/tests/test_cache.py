@@ -0,0 +1,85 @@
+import shutil
+import tempfile
+import threading
+from io import StringIO
+from unittest import mock
+
+from django.core.cache import caches
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+TEMP_CACHE_DIR = tempfile.mkdtemp()
+
+
+@override_settings(CACHES={
+    'default': {
+        'BACKEND': 'yatube.cache.InstrumentedCache',
+        'OPTIONS': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'MAX_ENTRIES': 5,
+            'CULL_FREQUENCY': 2,
+        },
+    },
+    'shared': {
+        'BACKEND': 'yatube.cache.InstrumentedCache',
+        'LOCATION': TEMP_CACHE_DIR,
+        'OPTIONS': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        },
+    },
+})
+class CacheStatsTest(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_CACHE_DIR, ignore_errors=True)
+        super().tearDownClass()
+
+    def test_hits_and_misses(self):
+        """Попадания и промахи считаются для каждого кэша."""
+        for alias in ('default', 'shared'):
+            with self.subTest(alias=alias):
+                cache = caches[alias]
+                cache.clear()
+                cache.set('key', 'value')
+                cache.get('key')
+                cache.get('key')
+                cache.get('missing')
+                cache.get_many(['key', 'missing'])
+                stats = cache.stats()
+                self.assertEqual(stats['hits'], 3)
+                self.assertEqual(stats['misses'], 2)
+
+    def test_evictions(self):
+        """Вытеснение при переполнении locmem попадает в статистику."""
+        cache = caches['default']
+        cache.clear()
+        for number in range(10):
+            cache.set(f'key{number}', number)
+        self.assertGreater(cache.stats()['evictions'], 0)
+
+    def test_eviction_does_not_flush_under_backend_lock(self):
+        """Вытеснение при полном буфере счётчиков не блокирует кэш."""
+        cache = caches['default']
+        cache.clear()
+
+        def fill():
+            for number in range(10):
+                cache.set(f'key{number}', number)
+
+        with mock.patch('yatube.cache.FLUSH_EVERY', 1):
+            thread = threading.Thread(target=fill, daemon=True)
+            thread.start()
+            thread.join(timeout=5)
+        self.assertFalse(thread.is_alive())
+        self.assertGreater(cache.stats()['evictions'], 0)
+
+    def test_cache_stats_command(self):
+        """Команда cache_stats печатает строку на каждый кэш."""
+        caches['shared'].clear()
+        caches['shared'].get('missing')
+        out = StringIO()
+        call_command('cache_stats', '--reset', stdout=out)
+        output = out.getvalue()
+        self.assertIn('default (LocMemCache)', output)
+        self.assertIn('shared (FileBasedCache): hits=0 misses=1', output)
+        self.assertEqual(caches['shared'].stats()['misses'], 0)
@@ -0,0 +1,124 @@
+from unittest import mock, skipUnless
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connection, connections, router
+from django.http import HttpResponse
+from django.test import (Client, RequestFactory, TestCase,
+                         TransactionTestCase, override_settings)
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+
+from posts.models import Post
+from yatube.db import (REPLICA, STICKY_COOKIE, DatabaseMiddleware,
+                       check_connections)
+
+User = get_user_model()
+
+
+def read_alias_view(request):
+    """Отвечает алиасом БД, с которого читались бы посты."""
+    return HttpResponse(router.db_for_read(Post))
+
+
+class ReplicaRoutingTest(TestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.middleware = DatabaseMiddleware(read_alias_view)
+        replica = dict(connections.databases[DEFAULT_DB_ALIAS],
+                       TEST={'MIRROR': DEFAULT_DB_ALIAS})
+        patcher = mock.patch.dict(connections.databases, {REPLICA: replica})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def call(self, method, path, cookies=None):
+        request = getattr(self.factory, method)(path)
+        request.COOKIES.update(cookies or {})
+        request.resolver_match = resolve(path)
+        # process_view вызывается обработчиком внутри __call__, здесь —
+        # заранее: алиас сбрасывается после ответа.
+        self.middleware.process_view(request, read_alias_view, (), {})
+        return self.middleware(request)
+
+    def test_feed_reads_from_replica(self):
+        """Ленты читаются с реплики, остальные страницы — из основной БД."""
+        self.assertEqual(self.call('get', '/').content.decode(), REPLICA)
+        self.assertEqual(self.call('get', '/new/').content.decode(),
+                         DEFAULT_DB_ALIAS)
+        self.assertEqual(router.db_for_read(Post), DEFAULT_DB_ALIAS)
+
+    def test_write_makes_reads_sticky(self):
+        """После записи посетитель какое-то время читает из основной БД."""
+        response = self.call('post', '/new/')
+        cookie = response.cookies[STICKY_COOKIE]
+        self.assertEqual(cookie['max-age'], settings.DATABASE_REPLICA_LAG)
+        response = self.call('get', '/', cookies={STICKY_COOKIE: '1'})
+        self.assertEqual(response.content.decode(), DEFAULT_DB_ALIAS)
+
+    def test_writes_and_sessions_use_primary(self):
+        request = self.factory.get('/')
+        request.resolver_match = resolve('/')
+        self.middleware.process_view(request, read_alias_view, (), {})
+        try:
+            self.assertEqual(router.db_for_read(Post), REPLICA)
+            self.assertEqual(router.db_for_write(Post), DEFAULT_DB_ALIAS)
+            self.assertEqual(router.db_for_read(Session), DEFAULT_DB_ALIAS)
+        finally:
+            self.middleware(request)
+        self.assertEqual(router.db_for_read(Post), DEFAULT_DB_ALIAS)
+
+
+class HealthCheckTest(TestCase):
+    def test_dead_connection_is_closed(self):
+        """Соединение, которое не отвечает, закрывается до запроса."""
+        dead = mock.Mock(settings_dict={'CONN_MAX_AGE': 60})
+        dead.is_usable.return_value = False
+        alive = mock.Mock(settings_dict={'CONN_MAX_AGE': 60})
+        alive.is_usable.return_value = True
+        with mock.patch.object(connections, 'all',
+                               return_value=[dead, alive]):
+            check_connections()
+        dead.close.assert_called_once_with()
+        alive.close.assert_not_called()
+
+
+@skipUnless(connection.vendor == 'sqlite', 'Прагмы SQLite')
+class SqlitePragmasTest(TestCase):
+    def test_new_connection_gets_pragmas(self):
+        """Каждое соединение получает прагмы из SQLITE_PRAGMAS."""
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0],
+                             settings.SQLITE_PRAGMAS['busy_timeout'])
+
+
+@skipUnless(REPLICA in settings.DATABASES,
+            'Нужен алиас replica: задайте DB_REPLICA_NAME')
+@override_settings(PAGE_CACHE_TIMEOUT=0)
+class ReplicaDatabaseTest(TransactionTestCase):
+    # Реплика видит только закоммиченные данные, поэтому без обёртки
+    # теста в транзакцию.
+    databases = {DEFAULT_DB_ALIAS, REPLICA}
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='writer')
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def replica_queries(self, url):
+        with CaptureQueriesContext(connections[REPLICA]) as queries:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        return len(queries)
+
+    def test_read_your_writes(self):
+        """Новый пост автор читает из основной БД, а не с реплики."""
+        self.assertGreater(self.replica_queries(reverse('posts:index')), 0)
+        response = self.client.post(reverse('posts:new_post'),
+                                    {'text': 'Свежий пост'})
+        self.assertIn(STICKY_COOKIE, response.cookies)
+        self.assertEqual(self.replica_queries(reverse('posts:index')), 0)
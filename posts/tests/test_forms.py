@@ -1,11 +1,13 @@
 import shutil
 import tempfile
+from io import BytesIO
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
+from PIL import Image
 
 from posts.models import Post
 
@@ -86,3 +88,60 @@ class PostFormTests(TestCase):
                             'post_id': self.post.id}),
         )
         self.assertEqual(response.context['post'].text, 'Новый текст')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ImageUploadTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Uploader')
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.author)
+
+    @staticmethod
+    def jpeg(size=(40, 20)):
+        exif = Image.Exif()
+        exif[0x010F] = 'Секретная камера'
+        buffer = BytesIO()
+        Image.new('RGB', size, (200, 10, 10)).save(buffer, 'JPEG',
+                                                   exif=exif.tobytes())
+        return SimpleUploadedFile(name='photo.jpg',
+                                  content=buffer.getvalue(),
+                                  content_type='image/jpeg')
+
+    def upload(self, image):
+        return self.authorized_client.post(
+            reverse('posts:new_post'),
+            data={'text': 'Пост с фото', 'image': image})
+
+    def test_exif_is_stripped(self):
+        """Загруженная картинка сохраняется без EXIF."""
+        self.upload(self.jpeg())
+        post = Post.objects.get(text='Пост с фото')
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.size, (40, 20))
+            self.assertEqual(len(image.getexif()), 0)
+
+    @override_settings(POST_IMAGE_MAX_BYTES=100)
+    def test_too_big_file_is_rejected(self):
+        """Слишком большой файл отклоняется с понятной ошибкой."""
+        response = self.upload(self.jpeg())
+        self.assertFalse(Post.objects.filter(text='Пост с фото').exists())
+        self.assertIn('Файл слишком большой',
+                      str(response.context['form'].errors['image']))
+
+    @override_settings(POST_IMAGE_MAX_DIMENSIONS=(20, 20))
+    def test_too_big_dimensions_are_rejected(self):
+        """Картинка больше допустимых размеров отклоняется."""
+        response = self.upload(self.jpeg(size=(40, 20)))
+        self.assertFalse(Post.objects.filter(text='Пост с фото').exists())
+        self.assertIn('Изображение слишком большое',
+                      str(response.context['form'].errors['image']))
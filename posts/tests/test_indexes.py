@@ -0,0 +1,101 @@
+from unittest import skipUnless
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from posts.models import Follow, Group, Post
+from posts.paginator import CursorPaginator
+from posts.timeline import TimelinePaginator
+
+User = get_user_model()
+
+
+@skipUnless(connection.vendor == 'sqlite', 'План запроса в формате SQLite')
+class FeedIndexTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(title='Группа', slug='group',
+                                         description='Описание')
+        cls.post = Post.objects.create(author=cls.author, text='Текст',
+                                       group=cls.group)
+
+    def assertUsesIndex(self, queryset, table, index):
+        plan = queryset.explain()
+        self.assertNotIn('TEMP B-TREE', plan)
+        table_steps = [line for line in plan.splitlines()
+                       if f' {table} ' in line]
+        self.assertTrue(table_steps, plan)
+        for line in table_steps:
+            self.assertIn(f'INDEX {index}', line)
+
+    def test_feeds_use_index_without_sort(self):
+        """Ленты читаются по индексу без сортировки, и по курсору тоже."""
+        feeds = {
+            'post_pub_date': Post.objects.feed(),
+            'post_group_pub_date': self.group.posts.feed(),
+            'post_author_pub_date': self.author.posts.feed(),
+        }
+        for index, post_list in feeds.items():
+            paginator = CursorPaginator(post_list, 10)
+            position = [self.post.pub_date, self.post.pk]
+            queries = (
+                paginator.object_list[:11],
+                paginator.object_list.filter(
+                    paginator._seek_filter(position))[:11],
+            )
+            for queryset in queries:
+                with self.subTest(index=index):
+                    self.assertUsesIndex(queryset, 'posts_post', index)
+            plan = queries[1].explain()
+            self.assertIn('pub_date<?', plan.replace(' ', ''))
+
+    @override_settings(TIMELINE_FANOUT_THRESHOLD=1)
+    def test_follow_feed_uses_index_without_sort(self):
+        """Страница ленты подписок — поиски по индексам без сортировки:
+        разложенные посты и посты «тяжёлого» автора."""
+        reader = User.objects.create_user(username='reader')
+        star = User.objects.create_user(username='star')
+        Follow.objects.create(user=reader, author=self.author)
+        Follow.objects.create(user=reader, author=star)
+        Follow.objects.create(
+            user=User.objects.create_user(username='fan'), author=star)
+        Post.objects.create(author=star, text='Текст')
+        position = [self.post.pub_date, self.post.pk]
+        for name, kwargs in {'first': {}, 'cursor': {'position': position},
+                             'previous': {'position': position,
+                                          'backwards': True}}.items():
+            paginator = TimelinePaginator(Post.objects.feed(), 10, reader)
+            with CaptureQueriesContext(connection) as context:
+                paginator.fetch(11, **kwargs)
+            plans = []
+            with connection.cursor() as cursor:
+                for query in context.captured_queries:
+                    cursor.execute(f'EXPLAIN QUERY PLAN {query["sql"]}')
+                    plans.extend(row[-1] for row in cursor.fetchall())
+            plan = '\n'.join(plans)
+            with self.subTest(page=name):
+                self.assertNotIn('TEMP B-TREE', plan)
+                self.assertIn('COVERING INDEX timeline_user_pub_date', plan)
+                self.assertIn('INDEX post_author_pub_date', plan)
+
+    def test_comments_use_index_without_sort(self):
+        """Комментарии поста читаются по индексу в порядке создания."""
+        self.assertUsesIndex(
+            self.post.comments.order_by('created', 'id'),
+            'posts_comment', 'comment_post_created')
+
+    def test_follow_indexes(self):
+        """Подписки и подписчики читаются из покрывающих индексов."""
+        following = Follow.objects.filter(
+            user=self.author).values('author_id')
+        followers = Follow.objects.filter(
+            author=self.author).values('user_id')
+        # UNIQUE (user, author) в SQLite становится автоматическим индексом.
+        self.assertUsesIndex(following, 'posts_follow',
+                             'sqlite_autoindex_posts_follow')
+        self.assertUsesIndex(followers, 'posts_follow', 'follow_author_user')
+        for queryset in (following, followers):
+            self.assertIn('COVERING INDEX', queryset.explain())
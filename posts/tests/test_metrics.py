@@ -0,0 +1,63 @@
+import re
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Post
+from yatube.metrics import METRICS
+
+User = get_user_model()
+
+
+class MetricsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(username='author')
+        Post.objects.create(author=author, text='Пост')
+
+    def setUp(self):
+        cache.clear()
+        for metric in METRICS:
+            metric.clear()
+        self.client = Client()
+
+    def metrics(self):
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        return {name: float(value) for name, value in re.findall(
+            r'^(\S+) (\S+)$', response.content.decode(), re.MULTILINE)
+            if not name.startswith('#')}
+
+    @override_settings(METRICS_SAMPLE_RATE=1)
+    def test_sampled_request_is_measured(self):
+        """У замеренного запроса есть время, SQL, шаблоны и кэш."""
+        self.client.get(reverse('posts:index'))
+        self.client.get(reverse('posts:index'))
+        metrics = self.metrics()
+        view = 'view="posts:index"'
+        self.assertEqual(metrics[f'yatube_requests_total{{{view}}}'], 2)
+        self.assertEqual(
+            metrics[f'yatube_request_duration_seconds_count{{{view}}}'], 2)
+        self.assertGreater(metrics[f'yatube_db_queries_sum{{{view}}}'], 0)
+        self.assertGreater(
+            metrics[f'yatube_template_duration_seconds_sum{{{view}}}'], 0)
+        # Вторая страница пришла из общего кэша.
+        self.assertGreater(metrics[
+            f'yatube_cache_requests_total{{{view},result="hit"}}'], 0)
+
+    @override_settings(METRICS_SAMPLE_RATE=0)
+    def test_unsampled_request_is_only_counted(self):
+        self.client.get(reverse('posts:index'))
+        metrics = self.metrics()
+        self.assertEqual(
+            metrics['yatube_requests_total{view="posts:index"}'], 1)
+        self.assertNotIn(
+            'yatube_request_duration_seconds_count{view="posts:index"}',
+            metrics)
+
+    def test_metrics_closed_for_other_addresses(self):
+        response = self.client.get(reverse('metrics'),
+                                   REMOTE_ADDR='203.0.113.5')
+        self.assertEqual(response.status_code, 403)
@@ -1,7 +1,10 @@
+from io import StringIO
+
 from django.contrib.auth import get_user_model
+from django.core.management import call_command
 from django.test import TestCase
 
-from posts.models import Group, Post
+from posts.models import Comment, Follow, Group, Post, UserStats
 
 User = get_user_model()
 
@@ -57,3 +60,59 @@ class GroupModelTest(TestCase):
         group = GroupModelTest.group
         expected_object_title = group.__str__()
         self.assertEqual(expected_object_title, str(group))
+
+
+class UserStatsTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='Reader')
+        self.author = User.objects.create_user(username='Writer')
+
+    def stats(self, user):
+        return UserStats.objects.get(user=user)
+
+    def test_post_counter(self):
+        """Счётчик записей меняется при создании и удалении поста."""
+        post = Post.objects.create(text='Пост', author=self.author)
+        self.assertEqual(self.stats(self.author).posts_count, 1)
+        post.delete()
+        self.assertEqual(self.stats(self.author).posts_count, 0)
+
+    def test_follow_counters(self):
+        """Счётчики подписок меняются при подписке и отписке."""
+        follow = Follow.objects.create(user=self.user, author=self.author)
+        self.assertEqual(self.stats(self.author).followers_count, 1)
+        self.assertEqual(self.stats(self.user).following_count, 1)
+        follow.delete()
+        self.assertEqual(self.stats(self.author).followers_count, 0)
+        self.assertEqual(self.stats(self.user).following_count, 0)
+
+    def test_recount_stats_fixes_drift(self):
+        """Команда recount_stats исправляет расхождения счётчиков."""
+        Post.objects.create(text='Пост', author=self.author)
+        Follow.objects.create(user=self.user, author=self.author)
+        UserStats.objects.filter(user=self.author).update(
+            posts_count=10, followers_count=0)
+        UserStats.objects.filter(user=self.user).delete()
+        call_command('recount_stats', stdout=StringIO())
+        author_stats = self.stats(self.author)
+        self.assertEqual(author_stats.posts_count, 1)
+        self.assertEqual(author_stats.followers_count, 1)
+        self.assertEqual(self.stats(self.user).following_count, 1)
+
+
+class CommentCountTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Commentator')
+        cls.post = Post.objects.create(text='Пост', author=cls.user)
+
+    def test_comment_count(self):
+        """comment_count меняется при создании и удалении комментария."""
+        comment = Comment.objects.create(post=self.post, author=self.user,
+                                         text='Комментарий')
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 1)
+        comment.delete()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 0)
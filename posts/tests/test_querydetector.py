@@ -0,0 +1,126 @@
+from unittest import mock
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.template import engines
+from django.test import Client, RequestFactory, TestCase, override_settings
+from django.urls import path, reverse
+
+from posts.models import Comment, Follow, Group, Post
+from yatube import pytest_plugin
+from yatube.querydetector import (QueryDetectorMiddleware, QueryRecorder,
+                                  normalize)
+
+User = get_user_model()
+
+
+def n_plus_one_view(request):
+    """Имена авторов без select_related: запрос на каждый пост."""
+    template = engines['django'].from_string(
+        '{% for post in posts %}{{ post.author.username }}{% endfor %}')
+    return HttpResponse(template.render({'posts': Post.objects.all()}))
+
+
+urlpatterns = [path('n-plus-one/', n_plus_one_view),
+               path('ok/', lambda request: HttpResponse('ok'))]
+
+
+class QueryDetectorTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.group = Group.objects.create(title='Группа', slug='group',
+                                         description='Описание')
+        for number in range(3):
+            author = User.objects.create_user(username=f'author{number}')
+            post = Post.objects.create(author=author, text=f'Пост {number}',
+                                       group=cls.group)
+            Comment.objects.create(post=post, author=author, text='Коммент')
+        cls.reader = User.objects.create_user(username='reader')
+        Follow.objects.create(user=cls.reader, author=author)
+        cls.post = post
+
+    def test_normalize(self):
+        self.assertEqual(
+            normalize('SELECT * FROM t WHERE id IN (%s, %s, %s)\n LIMIT 21'),
+            'SELECT * FROM t WHERE id IN (...) LIMIT ?')
+        self.assertEqual(normalize("SELECT 'a''b', %s"), 'SELECT ?, ?')
+
+    @override_settings(QUERY_DETECTOR=True)
+    def test_middleware_logs_duplicates_with_stack(self):
+        """Повторы попадают в лог со строкой кода и шаблона."""
+        middleware = QueryDetectorMiddleware(n_plus_one_view)
+        request = RequestFactory().get('/')
+        request.resolver_match = None
+        with self.assertLogs('yatube.queries', 'WARNING') as logs:
+            middleware(request)
+        output = '\n'.join(logs.output)
+        self.assertIn('3× ', output)
+        self.assertIn('"auth_user"', output)
+        self.assertIn('test_querydetector.py', output)
+
+    @override_settings(PAGE_CACHE_TIMEOUT=0)
+    def test_pages_have_no_duplicate_queries(self):
+        """На страницах сайта нет повторяющихся запросов (N+1)."""
+        client = Client()
+        client.force_login(self.reader)
+        author = self.post.author.username
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_posts', args=[self.group.slug]),
+            reverse('posts:profile', args=[author]),
+            reverse('posts:post', args=[author, self.post.pk]),
+            reverse('posts:post_comments', args=[author, self.post.pk]),
+            reverse('posts:follow_index'),
+            reverse('posts:search') + '?q=пост',
+        )
+        cache.clear()
+        for url in urls:
+            with self.subTest(url=url):
+                with QueryRecorder() as recorder:
+                    self.assertEqual(client.get(url).status_code, 200)
+                duplicates = recorder.duplicates(2)
+                self.assertEqual(duplicates, [], recorder.report(duplicates))
+
+
+@override_settings(ROOT_URLCONF=__name__, PAGE_CACHE_TIMEOUT=0)
+class PytestPluginTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for number in range(3):
+            author = User.objects.create_user(username=f'author{number}')
+            Post.objects.create(author=author, text=f'Пост {number}')
+
+    def run_hook(self, body, marker=None):
+        """Прогоняет тело теста через обёртку pytest_runtest_call."""
+        item = mock.Mock()
+        item.get_closest_marker.return_value = marker
+        item.config.getoption.return_value = 3
+        wrapper = pytest_plugin.pytest_runtest_call(item)
+        next(wrapper)
+        body()
+        with self.assertRaises(StopIteration):
+            wrapper.send(mock.Mock(excinfo=None))
+
+    # Сами тесты нарочно делают запрос с N+1: внешняя обёртка плагина
+    # (pytest -p yatube.pytest_plugin) не должна их проверять.
+    @pytest.mark.allow_duplicate_queries
+    def test_duplicates_in_request_fail(self):
+        with self.assertRaises(pytest.fail.Exception) as error:
+            self.run_hook(lambda: Client().get('/n-plus-one/'))
+        self.assertIn('3× ', str(error.exception))
+
+    def test_fixture_loop_is_not_flagged(self):
+        """Повторы при подготовке данных, вне запросов, не считаются."""
+        def body():
+            for post in Post.objects.all():
+                post.author.username
+            Client().get('/ok/')
+
+        self.run_hook(body)
+
+    @pytest.mark.allow_duplicate_queries
+    def test_marker_skips_check(self):
+        self.run_hook(lambda: Client().get('/n-plus-one/'),
+                      marker=mock.Mock())
@@ -0,0 +1,164 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts import search
+from posts.models import Comment, Group, Post, SearchTerm
+from posts.stemmer import stem
+
+User = get_user_model()
+
+
+class StemmerTest(TestCase):
+    def test_word_forms_share_stem(self):
+        """Разные формы слова приводятся к одной основе."""
+        forms = (
+            ('котики', 'котиков', 'котик'),
+            ('книгами', 'книги', 'книг'),
+            ('ежики', 'Ёжиков', 'ёжик'),
+            ('читающий', 'читала', 'читал'),
+        )
+        for variants in forms:
+            with self.subTest(variants=variants):
+                self.assertEqual(
+                    len({stem(variant) for variant in variants}), 1)
+
+
+class SearchTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='Searcher')
+        cls.group = Group.objects.create(title='Любители котиков',
+                                         slug='cats',
+                                         description='Про котов')
+        cls.cat_post = Post.objects.create(
+            author=cls.author, text='Мой котик спит на диване')
+        cls.group_post = Post.objects.create(
+            author=cls.author, text='Фото из поездки', group=cls.group)
+        cls.other_post = Post.objects.create(
+            author=cls.author, text='Книги, которые я прочитал')
+
+    def test_finds_word_forms(self):
+        """Поиск находит пост по другой форме слова."""
+        self.assertIn(self.cat_post.pk, search.search('котики'))
+        self.assertEqual(search.search('прочитала книгу'),
+                         [self.other_post.pk])
+
+    def test_all_words_required(self):
+        """В результатах только посты со всеми словами запроса."""
+        self.assertEqual(search.search('котики спит'), [self.cat_post.pk])
+        self.assertEqual(search.search('котик самолёт'), [])
+        self.assertEqual(search.search('и на'), [])
+
+    def test_group_title_ranks_higher(self):
+        """Слово из названия группы весит больше, чем слово из текста."""
+        self.assertEqual(search.search('котиков'),
+                         [self.group_post.pk, self.cat_post.pk])
+
+    def test_index_follows_changes(self):
+        """Индекс обновляется при правке поста и группы."""
+        self.other_post.text = 'Теперь про велосипеды'
+        self.other_post.save()
+        self.assertEqual(search.search('книги'), [])
+        self.assertEqual(search.search('велосипед'), [self.other_post.pk])
+        self.group.title = 'Путешественники'
+        self.group.save()
+        self.assertEqual(search.search('путешествия котов'), [])
+        self.assertEqual(search.search('путешественник'),
+                         [self.group_post.pk])
+        self.group.delete()
+        self.assertEqual(search.search('путешественник'), [])
+
+    def test_group_reindexed_only_on_title_change(self):
+        """Посты группы переиндексируются, только если сменилось название."""
+        with mock.patch('posts.search.reindex_posts') as reindex_posts:
+            self.group.description = 'Про кошек'
+            self.group.save()
+            reindex_posts.assert_not_called()
+            self.group.title = 'Любители кошек'
+            self.group.save()
+            reindex_posts.assert_called_once()
+
+    def test_search_does_not_count_posts(self):
+        """Поиск не считает все посты на каждый запрос."""
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(search.search('котики спит'),
+                             [self.cat_post.pk])
+        post_table = Post._meta.db_table
+        self.assertFalse([query['sql'] for query in queries
+                          if 'COUNT(*)' in query['sql']
+                          and post_table in query['sql']])
+
+    def test_comments_are_indexed(self):
+        """Слова комментариев ищутся и убираются вместе с комментарием."""
+        comment = Comment.objects.create(post=self.group_post,
+                                         author=self.author,
+                                         text='Какие красивые горы')
+        self.assertEqual(search.search('гора'), [self.group_post.pk])
+        comment.delete()
+        self.assertEqual(search.search('гора'), [])
+        self.assertTrue(SearchTerm.objects.filter(
+            post=self.group_post, term=stem('поездки')).exists())
+
+    def test_post_with_comments_can_be_deleted(self):
+        """Удаление поста с комментариями удаляет его из индекса."""
+        post = Post.objects.create(author=self.author, text='Котик')
+        Comment.objects.create(post=post, author=self.author,
+                               text='Котик милый')
+        post_id = post.pk
+        post.delete()
+        self.assertFalse(SearchTerm.objects.filter(post_id=post_id).exists())
+
+    def test_post_deletion_skips_comment_bookkeeping(self):
+        """
+        Каскадное удаление комментариев вместе с постом не обновляет
+        ни счётчик, ни индекс по каждому комментарию.
+        """
+        def deletion_queries(comments):
+            post = Post.objects.create(author=self.author, text='Котик')
+            Comment.objects.bulk_create(
+                Comment(post=post, author=self.author, text='Котик милый')
+                for _ in range(comments))
+            with CaptureQueriesContext(connection) as queries:
+                post.delete()
+            return len(queries)
+
+        self.assertEqual(deletion_queries(2), deletion_queries(20))
+        comment = Comment.objects.create(post=self.cat_post,
+                                         author=self.author, text='Милый')
+        comment.delete()
+        self.cat_post.refresh_from_db()
+        self.assertEqual(self.cat_post.comment_count, 0)
+
+    def test_rebuild_index(self):
+        """Пересборка даёт тот же индекс, что и сигналы."""
+        Comment.objects.create(post=self.cat_post, author=self.author,
+                               text='Котик милый')
+        before = set(SearchTerm.objects.values_list('term', 'post',
+                                                    'weight'))
+        SearchTerm.objects.all().delete()
+        self.assertEqual(search.rebuild_index(batch_size=2), 3)
+        after = set(SearchTerm.objects.values_list('term', 'post',
+                                                   'weight'))
+        self.assertEqual(before, after)
+
+    @override_settings(SEARCH_MAX_RESULTS=5)
+    def test_search_view(self):
+        """Страница поиска показывает найденные посты постранично."""
+        Post.objects.bulk_create(
+            Post(author=self.author, text=f'Котик номер {number}')
+            for number in range(12))
+        search.rebuild_index()
+        response = Client().get(reverse('posts:search'), {'q': 'котик'})
+        page = response.context['page']
+        self.assertEqual(page.paginator.count, 5)
+        self.assertEqual(len(page.object_list), 5)
+        self.assertTrue(all(isinstance(post, Post)
+                            for post in page.object_list))
+        response = Client().get(reverse('posts:search'),
+                                {'q': 'котик', 'page': 2})
+        self.assertEqual(response.context['page'].number, 1)
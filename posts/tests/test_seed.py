@@ -0,0 +1,106 @@
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db.models import Count
+from django.test import TestCase, override_settings
+
+from posts import search
+from posts.models import Comment, Follow, Group, Post, TimelineEntry
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+OPTIONS = {'users': 30, 'groups': 3, 'posts': 200, 'comments': 300,
+           'follows': 4, 'seed': 7, 'batch_size': 50, 'workers': 1}
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class SeedCommandTest(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def seed(self, **options):
+        call_command('seed', stdout=StringIO(), **{**OPTIONS, **options})
+
+    def snapshot(self):
+        """Посты, комментарии и подписки относительно первых pk."""
+        user_base = User.objects.order_by('pk').first().pk
+        post_base = Post.objects.order_by('pk').first().pk
+        posts = [(post.pk - post_base, post.author_id - user_base,
+                  post.text, post.group.slug if post.group else None)
+                 for post in Post.objects.order_by('pk')
+                 .select_related('group')]
+        comments = list(Comment.objects.order_by('pk').values_list(
+            'post_id', 'author_id', 'text'))
+        comments = [(post_id - post_base, author_id - user_base, text)
+                    for post_id, author_id, text in comments]
+        follows = sorted(
+            (user_id - user_base, author_id - user_base)
+            for user_id, author_id in Follow.objects.values_list(
+                'user_id', 'author_id'))
+        return posts, comments, follows
+
+    def test_creates_objects(self):
+        """seed создаёт заданное число объектов после существующих."""
+        existing = User.objects.create_user(username='existing')
+        self.seed()
+        self.assertEqual(User.objects.count(), OPTIONS['users'] + 1)
+        self.assertEqual(Group.objects.count(), OPTIONS['groups'])
+        self.assertEqual(Post.objects.count(), OPTIONS['posts'])
+        self.assertEqual(Comment.objects.count(), OPTIONS['comments'])
+        self.assertTrue(Follow.objects.exists())
+        self.assertFalse(Post.objects.filter(author=existing).exists())
+        self.assertEqual(
+            User.objects.filter(username__startswith='user').count(),
+            OPTIONS['users'])
+
+    def test_authors_are_skewed(self):
+        """Большая часть постов у немногих авторов."""
+        self.seed()
+        counts = sorted(Post.objects.order_by().values('author').annotate(
+            count=Count('pk')).values_list('count', flat=True), reverse=True)
+        self.assertGreater(sum(counts[:3]), OPTIONS['posts'] / 4)
+
+    def test_is_deterministic(self):
+        """Одинаковый seed даёт одинаковые данные."""
+        self.seed()
+        first = self.snapshot()
+        User.objects.all().delete()
+        Group.objects.all().delete()
+        self.seed()
+        self.assertEqual(self.snapshot(), first)
+        User.objects.all().delete()
+        Group.objects.all().delete()
+        self.seed(seed=8)
+        self.assertNotEqual(self.snapshot(), first)
+
+    def test_denormalized_data_is_consistent(self):
+        """Счётчики, ленты подписок и поисковый индекс заполнены."""
+        self.seed()
+        for post in Post.objects.annotate(real=Count('comments')):
+            self.assertEqual(post.comment_count, post.real)
+        for user in User.objects.annotate(real=Count('posts')):
+            self.assertEqual(user.stats.posts_count, user.real)
+        follow = Follow.objects.first()
+        self.assertEqual(
+            set(TimelineEntry.objects.filter(user_id=follow.user_id,
+                                             post__author_id=follow.author_id)
+                .values_list('post_id', flat=True)),
+            set(Post.objects.filter(author_id=follow.author_id)
+                .values_list('pk', flat=True)))
+        post = Post.objects.first()
+        word = max(post.text.split(), key=len).strip('.,')
+        self.assertIn(post.pk, search.search(word))
+
+    def test_images(self):
+        """--images задаёт долю постов с картинками."""
+        self.seed(images=1, posts=20)
+        post = Post.objects.first()
+        self.assertTrue(post.image)
+        self.assertTrue(post.image.storage.exists(post.image.name))
@@ -1,15 +1,22 @@
 import shutil
 import tempfile
+from io import StringIO
+from unittest import mock
 
 from django import forms
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.cache import cache
+from django.core.files.storage import default_storage
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
 from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
-from posts.models import Follow, Group, Post
+from posts import pagecache, thumbnails
+from posts.models import Comment, Follow, Group, Post, TimelineEntry
 
 User = get_user_model()
 
@@ -37,6 +44,7 @@ class PostPagesTests(TestCase):
         }
 
     def setUp(self):
+        cache.clear()
         self.authorized_client = Client()
         self.authorized_client.force_login(self.user)
 
@@ -142,6 +150,9 @@ class PaginatorViewsTest(TestCase):
                 text=f'Тестовый пост номер {count}',
                 author=cls.user)
 
+    def setUp(self):
+        cache.clear()
+
     def test_first_page_containse_ten_records(self):
         response = self.authorized_client.get(reverse('posts:index'))
         self.assertEqual(len(response.context.get('page').object_list), 10)
@@ -152,6 +163,260 @@ class PaginatorViewsTest(TestCase):
         )
         self.assertEqual(len(response.context.get('page').object_list), 3)
 
+    def test_cursor_pages(self):
+        """Курсоры ведут на следующую и обратно на предыдущую страницу."""
+        first_page = self.authorized_client.get(
+            reverse('posts:index')).context['page']
+        response = self.authorized_client.get(
+            reverse('posts:index')
+            + f'?cursor={first_page.paginator.next_cursor}'
+        )
+        second_page = response.context['page']
+        self.assertEqual(len(second_page.object_list), 3)
+        self.assertFalse(second_page.has_next())
+        self.assertTrue(second_page.has_previous())
+        response = self.authorized_client.get(
+            reverse('posts:index')
+            + f'?cursor={second_page.paginator.previous_cursor}'
+        )
+        self.assertEqual(list(response.context['page'].object_list),
+                         list(first_page.object_list))
+        self.assertFalse(response.context['page'].has_previous())
+
+    def test_invalid_cursor_returns_first_page(self):
+        response = self.authorized_client.get(
+            reverse('posts:index') + '?cursor=broken'
+        )
+        self.assertEqual(len(response.context['page'].object_list), 10)
+        self.assertFalse(response.context['page'].has_previous())
+
+    def test_page_number_out_of_range_returns_first_page(self):
+        """Старая ссылка на несуществующую страницу ведёт на первую."""
+        response = self.authorized_client.get(
+            reverse('posts:index') + '?page=999'
+        )
+        page = response.context['page']
+        self.assertEqual(page.number, 1)
+        self.assertEqual(len(page.object_list), 10)
+        self.assertFalse(page.has_previous())
+        self.assertTrue(page.paginator.next_cursor)
+
+    def test_paginator_does_not_count(self):
+        """Постраничный вывод обходится без COUNT(*)."""
+        with CaptureQueriesContext(connection) as queries:
+            self.authorized_client.get(reverse('posts:index') + '?page=2')
+        for query in queries.captured_queries:
+            self.assertNotIn('__count', query['sql'])
+
+
+class FeedQueriesTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Reader')
+        cls.author = User.objects.create_user(username='Writer')
+        cls.group = Group.objects.create(title='Группа',
+                                         slug='feed-slug',
+                                         description='Описание')
+        Follow.objects.create(user=cls.user, author=cls.author)
+        cls.urls = [reverse('posts:index'),
+                    reverse('posts:group_posts',
+                            kwargs={'slug': cls.group.slug}),
+                    reverse('posts:profile',
+                            kwargs={'username': cls.author.username}),
+                    reverse('posts:follow_index')]
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+        cache.clear()
+
+    def create_posts(self, count):
+        for number in range(count):
+            post = Post.objects.create(text=f'Пост {number}',
+                                       author=self.author,
+                                       group=self.group)
+            Comment.objects.create(post=post, author=self.user,
+                                   text='Комментарий')
+
+    def count_queries(self, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.authorized_client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_feed_queries_do_not_depend_on_page_size(self):
+        """Число запросов ленты не растёт вместе с числом постов."""
+        self.create_posts(1)
+        expected = {url: self.count_queries(url) for url in self.urls}
+        self.create_posts(9)
+        for url in self.urls:
+            with self.subTest(url=url):
+                self.assertEqual(self.count_queries(url), expected[url])
+
+    def test_feed_shows_comment_count(self):
+        self.create_posts(1)
+        response = self.authorized_client.get(reverse('posts:index'))
+        self.assertEqual(response.context['page'][0].comment_count, 1)
+        self.assertContains(response, 'Комментариев: 1')
+
+
+@mock.patch('posts.views.COMMENTS_PER_PAGE', 5)
+class CommentPaginationTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='Commented')
+        cls.post = Post.objects.create(text='Популярный пост',
+                                       author=cls.author)
+        cls.url = reverse('posts:post',
+                          kwargs={'username': cls.author.username,
+                                  'post_id': cls.post.id})
+        cls.more_url = reverse('posts:post_comments',
+                               kwargs={'username': cls.author.username,
+                                       'post_id': cls.post.id})
+
+    def add_comments(self, count):
+        for number in range(count):
+            user = User.objects.create_user(
+                username=f'commenter{Comment.objects.count()}')
+            Comment.objects.create(post=self.post, author=user,
+                                   text=f'Комментарий {number}')
+
+    def count_queries(self, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_comment_queries_do_not_depend_on_count(self):
+        """Число запросов не растёт вместе с числом комментариев."""
+        self.add_comments(1)
+        expected = self.count_queries(self.url)
+        self.add_comments(8)
+        self.assertEqual(self.count_queries(self.url), expected)
+
+    def test_load_more_returns_next_batch(self):
+        """Кнопка «Показать ещё» подгружает следующую порцию."""
+        self.add_comments(7)
+        texts = list(Comment.objects.order_by('created', 'id')
+                     .values_list('text', flat=True))
+        response = self.client.get(self.url)
+        self.assertEqual([comment.text for comment in
+                          response.context['comments']], texts[:5])
+        cursor = response.context['comment_page'].paginator.next_cursor
+        self.assertContains(response, f'{self.more_url}?comments={cursor}')
+        response = self.client.get(self.more_url, {'comments': cursor})
+        self.assertTemplateUsed(response, 'posts/comment_list.html')
+        self.assertTemplateNotUsed(response, 'base.html')
+        self.assertEqual([comment.text for comment in
+                          response.context['comments']], texts[5:])
+        self.assertNotContains(response, 'load-comments')
+
+
+class ConditionalGetTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='Etag')
+        cls.reader = User.objects.create_user(username='EtagReader')
+        cls.group = Group.objects.create(title='Группа', slug='etag',
+                                         description='Описание')
+        cls.post = Post.objects.create(text='Пост', author=cls.author,
+                                       group=cls.group)
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        cls.urls = [
+            reverse('posts:index'),
+            reverse('posts:group_posts', kwargs={'slug': 'etag'}),
+            reverse('posts:profile', kwargs={'username': 'Etag'}),
+            reverse('posts:post', kwargs={'username': 'Etag',
+                                          'post_id': cls.post.id}),
+            reverse('posts:follow_index'),
+        ]
+
+    def setUp(self):
+        self.client.force_login(self.reader)
+
+    def revalidate(self, url):
+        # Первый визит ставит CSRF-куку, ETag считается уже с ней.
+        self.client.get(url)
+        etag = self.client.get(url)['ETag']
+        return self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+    def test_unchanged_page_is_not_rendered(self):
+        """Неизменившаяся страница отдаётся как 304 без шаблона."""
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.revalidate(url)
+                self.assertEqual(response.status_code, 304)
+                self.assertFalse(response.templates)
+
+    def edit_post(self):
+        post = Post.objects.get(pk=self.post.pk)
+        post.text = 'Правка'
+        post.save()
+
+    def test_changes_invalidate_etag(self):
+        """Новый комментарий и правка поста меняют ETag."""
+        changes = (
+            lambda: Comment.objects.create(post=self.post,
+                                           author=self.reader, text='Да'),
+            self.edit_post,
+        )
+        for change in changes:
+            etags = {url: self.client.get(url)['ETag'] for url in self.urls}
+            change()
+            for url in self.urls:
+                with self.subTest(url=url):
+                    response = self.client.get(
+                        url, HTTP_IF_NONE_MATCH=etags[url])
+                    self.assertEqual(response.status_code, 200)
+
+    @override_settings(PAGE_CACHE_TIMEOUT=0)
+    def test_comment_changes_invalidate_post_etag(self):
+        """Правка комментария и смена имени его автора меняют ETag."""
+        commenter = User.objects.create_user(username='Commenter')
+        comment = Comment.objects.create(post=self.post, author=commenter,
+                                         text='Первая версия')
+        url = self.urls[3]
+
+        def edit_comment():
+            comment.text = 'Вторая версия'
+            comment.save()
+
+        def rename_author():
+            commenter.username = 'Renamed'
+            commenter.save()
+
+        for change in (edit_comment, rename_author):
+            etag = self.client.get(url)['ETag']
+            change()
+            with self.subTest(change=change.__name__):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+
+    def test_new_post_invalidates_feeds(self):
+        """Новый пост меняет ETag лент и счётчик записей профиля."""
+        urls = self.urls[:3] + self.urls[4:]
+        etags = {url: self.client.get(url)['ETag'] for url in urls}
+        Post.objects.create(text='Новый', author=self.author,
+                            group=self.group)
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(url,
+                                           HTTP_IF_NONE_MATCH=etags[url])
+                self.assertEqual(response.status_code, 200)
+
+    def test_etag_depends_on_user(self):
+        """Другой пользователь не получает чужую страницу из кэша."""
+        url = reverse('posts:index')
+        etag = self.client.get(url)['ETag']
+        other = Client()
+        other.force_login(self.author)
+        for client in (other, Client()):
+            response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+
 
 class ErrorPagesTest(TestCase):
     def setUp(self):
@@ -225,24 +490,256 @@ class PostImagesTests(TestCase):
         self.assertTrue(response.context['post'].image)
 
 
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        small_gif = (b'\x47\x49\x46\x38\x39\x61\x02\x00'
+                     b'\x01\x00\x80\x00\x00\x00\x00\x00'
+                     b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+                     b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+                     b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+                     b'\x0A\x00\x3B')
+        cls.user = User.objects.create_user(username='Photographer')
+        cls.post = Post.objects.create(
+            text='Пост с картинкой',
+            author=cls.user,
+            image=SimpleUploadedFile(name='thumb.gif', content=small_gif,
+                                     content_type='image/gif'))
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+
+    def test_placeholder_until_thumbnail_is_ready(self):
+        """
+        Без готовой миниатюры лента показывает заглушку и ставит
+        построение в очередь, после построения показывает картинку.
+        """
+        with mock.patch('posts.thumbnails.submit') as submit:
+            response = self.guest_client.get(reverse('posts:index'))
+        submit.assert_called_once_with(self.post.pk)
+        self.assertNotContains(response, '<img class="card-img"')
+        thumbnails.generate(self.post.pk)
+        response = self.guest_client.get(reverse('posts:index'))
+        self.assertContains(response, '<img class="card-img"')
+
+    @override_settings(THUMBNAIL_WORKERS=0)
+    def test_failed_thumbnail_is_retried(self):
+        """
+        Карточка с заглушкой кэшируется ненадолго, а после неудачного
+        построения копии не строятся повторно до истечения паузы.
+        """
+        self.assertEqual(thumbnails.card_timeout(self.post),
+                         settings.THUMBNAIL_RETRY_DELAY)
+        with mock.patch('posts.thumbnails.build_renditions',
+                        side_effect=OSError) as build:
+            with self.assertLogs('posts.thumbnails', 'ERROR'):
+                self.guest_client.get(reverse('posts:index'))
+            thumbnails.submit(self.post.pk)
+        build.assert_called_once()
+        # Пауза и короткий кэш карточки истекли: рендер строит копии.
+        cache.clear()
+        self.guest_client.get(reverse('posts:index'))
+        response = self.guest_client.get(reverse('posts:index'))
+        self.assertContains(response, '<img class="card-img"')
+        self.post.refresh_from_db()
+        self.assertEqual(thumbnails.card_timeout(self.post),
+                         thumbnails.CARD_TIMEOUT)
+
+    def test_picture_srcset(self):
+        """Карточка выводит <picture> с srcset из сохранённых копий."""
+        thumbnails.generate(self.post.pk)
+        self.post.refresh_from_db()
+        formats = {item['format']
+                   for item in thumbnails.renditions_for(self.post)['items']}
+        self.assertIn('jpeg', formats)
+        with mock.patch('django.core.files.storage.'
+                        'FileSystemStorage.open') as storage_open:
+            response = self.guest_client.get(reverse('posts:index'))
+        storage_open.assert_not_called()
+        self.assertContains(response, '<picture>')
+        self.assertContains(response, ' 320w')
+
+    def test_new_image_gets_new_rendition_urls(self):
+        """После замены картинки у копий новые URL, старые удалены."""
+        with self.post.image.open('rb') as image:
+            content = image.read()
+        post = Post.objects.create(
+            text='Пост со сменой картинки', author=self.user,
+            image=SimpleUploadedFile(name='first.gif', content=content,
+                                     content_type='image/gif'))
+        thumbnails.generate(post.pk)
+        post.refresh_from_db()
+        old_urls = {item['url']
+                    for item in thumbnails.renditions_for(post)['items']}
+        old_directory = thumbnails.rendition_directory(post.pk,
+                                                       post.image.name)
+        post.image = SimpleUploadedFile(name='second.gif', content=content,
+                                        content_type='image/gif')
+        post.save()
+        thumbnails.generate(post.pk)
+        post.refresh_from_db()
+        new_urls = {item['url']
+                    for item in thumbnails.renditions_for(post)['items']}
+        self.assertFalse(old_urls & new_urls)
+        self.assertEqual(default_storage.listdir(old_directory), ([], []))
+
+    def test_warm_thumbnails_command(self):
+        """Команда warm_thumbnails строит недостающие миниатюры."""
+        call_command('warm_thumbnails', stdout=StringIO())
+        self.post.refresh_from_db()
+        self.assertIsNotNone(thumbnails.renditions_for(self.post))
+
+    def test_warm_thumbnails_counts_failures(self):
+        """Неудачные построения не считаются построенными."""
+        stdout = StringIO()
+        with mock.patch('posts.thumbnails.build_renditions',
+                        side_effect=OSError):
+            with self.assertLogs('posts.thumbnails', 'ERROR'):
+                call_command('warm_thumbnails', stdout=stdout)
+        self.assertIn('Построено: 0', stdout.getvalue())
+        self.assertIn('не удалось: 1', stdout.getvalue())
+
+
 class CacheTest(TestCase):
     def setUp(self):
+        cache.clear()
         self.guest_client = Client()
         self.user = User.objects.create_user(username='TestUser')
         self.post = Post.objects.create(text='Первый пост', author=self.user)
 
-    def test_index_page_cache(self):
-        """Проверка 20 секундной задержи обновления страницы index."""
-        response = self.guest_client.get(reverse('posts:index'))
-        page = response.content
+    def test_new_post_shown_immediately(self):
+        """Новый пост появляется на главной сразу, без ожидания кэша."""
+        self.guest_client.get(reverse('posts:index'))
         Post.objects.create(text='Второй пост', author=self.user)
         response = self.guest_client.get(reverse('posts:index'))
-        cache_page = response.content
-        self.assertEqual(page, cache_page)
-        cache.clear()
+        self.assertContains(response, 'Второй пост')
+
+    def test_post_card_is_cached_by_version(self):
+        """
+        Карточка поста берётся из кэша, пока не изменилась версия поста.
+        """
+        self.guest_client.get(reverse('posts:index'))
+        Post.objects.filter(pk=self.post.pk).update(text='Без сигнала')
+        response = self.guest_client.get(reverse('posts:index'))
+        self.assertContains(response, 'Первый пост')
+        self.post.text = 'Отредактированный пост'
+        self.post.save()
+        response = self.guest_client.get(reverse('posts:index'))
+        self.assertContains(response, 'Отредактированный пост')
+
+    def test_comment_invalidates_post_card(self):
+        """Новый комментарий сразу меняет счётчик на карточке."""
+        self.guest_client.get(reverse('posts:index'))
+        Comment.objects.create(post=self.post, author=self.user,
+                               text='Комментарий')
         response = self.guest_client.get(reverse('posts:index'))
-        page_new_cache = response.content
-        self.assertNotEqual(page, page_new_cache)
+        self.assertContains(response, 'Комментариев: 1')
+
+    def test_author_rename_invalidates_post_card(self):
+        """Смена username автора сбрасывает его карточки."""
+        self.guest_client.get(reverse('posts:index'))
+        self.user.username = 'RenamedUser'
+        self.user.save()
+        response = self.guest_client.get(reverse('posts:index'))
+        self.assertContains(response, '@RenamedUser')
+
+    def test_password_change_keeps_caches(self):
+        """
+        Сохранение пользователя без смены видимых полей (пароль, правка
+        в админке) не сбрасывает ни карточки, ни кэш страниц.
+        """
+        self.user.set_password('new-password')
+        with mock.patch('posts.pagecache.invalidate') as invalidate:
+            self.user.save()
+            self.user.email = 'author@example.com'
+            self.user.save()
+        invalidate.assert_not_called()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.version, 1)
+        self.user.first_name = 'Иван'
+        with mock.patch('posts.pagecache.invalidate') as invalidate:
+            self.user.save()
+        invalidate.assert_called_once()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.version, 1)
+
+
+class PageCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='PageAuthor')
+        self.post = Post.objects.create(text='Пост из кэша',
+                                        author=self.author)
+        self.author_client = Client(enforce_csrf_checks=True)
+        self.author_client.force_login(self.author)
+        self.post_url = reverse('posts:post',
+                                kwargs={'username': 'PageAuthor',
+                                        'post_id': self.post.id})
+
+    def test_invalidated_again_after_commit(self):
+        """
+        Поколение кэша меняется сразу и ещё раз после фиксации:
+        страница, собранная до фиксации из старых строк, не отдаётся.
+        """
+        generation = pagecache.generation()
+        with mock.patch('django.db.transaction.on_commit') as on_commit:
+            Post.objects.create(text='Ещё пост', author=self.author)
+        self.assertEqual(pagecache.generation(), generation + 1)
+        on_commit.assert_called_once_with(pagecache.invalidate,
+                                          using='default')
+
+    def test_cached_page_is_filled_per_user(self):
+        """Страница из кэша получает меню и кнопки текущего пользователя."""
+        response = self.client.get(reverse('posts:index'))
+        self.assertNotContains(response, 'Пользователь: PageAuthor')
+        self.assertNotContains(response, 'Редактировать')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.author_client.get(reverse('posts:index'))
+        self.assertTemplateNotUsed(response, 'posts/index.html')
+        self.assertFalse(any('posts_post' in query['sql']
+                             for query in queries))
+        self.assertContains(response, 'Пользователь: PageAuthor')
+        self.assertContains(response, 'Редактировать')
+        self.assertNotContains(response, '<!--hole:')
+
+    def test_comment_form_from_cache_has_valid_csrf(self):
+        """Форма комментария со страницы из кэша проходит проверку CSRF."""
+        self.client.get(self.post_url)
+        self.author_client.get(self.post_url)
+        response = self.author_client.get(self.post_url)
+        self.assertTemplateNotUsed(response, 'posts/post.html')
+        token = response.context['csrf_token']
+        self.assertContains(response, 'csrfmiddlewaretoken')
+        response = self.author_client.post(
+            self.post_url, {'text': 'Из кэша', 'csrfmiddlewaretoken': token})
+        self.assertEqual(response.status_code, 302)
+        response = self.client.get(self.post_url)
+        self.assertContains(response, 'Из кэша')
+
+    def test_cache_hit_revalidates_without_rendering(self):
+        """Повторный запрос страницы из кэша получает 304 без рендеринга."""
+        self.author_client.get(self.post_url)
+        etag = self.author_client.get(self.post_url)['ETag']
+        response = self.author_client.get(self.post_url,
+                                          HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertFalse(response.templates)
+        response = self.client.get(self.post_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(PAGE_CACHE_TIMEOUT=0)
+    def test_page_cache_can_be_disabled(self):
+        self.client.get(reverse('posts:index'))
+        response = self.client.get(reverse('posts:index'))
+        self.assertTemplateUsed(response, 'posts/index.html')
 
 
 class FollowTest(TestCase):
@@ -310,3 +807,98 @@ class FollowTest(TestCase):
         self.assertEqual(count, 1)
         author = response.context['page'][0].author
         self.assertEqual(author, self.author)
+
+
+class TimelineTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='Reader')
+        self.author = User.objects.create_user(username='Writer')
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def follow_page_posts(self):
+        response = self.authorized_client.get(reverse('posts:follow_index'))
+        return list(response.context['page'])
+
+    def test_follow_backfills_and_unfollow_cleans_timeline(self):
+        """Подписка переносит посты автора в ленту, отписка убирает."""
+        post = Post.objects.create(text='Старый пост', author=self.author)
+        self.authorized_client.get(
+            reverse('posts:profile_follow', kwargs={'username': 'Writer'}))
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.user, post=post).exists())
+        self.assertEqual(self.follow_page_posts(), [post])
+        self.authorized_client.get(
+            reverse('posts:profile_unfollow', kwargs={'username': 'Writer'}))
+        self.assertFalse(TimelineEntry.objects.filter(user=self.user).exists())
+        self.assertEqual(self.follow_page_posts(), [])
+
+    def test_new_post_fans_out(self):
+        """Новый пост попадает в ленты подписчиков."""
+        Follow.objects.create(user=self.user, author=self.author)
+        post = Post.objects.create(text='Новый пост', author=self.author)
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.user, post=post).exists())
+
+    @override_settings(TIMELINE_FANOUT_THRESHOLD=0)
+    def test_heavy_author_is_read_on_demand(self):
+        """Посты авторов выше порога читаются без раскладки по лентам."""
+        Follow.objects.create(user=self.user, author=self.author)
+        post = Post.objects.create(text='Пост звезды', author=self.author)
+        self.assertFalse(TimelineEntry.objects.exists())
+        self.assertEqual(self.follow_page_posts(), [post])
+
+    def test_backfill_of_many_posts(self):
+        """Подписка на автора с сотнями постов укладывается в лимиты БД."""
+        Post.objects.bulk_create(
+            Post(text=f'Пост {number}', author=self.author)
+            for number in range(600))
+        Follow.objects.create(user=self.user, author=self.author)
+        self.assertEqual(TimelineEntry.objects.filter(user=self.user).count(),
+                         600)
+
+    @override_settings(TIMELINE_FANOUT_THRESHOLD=1)
+    def test_author_below_threshold_keeps_posts_in_feed(self):
+        """Посты, вышедшие у «тяжёлого» автора, остаются в ленте,
+        когда он опускается до порога."""
+        other = User.objects.create_user(username='Other')
+        Follow.objects.create(user=self.user, author=self.author)
+        follow = Follow.objects.create(user=other, author=self.author)
+        post = Post.objects.create(text='Пост звезды', author=self.author)
+        self.assertFalse(TimelineEntry.objects.filter(post=post).exists())
+        self.assertEqual(self.follow_page_posts(), [post])
+        follow.delete()
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.user, post=post).exists())
+        self.assertFalse(TimelineEntry.objects.filter(user=other).exists())
+        self.assertEqual(self.follow_page_posts(), [post])
+
+    @override_settings(TIMELINE_FANOUT_THRESHOLD=1)
+    def test_pages_merge_timeline_and_heavy_authors(self):
+        """Страницы по курсору сливают разложенные посты и посты
+        «тяжёлых» авторов без пропусков и повторов."""
+        heavy = User.objects.create_user(username='Star')
+        Follow.objects.create(user=self.user, author=self.author)
+        Follow.objects.create(user=self.user, author=heavy)
+        Follow.objects.create(
+            user=User.objects.create_user(username='Fan'), author=heavy)
+        for number in range(15):
+            Post.objects.create(text=f'Пост {number}',
+                                author=heavy if number % 3 else self.author)
+        expected = list(Post.objects.order_by('-pub_date', '-id'))
+        response = self.authorized_client.get(reverse('posts:follow_index'))
+        first = response.context['page']
+        self.assertEqual(list(first), expected[:10])
+        response = self.authorized_client.get(
+            reverse('posts:follow_index'),
+            {'cursor': first.paginator.next_cursor})
+        second = response.context['page']
+        self.assertEqual(list(second), expected[10:])
+        self.assertFalse(second.has_next())
+        response = self.authorized_client.get(
+            reverse('posts:follow_index'),
+            {'cursor': second.paginator.previous_cursor})
+        self.assertEqual(list(response.context['page']), expected[:10])
+        response = self.authorized_client.get(
+            reverse('posts:follow_index'), {'page': 2})
+        self.assertEqual(list(response.context['page']), expected[10:])
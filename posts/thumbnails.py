@@ -0,0 +1,208 @@
+"""
+Фоновая подготовка картинок постов.
+
+Для каждой картинки строится набор копий (renditions) разной ширины
+в форматах из settings.POST_IMAGE_RENDITIONS. Копии строятся в пуле
+потоков после сохранения поста, а их описание сохраняется
+в Post.image_renditions, поэтому при рендеринге ленты файловая система
+не используется. Пока копий нет, шаблон показывает заглушку, а карточка
+с заглушкой кэшируется ненадолго (settings.THUMBNAIL_RETRY_DELAY): если
+построить копии не удалось, следующий рендер после этого срока попробует
+снова.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from PIL import Image, ImageOps, features
+
+from . import pagecache
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+FORMATS = {
+    'jpeg': ('JPEG', 'image/jpeg', {'quality': 85, 'optimize': True,
+                                    'progressive': True}),
+    'webp': ('WEBP', 'image/webp', {'quality': 80, 'method': 4}),
+}
+
+_executor = None
+_executor_lock = threading.Lock()
+_in_progress = set()
+_in_progress_lock = threading.Lock()
+
+FAILED_KEY = 'thumbnails:failed:{}'
+CARD_TIMEOUT = 60 * 60 * 24
+
+
+def renditions_for(post):
+    """
+    Описание готовых копий картинки поста или None, если копий нет
+    или они построены для другой картинки.
+    """
+    if not post.image or not post.image_renditions:
+        return None
+    renditions = json.loads(post.image_renditions)
+    if renditions.get('source') != post.image.name:
+        return None
+    return renditions
+
+
+def card_timeout(post):
+    """
+    Сколько секунд кэшировать карточку поста: с заглушкой вместо
+    картинки — недолго, чтобы копии построились при следующем рендере.
+    """
+    if post.image and renditions_for(post) is None:
+        return settings.THUMBNAIL_RETRY_DELAY
+    return CARD_TIMEOUT
+
+
+def _formats():
+    formats = settings.POST_IMAGE_RENDITIONS['formats']
+    return [name for name in formats
+            if name != 'webp' or features.check('webp')]
+
+
+def _flatten(image):
+    """Приводит картинку к RGB, подкладывая белый фон под прозрачность."""
+    if image.mode in ('RGBA', 'LA') or 'transparency' in image.info:
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.split()[-1])
+        return background
+    return image.convert('RGB')
+
+
+def rendition_directory(post_id, image_name):
+    """
+    Каталог копий одной картинки поста. Он зависит от имени исходного
+    файла, поэтому после замены картинки у копий новые URL и браузеры
+    с CDN не показывают старые из своего кэша.
+    """
+    digest = hashlib.md5(image_name.encode()).hexdigest()[:12]
+    return os.path.join('posts', 'renditions', str(post_id), digest)
+
+
+def delete_stale_renditions(post_id, image_name):
+    """Удаляет копии прежних картинок поста, кроме копий image_name."""
+    root = os.path.join('posts', 'renditions', str(post_id))
+    keep = os.path.basename(rendition_directory(post_id, image_name))
+    try:
+        directories, files = default_storage.listdir(root)
+    except FileNotFoundError:
+        return
+    # Файлы прямо в каталоге поста остались от прежней схемы путей.
+    stale = [os.path.join(root, name) for name in files]
+    for directory in directories:
+        if directory == keep:
+            continue
+        path = os.path.join(root, directory)
+        stale.extend(os.path.join(path, name)
+                     for name in default_storage.listdir(path)[1])
+    for path in stale:
+        default_storage.delete(path)
+
+
+def build_renditions(post_id, image_name):
+    """Строит копии картинки всех нужных размеров и форматов."""
+    config = settings.POST_IMAGE_RENDITIONS
+    ratio = config['height'] / config['width']
+    widths = sorted(config['widths'])
+    directory = rendition_directory(post_id, image_name)
+    items = []
+    with default_storage.open(image_name) as source_file:
+        source = Image.open(source_file)
+        source.draft('RGB', (widths[-1], round(widths[-1] * ratio)))
+        source = _flatten(ImageOps.exif_transpose(source))
+    for width in widths:
+        if width > source.width and width != widths[0]:
+            break
+        height = round(width * ratio)
+        image = ImageOps.fit(source, (width, height), Image.LANCZOS)
+        for name in _formats():
+            pil_format, mime, options = FORMATS[name]
+            buffer = BytesIO()
+            image.save(buffer, pil_format, **options)
+            path = os.path.join(directory, f'{width}.{name}')
+            default_storage.delete(path)
+            path = default_storage.save(path, ContentFile(buffer.getvalue()))
+            items.append({'width': width, 'height': height, 'format': name,
+                          'type': mime, 'url': default_storage.url(path)})
+    return {'source': image_name, 'items': items}
+
+
+def generate(post_id):
+    """
+    Строит копии картинки поста и сбрасывает кэш его карточки.
+    Возвращает True, если копии построены и сохранены.
+    """
+    try:
+        image = (Post.objects.filter(pk=post_id)
+                 .values_list('image', flat=True).first())
+        if not image:
+            return False
+        renditions = build_renditions(post_id, image)
+        updated = Post.objects.filter(pk=post_id, image=image).update(
+            image_renditions=json.dumps(renditions),
+            version=F('version') + 1,
+        )
+        if updated:
+            delete_stale_renditions(post_id, image)
+        pagecache.invalidate()
+        return bool(updated)
+    except Exception:
+        logger.exception('Не удалось построить копии картинки поста %s',
+                         post_id)
+        cache.set(FAILED_KEY.format(post_id), True,
+                  settings.THUMBNAIL_RETRY_DELAY)
+        return False
+    finally:
+        with _in_progress_lock:
+            _in_progress.discard(post_id)
+        close_old_connections()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.THUMBNAIL_WORKERS,
+                thread_name_prefix='thumbnails',
+            )
+    return _executor
+
+
+def submit(post_id):
+    """
+    Ставит построение копий в пул, если оно ещё не идёт и недавно
+    не завершилось ошибкой.
+    """
+    with _in_progress_lock:
+        if post_id in _in_progress:
+            return
+        if cache.get(FAILED_KEY.format(post_id)):
+            return
+        _in_progress.add(post_id)
+    if settings.THUMBNAIL_WORKERS:
+        get_executor().submit(generate, post_id)
+    else:
+        generate(post_id)
+
+
+def schedule(post):
+    """Ставит построение копий в очередь после фиксации транзакции."""
+    if post.image:
+        transaction.on_commit(lambda: submit(post.pk))
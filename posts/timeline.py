@@ -0,0 +1,193 @@
+"""
+Гибридная лента подписок.
+
+Посты обычных авторов раскладываются по лентам подписчиков при
+публикации (TimelineEntry). Посты авторов, у которых подписчиков больше
+TIMELINE_FANOUT_THRESHOLD, не раскладываются, а подмешиваются при чтении.
+Когда автор опускается до порога, вышедшие за это время посты
+раскладываются по лентам его подписчиков (restore_fan_out).
+"""
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connections, router
+
+from .models import Follow, Post, TimelineEntry, UserStats
+from .paginator import CursorPaginator
+
+BATCH_SIZE = 1000
+# Строк в одном INSERT: SQLite принимает не больше 500 строк
+# и 999 параметров в запросе, а Django 2.2 сам размер пачки не урезает.
+INSERT_BATCH_SIZE = 300
+
+
+def is_heavy_author(author_id):
+    return UserStats.objects.filter(
+        user_id=author_id,
+        followers_count__gt=settings.TIMELINE_FANOUT_THRESHOLD,
+    ).exists()
+
+
+def heavy_authors(author_ids):
+    return set(UserStats.objects.filter(
+        user_id__in=author_ids,
+        followers_count__gt=settings.TIMELINE_FANOUT_THRESHOLD,
+    ).values_list('user_id', flat=True))
+
+
+def fan_out(post):
+    """Добавляет новый пост в ленты подписчиков автора."""
+    if is_heavy_author(post.author_id):
+        return
+    followers = (Follow.objects.filter(author_id=post.author_id)
+                 .exclude(user_id=None)
+                 .values_list('user_id', flat=True)
+                 .iterator(chunk_size=BATCH_SIZE))
+    TimelineEntry.objects.bulk_create(
+        (TimelineEntry(user_id=user_id, post_id=post.pk,
+                       pub_date=post.pub_date)
+         for user_id in followers),
+        batch_size=INSERT_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def fan_out_many(posts):
+    """
+    То же, что fan_out для пачки новых постов: подписчики каждого
+    автора читаются один раз, строки лент пишутся одним bulk_create.
+    """
+    authors = {post.author_id for post in posts}
+    authors -= heavy_authors(authors)
+    followers = defaultdict(list)
+    for author_id, user_id in (Follow.objects.filter(author_id__in=authors)
+                               .exclude(user_id=None)
+                               .values_list('author_id', 'user_id')
+                               .iterator(chunk_size=BATCH_SIZE)):
+        followers[author_id].append(user_id)
+    TimelineEntry.objects.bulk_create(
+        (TimelineEntry(user_id=user_id, post_id=post.pk,
+                       pub_date=post.pub_date)
+         for post in posts for user_id in followers[post.author_id]),
+        batch_size=INSERT_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def backfill(user_id, author_id):
+    """Переносит последние посты автора в ленту нового подписчика."""
+    if user_id is None or author_id is None or is_heavy_author(author_id):
+        return
+    posts = (Post.objects.filter(author_id=author_id)
+             .order_by('-pub_date', '-id')
+             .values_list('pk', 'pub_date')
+             [:settings.TIMELINE_BACKFILL_LIMIT])
+    TimelineEntry.objects.bulk_create(
+        (TimelineEntry(user_id=user_id, post_id=post_id, pub_date=pub_date)
+         for post_id, pub_date in posts),
+        batch_size=INSERT_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def backfill_many(user_id, author_ids):
+    """То же, что backfill для нескольких новых подписок пользователя."""
+    entries = []
+    for author_id in set(author_ids) - heavy_authors(author_ids):
+        posts = (Post.objects.filter(author_id=author_id)
+                 .order_by('-pub_date', '-id')
+                 .values_list('pk', 'pub_date')
+                 [:settings.TIMELINE_BACKFILL_LIMIT])
+        entries.extend(TimelineEntry(user_id=user_id, post_id=post_id,
+                                     pub_date=pub_date)
+                       for post_id, pub_date in posts)
+    TimelineEntry.objects.bulk_create(entries,
+                                      batch_size=INSERT_BATCH_SIZE,
+                                      ignore_conflicts=True)
+
+
+def cleanup(user_id, author_id):
+    """Убирает посты автора из ленты отписавшегося пользователя."""
+    TimelineEntry.objects.filter(user_id=user_id,
+                                 post__author_id=author_id).delete()
+
+
+def restore_fan_out(author_id):
+    """
+    Раскладывает последние посты автора по лентам всех подписчиков, если
+    у него ровно TIMELINE_FANOUT_THRESHOLD подписчиков, то есть он только
+    что перестал быть «тяжёлым»: его посты больше не читаются при
+    открытии ленты, а вышедшие, пока он был выше порога, не разложены.
+    Строки пишутся одним INSERT ... SELECT, без выгрузки в Python.
+    """
+    if not UserStats.objects.filter(
+            user_id=author_id,
+            followers_count=settings.TIMELINE_FANOUT_THRESHOLD).exists():
+        return
+    connection = connections[router.db_for_write(TimelineEntry)]
+    posts = (Post.objects.filter(author_id=author_id)
+             .order_by('-pub_date', '-id').values('id', 'pub_date')
+             [:settings.TIMELINE_BACKFILL_LIMIT])
+    posts_sql, posts_params = posts.query.sql_with_params()
+    entries = connection.ops.quote_name(TimelineEntry._meta.db_table)
+    follows = connection.ops.quote_name(Follow._meta.db_table)
+    sql = (f'{connection.ops.insert_statement(ignore_conflicts=True)} '
+           f'{entries} (user_id, post_id, pub_date) '
+           f'SELECT follow.user_id, post.id, post.pub_date '
+           f'FROM {follows} follow, ({posts_sql}) post '
+           f'WHERE follow.author_id = %s AND follow.user_id IS NOT NULL '
+           f'{connection.ops.ignore_conflicts_suffix_sql(True)}')
+    with connection.cursor() as cursor:
+        cursor.execute(sql, (*posts_params, author_id))
+
+
+def followed_heavy_authors(user):
+    return list(Follow.objects.filter(
+        user=user,
+        author__stats__followers_count__gt=(
+            settings.TIMELINE_FANOUT_THRESHOLD),
+    ).values_list('author_id', flat=True))
+
+
+class TimelinePaginator(CursorPaginator):
+    """
+    Лента подписок пользователя по курсору.
+
+    Ключи страницы читаются из TimelineEntry по индексу
+    (user, pub_date, post), посты каждого «тяжёлого» автора — отдельным
+    запросом по индексу автора, из каждого источника не больше нужного
+    числа строк. Списки сливаются в Python, а посты из TimelineEntry
+    подтягиваются из object_list одним запросом по pk.
+    """
+
+    ENTRY_KEYS = ('pub_date', 'post_id')
+
+    def __init__(self, object_list, per_page, user):
+        self.user = user
+        super().__init__(object_list, per_page)
+
+    def fetch(self, limit, offset=0, position=None, backwards=False):
+        count = offset + limit
+        entries = TimelineEntry.objects.filter(user=self.user)
+        if position is not None:
+            entries = entries.filter(self._seek_filter(
+                position, backwards, keys=self.ENTRY_KEYS))
+        keys = {post_id: (pub_date, post_id) for pub_date, post_id in (
+            entries.order_by(*self.order_keys(self.ENTRY_KEYS, backwards))
+            .values_list(*self.ENTRY_KEYS)[:count])}
+        items = {}
+        for author_id in followed_heavy_authors(self.user):
+            posts = self.object_list.filter(author_id=author_id)
+            if position is not None:
+                posts = posts.filter(self._seek_filter(position, backwards))
+            for item in (posts.order_by(*self.order_keys(
+                    backwards=backwards))[:count]):
+                key = tuple(self._key_value(item, key) for key in self.keys)
+                keys[key[1]] = key
+                items[key[1]] = item
+        page = sorted(keys.values(), reverse=not backwards)[offset:count]
+        missing = [post_id for _, post_id in page if post_id not in items]
+        if missing:
+            items.update((self._key_value(item, 'id'), item)
+                         for item in self.object_list.filter(pk__in=missing))
+        return [items[post_id] for _, post_id in page if post_id in items]
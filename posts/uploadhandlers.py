@@ -0,0 +1,159 @@
+"""
+Потоковая загрузка картинок постов.
+
+Обработчик проверяет размер файла и размеры картинки по мере получения
+данных: заголовок картинки разбирается по первым чанкам, и как только
+лимит превышен, остаток файла отбрасывается, не занимая память и диск.
+После загрузки картинка пересохраняется без EXIF.
+"""
+import os
+from io import BytesIO
+
+from django import forms
+from django.conf import settings
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.core.files.uploadhandler import (FileUploadHandler,
+                                             StopFutureHandlers)
+from django.template.defaultfilters import filesizeformat
+from PIL import Image, ImageOps
+
+# Сигнатуры форматов, которые принимаются для картинок постов.
+SIGNATURES = (
+    (b'\xff\xd8\xff', 'JPEG'),
+    (b'\x89PNG\r\n\x1a\n', 'PNG'),
+    (b'GIF87a', 'GIF'),
+    (b'GIF89a', 'GIF'),
+    (b'RIFF', 'WEBP'),
+)
+# Сколько байт начала файла можно накопить в поисках размеров картинки.
+HEADER_LIMIT = 256 * 1024
+# Форматы, которые пересохраняются как есть: в GIF нет EXIF,
+# а перекодирование потеряло бы анимацию.
+KEEP_AS_IS = ('GIF',)
+
+
+class RejectedUpload(TemporaryUploadedFile):
+    """Пустой файл-заглушка с причиной, по которой загрузка отклонена."""
+
+    def __init__(self, name, content_type, error):
+        super().__init__(name, content_type, 0, None)
+        self.upload_error = error
+
+
+def sniff_format(header):
+    for signature, image_format in SIGNATURES:
+        if header.startswith(signature):
+            if image_format == 'WEBP' and header[8:12] != b'WEBP':
+                return None
+            return image_format
+    return None
+
+
+class ImageUploadHandler(FileUploadHandler):
+    def new_file(self, field_name, *args, **kwargs):
+        super().new_file(field_name, *args, **kwargs)
+        self.activated = field_name in settings.POST_IMAGE_UPLOAD_FIELDS
+        if not self.activated:
+            return
+        self.error = None
+        self.header = b''
+        self.image_format = None
+        self.dimensions = None
+        self.received = 0
+        self.file = TemporaryUploadedFile(self.file_name, self.content_type,
+                                          0, self.charset,
+                                          self.content_type_extra)
+        if (self.content_length
+                and self.content_length > settings.POST_IMAGE_MAX_BYTES):
+            self.reject_too_big()
+        raise StopFutureHandlers()
+
+    def reject_too_big(self):
+        self.error = ('Файл слишком большой, максимальный размер — '
+                      f'{filesizeformat(settings.POST_IMAGE_MAX_BYTES)}.')
+
+    def receive_data_chunk(self, raw_data, start):
+        if not self.activated:
+            return raw_data
+        if self.error:
+            return None
+        self.received += len(raw_data)
+        if self.received > settings.POST_IMAGE_MAX_BYTES:
+            self.reject_too_big()
+            return None
+        if self.dimensions is None:
+            self.inspect_header(raw_data)
+            if self.error:
+                return None
+        self.file.write(raw_data)
+        return None
+
+    def inspect_header(self, raw_data):
+        self.header += raw_data
+        if self.image_format is None:
+            if len(self.header) < 12:
+                return
+            self.image_format = sniff_format(self.header)
+            if self.image_format is None:
+                self.error = forms.ImageField.default_error_messages[
+                    'invalid_image']
+                return
+        try:
+            with Image.open(BytesIO(self.header)) as image:
+                self.dimensions = image.size
+        except (OSError, SyntaxError, ValueError):
+            if len(self.header) > HEADER_LIMIT:
+                self.error = forms.ImageField.default_error_messages[
+                    'invalid_image']
+            return
+        self.header = b''
+        max_width, max_height = settings.POST_IMAGE_MAX_DIMENSIONS
+        width, height = self.dimensions
+        if width > max_width or height > max_height:
+            self.error = ('Изображение слишком большое, максимум — '
+                          f'{max_width}×{max_height} пикселей.')
+
+    def file_complete(self, file_size):
+        if not self.activated:
+            return None
+        if self.error is None and self.image_format is None:
+            self.inspect_header(b'')
+        if self.error is None and self.dimensions is None:
+            self.error = forms.ImageField.default_error_messages[
+                'invalid_image']
+        if self.error:
+            self.file.close()
+            return RejectedUpload(self.file_name, self.content_type,
+                                  self.error)
+        self.file.flush()
+        self.file.seek(0)
+        self.file.size = file_size
+        if self.image_format in KEEP_AS_IS:
+            return self.file
+        try:
+            return self.reencode()
+        except (OSError, SyntaxError, ValueError,
+                Image.DecompressionBombError):
+            return RejectedUpload(self.file_name, self.content_type,
+                                  forms.ImageField.default_error_messages[
+                                      'invalid_image'])
+        finally:
+            self.file.close()
+
+    def reencode(self):
+        """Пересохраняет картинку без EXIF и прочих метаданных."""
+        with Image.open(self.file.temporary_file_path()) as image:
+            image = ImageOps.exif_transpose(image)
+            options = {}
+            if self.image_format == 'JPEG':
+                options = {'quality': 90, 'optimize': True}
+                if image.mode not in ('RGB', 'L', 'CMYK'):
+                    image = image.convert('RGB')
+            cleaned = TemporaryUploadedFile(self.file_name, self.content_type,
+                                            0, self.charset,
+                                            self.content_type_extra)
+            image.save(cleaned.file, self.image_format, **options)
+        cleaned.file.flush()
+        cleaned.size = os.path.getsize(cleaned.temporary_file_path())
+        cleaned.seek(0)
+        return cleaned
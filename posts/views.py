@@ -1,33 +1,72 @@
 from django.contrib.auth import get_user_model
 from django.contrib.auth.decorators import login_required
 from django.core.paginator import Paginator
+from django.db import transaction
 from django.shortcuts import get_object_or_404, redirect, render
+from django.views.decorators.http import condition
 
+from . import thumbnails
+from .etags import context_etag, request_cached
 from .forms import CommentForm, PostForm
-from .models import Follow, Group, Post
+from .models import Comment, Follow, Group, Post, UserStats
+from .pagecache import shared_page
+from .paginator import CursorPaginator
+from .search import search as search_posts
+from .timeline import TimelinePaginator
 
 User = get_user_model()
 
 
+POSTS_PER_PAGE = 10
+COMMENTS_PER_PAGE = 50
+
+
 def page_paginator(request, post_list):
-    paginator = Paginator(post_list, 10)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    paginator = CursorPaginator(post_list, POSTS_PER_PAGE)
+    page = paginator.get_page(request.GET.get('page'),
+                              cursor=request.GET.get('cursor'))
     return page
 
 
+def comment_paginator(request, post):
+    """
+    Страница комментариев по курсору ?comments=. Курсор ищется только
+    по индексу (post, created, id), сами комментарии с авторами
+    подтягиваются вторым запросом по первичным ключам.
+    """
+    paginator = CursorPaginator(post.comments.values('id', 'created'),
+                                COMMENTS_PER_PAGE,
+                                ordering=('created', 'id'))
+    page = paginator.get_page(cursor=request.GET.get('comments'))
+    comments = (Comment.objects.select_related('author')
+                .filter(pk__in=[row['id'] for row in page])
+                .order_by('created', 'id'))
+    return page, comments
+
+
+@request_cached
+def index_context(request):
+    return {'page': page_paginator(request, Post.objects.feed())}
+
+
+@shared_page
+@condition(etag_func=context_etag(index_context))
 def index(request):
-    post_list = Post.objects.all()
-    return render(request, 'posts/index.html',
-                  {'page': page_paginator(request, post_list)})
+    return render(request, 'posts/index.html', index_context(request))
 
 
-def group_posts(request, slug):
+@request_cached
+def group_context(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    post_list = group.posts.all()
-    return render(request, 'posts/group.html',
-                  {'group': group,
-                   'page': page_paginator(request, post_list)})
+    post_list = group.posts.feed()
+    return {'group': group,
+            'page': page_paginator(request, post_list)}
+
+
+@shared_page
+@condition(etag_func=context_etag(group_context))
+def group_posts(request, slug):
+    return render(request, 'posts/group.html', group_context(request, slug))
 
 
 @login_required
@@ -36,51 +75,79 @@ def new_post(request):
     if request.method == 'POST' and form.is_valid():
         post = form.save(commit=False)
         post.author = request.user
-        post.save()
+        with transaction.atomic():
+            post.save()
+            thumbnails.schedule(post)
         return redirect('posts:index')
     return render(request, 'posts/new.html', {'form': form})
 
 
-def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    follower = author.follower.count()
-    following = author.following.count()
-    post_list = author.posts.all()
-    post_count = author.posts.count()
+@request_cached
+def profile_context(request, username):
+    author = get_object_or_404(User.objects.select_related('stats'),
+                               username=username)
+    stats = UserStats.for_user(author)
+    post_list = author.posts.feed()
     current_user = request.user.username
-    context = {'post_count': post_count,
-               'author': author,
-               'follower': follower,
-               'following': following,
-               'current_user': current_user,
-               'page': page_paginator(request, post_list)}
-    return render(request, 'posts/profile.html', context)
+    return {'post_count': stats.posts_count,
+            'author': author,
+            'follower': stats.following_count,
+            'following': stats.followers_count,
+            'current_user': current_user,
+            'page': page_paginator(request, post_list)}
 
 
-def post_view(request, username, post_id):
-    author = User.objects.get(username=username)
-    follower = author.follower.count()
-    following = author.following.count()
-    post_count = author.posts.count()
-    post = get_object_or_404(Post, id=post_id)
-    comments = post.comments.all()
+@shared_page
+@condition(etag_func=context_etag(profile_context))
+def profile(request, username):
+    return render(request, 'posts/profile.html',
+                  profile_context(request, username))
+
+
+@request_cached
+def post_context(request, username, post_id):
+    author = get_object_or_404(User.objects.select_related('stats'),
+                               username=username)
+    stats = UserStats.for_user(author)
+    post = get_object_or_404(Post.objects.feed(), id=post_id)
+    comment_page, comments = comment_paginator(request, post)
     form = CommentForm(request.POST or None)
-    context = {'post_count': post_count,
-               'post': post,
-               'author': author,
-               'follower': follower,
-               'following': following,
-               'comments': comments,
-               'form': form}
+    return {'post_count': stats.posts_count,
+            'post': post,
+            'author': author,
+            'follower': stats.following_count,
+            'following': stats.followers_count,
+            'comments': comments,
+            'comment_page': comment_page,
+            'form': form}
+
+
+@shared_page
+@condition(etag_func=context_etag(post_context))
+def post_view(request, username, post_id):
+    context = post_context(request, username, post_id)
+    form = context['form']
     if request.method == 'POST' and form.is_valid():
         comment = form.save(commit=False)
-        comment.post = post
+        comment.post = context['post']
         comment.author = request.user
-        comment.save()
+        with transaction.atomic():
+            comment.save()
         return redirect('posts:post', username, post_id)
     return render(request, 'posts/post.html', context)
 
 
+def post_comments(request, username, post_id):
+    """Следующая порция комментариев для кнопки «Показать ещё»."""
+    post = get_object_or_404(Post.objects.select_related('author'),
+                             id=post_id, author__username=username)
+    comment_page, comments = comment_paginator(request, post)
+    return render(request, 'posts/comment_list.html',
+                  {'post': post,
+                   'comments': comments,
+                   'comment_page': comment_page})
+
+
 @login_required
 def post_edit(request, username, post_id):
     user = get_object_or_404(User, username=username)
@@ -93,7 +160,10 @@ def post_edit(request, username, post_id):
     if request.method == 'GET':
         return render(request, 'posts/new.html', {'form': form, 'post': post})
     if request.method == 'POST' and form.is_valid():
-        form.save()
+        with transaction.atomic():
+            post = form.save()
+            if 'image' in form.changed_data:
+                thumbnails.schedule(post)
         return redirect('posts:post', username, post_id)
 
 
@@ -105,7 +175,8 @@ def add_comment(request, username, post_id):
         comment = form.save(commit=False)
         comment.post = post
         comment.author = request.user
-        comment.save()
+        with transaction.atomic():
+            comment.save()
         return redirect('posts:post', username, post_id)
     return render(request, 'posts/comments.html', {'form': form})
 
@@ -118,18 +189,38 @@ def server_error(request):
     return render(request, 'misc/500.html', status=500)
 
 
+@request_cached
+def follow_context(request):
+    paginator = TimelinePaginator(Post.objects.feed(), POSTS_PER_PAGE,
+                                  request.user)
+    page = paginator.get_page(request.GET.get('page'),
+                              cursor=request.GET.get('cursor'))
+    return {'page': page}
+
+
 @login_required
+@condition(etag_func=context_etag(follow_context))
 def follow_index(request):
-    post_list = Post.objects.filter(author__following__user=request.user)
-    context = {'page': page_paginator(request, post_list)}
-    return render(request, 'posts/follow.html', context)
+    return render(request, 'posts/follow.html', follow_context(request))
+
+
+def search(request):
+    query = request.GET.get('q', '').strip()
+    paginator = Paginator(search_posts(query), POSTS_PER_PAGE)
+    page = paginator.get_page(request.GET.get('page'))
+    posts = Post.objects.feed().in_bulk(page.object_list)
+    page.object_list = [posts[post_id] for post_id in page.object_list
+                        if post_id in posts]
+    return render(request, 'posts/search.html',
+                  {'query': query, 'page': page})
 
 
 @login_required
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
     if author != request.user:
-        Follow.objects.get_or_create(user=request.user, author=author)
+        with transaction.atomic():
+            Follow.objects.get_or_create(user=request.user, author=author)
         return redirect('posts:profile', username)
     return redirect('posts:profile', username)
 
@@ -137,5 +228,6 @@ def profile_follow(request, username):
 @login_required
 def profile_unfollow(request, username):
     author = get_object_or_404(User, username=username)
-    Follow.objects.filter(user=request.user, author=author).delete()
+    with transaction.atomic():
+        Follow.objects.filter(user=request.user, author=author).delete()
     return redirect('posts:profile', username)
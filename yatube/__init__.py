@@ -0,0 +1,2 @@
+# Подключает обработчик connection_created до первого соединения с БД.
+from . import db  # noqa
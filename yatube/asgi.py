@@ -0,0 +1,182 @@
+"""
+ASGI-точка входа: uvicorn yatube.asgi:application.
+
+В Django 2.2 нет ни ASGIHandler, ни асинхронных представлений, поэтому
+WsgiBridge принимает соединения в цикле событий сервера, а сам Django
+вызывает через обычный WSGI-обработчик в пуле из ASGI_THREADS потоков.
+Медленные клиенты (долгая отправка тела запроса, медленное чтение
+ответа) ждут в цикле событий и поток не занимают: поток берётся только
+на обработку запроса и на выдачу очередного куска ответа. У каждого
+потока пула своё постоянное соединение с БД, как у потоков WSGI-сервера.
+
+Тело запроса копится до вызова Django, поэтому его размер ограничивается
+здесь же (max_body_size): слишком большой запрос получает 413, не дойдя
+ни до диска, ни до проверок загрузки в posts.uploadhandlers.
+"""
+import asyncio
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from tempfile import SpooledTemporaryFile
+
+from django.conf import settings
+from django.core.wsgi import get_wsgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
+
+
+def max_body_size():
+    """
+    Самое большое тело запроса, которое могут пропустить проверки Django:
+    поля формы плюс одна картинка поста. None — без ограничения.
+    """
+    if settings.DATA_UPLOAD_MAX_MEMORY_SIZE is None:
+        return None
+    return settings.DATA_UPLOAD_MAX_MEMORY_SIZE + settings.POST_IMAGE_MAX_BYTES
+
+
+def content_length(scope):
+    for name, value in scope['headers']:
+        if name.lower() == b'content-length':
+            try:
+                return int(value)
+            except ValueError:
+                return None
+    return None
+
+
+class WsgiBridge:
+    """ASGI 3-приложение поверх WSGI-приложения и пула потоков."""
+
+    def __init__(self, application, max_workers):
+        self.application = application
+        self.executor = ThreadPoolExecutor(max_workers,
+                                           thread_name_prefix='asgi')
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self.http(scope, receive, send)
+        else:
+            raise ValueError(f'Неподдерживаемый тип соединения '
+                             f'{scope["type"]}')
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def http(self, scope, receive, send):
+        limit = max_body_size()
+        length = content_length(scope)
+        if limit is not None and length is not None and length > limit:
+            await self.too_large(send)
+            return
+        # Большое тело запроса уходит из памяти во временный файл.
+        body = SpooledTemporaryFile(
+            max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE)
+        try:
+            received = 0
+            while True:
+                message = await receive()
+                if message['type'] == 'http.disconnect':
+                    return
+                chunk = message.get('body', b'')
+                received += len(chunk)
+                if limit is not None and received > limit:
+                    await self.too_large(send)
+                    return
+                body.write(chunk)
+                if not message.get('more_body', False):
+                    break
+            body.seek(0)
+            await self.respond(make_environ(scope, body), send)
+        finally:
+            body.close()
+
+    async def too_large(self, send):
+        await send({'type': 'http.response.start', 'status': 413,
+                    'headers': [(b'content-type',
+                                 b'text/plain; charset=utf-8')]})
+        await send({'type': 'http.response.body',
+                    'body': 'Слишком большой запрос'.encode()})
+
+    async def respond(self, environ, send):
+        loop = asyncio.get_running_loop()
+        response = {}
+
+        def start_response(status, headers, exc_info=None):
+            response['status'] = int(status.split(' ', 1)[0])
+            response['headers'] = [
+                (name.lower().encode('latin-1'), value.encode('latin-1'))
+                for name, value in headers]
+
+        result = await loop.run_in_executor(self.executor, self.application,
+                                            environ, start_response)
+        try:
+            chunks = iter(result)
+            chunk = await loop.run_in_executor(self.executor, next, chunks,
+                                               None)
+            await send({'type': 'http.response.start', **response})
+            while True:
+                following = None
+                if chunk is not None:
+                    following = await loop.run_in_executor(
+                        self.executor, next, chunks, None)
+                await send({'type': 'http.response.body',
+                            'body': chunk or b'',
+                            'more_body': following is not None})
+                if following is None:
+                    break
+                chunk = following
+        finally:
+            close = getattr(result, 'close', None)
+            if close is not None:
+                await loop.run_in_executor(self.executor, close)
+
+
+def wsgi_string(value):
+    """Строка ASGI в «байтовую» строку latin-1, как её ждёт WSGI."""
+    return value.encode().decode('latin-1')
+
+
+def make_environ(scope, body):
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': wsgi_string(scope.get('root_path', '')),
+        'PATH_INFO': wsgi_string(scope['path']),
+        'QUERY_STRING': scope['query_string'].decode('latin-1'),
+        'SERVER_NAME': str(server[0]),
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f'HTTP/{scope["http_version"]}',
+        'REMOTE_ADDR': client[0],
+        'REMOTE_PORT': str(client[1]),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope['headers']:
+        name = name.decode('latin-1').upper().replace('-', '_')
+        if name not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            name = f'HTTP_{name}'
+        value = value.decode('latin-1')
+        if name in environ:
+            value = f'{environ[name]},{value}'
+        environ[name] = value
+    return environ
+
+
+application = WsgiBridge(get_wsgi_application(),
+                         max_workers=settings.ASGI_THREADS)
@@ -0,0 +1,170 @@
+"""
+Кэш-бэкенд со статистикой попаданий, промахов и вытеснений.
+
+Оборачивает настоящий бэкенд, указанный в ``OPTIONS['BACKEND']``.
+Счётчики копятся в памяти процесса и сбрасываются в сам кэш
+(ключи ``__stats__:*``) в конце запроса или каждые FLUSH_EVERY событий,
+поэтому для общих бэкендов (файлы, БД, memcached, redis) команда
+``cache_stats`` видит суммарные числа всех процессов.
+"""
+import threading
+from collections import Counter
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.utils.module_loading import import_string
+
+from .metrics import record_cache
+
+STATS_KEY = '__stats__:{}'
+STATS_FIELDS = ('hits', 'misses', 'evictions')
+FLUSH_EVERY = 100
+
+
+class InstrumentedCache(BaseCache):
+    def __init__(self, location, params):
+        params = dict(params)
+        options = dict(params.get('OPTIONS', {}))
+        backend = options.pop('BACKEND')
+        params['OPTIONS'] = options
+        super().__init__(params)
+        self.backend_name = backend.rsplit('.', 1)[-1]
+        self._cache = import_string(backend)(location, params)
+        self._pending = Counter()
+        self._lock = threading.Lock()
+        cull = getattr(self._cache, '_cull', None)
+        if cull is not None:
+            self._cache._cull = self._counting_cull(cull)
+
+    def _counting_cull(self, cull):
+        def wrapper(*args, **kwargs):
+            before = self._size()
+            result = cull(*args, **kwargs)
+            after = self._size()
+            # _cull вызывается под блокировкой бэкенда (у LocMemCache она
+            # не реентерабельная), поэтому сбрасывать счётчики здесь нельзя.
+            if before is None or after is None:
+                self._record('evictions', flush=False)
+            else:
+                self._record('evictions', max(before - after, 0),
+                             flush=False)
+            return result
+        return wrapper
+
+    def _size(self):
+        if isinstance(self._cache, LocMemCache):
+            return len(self._cache._cache)
+        if isinstance(self._cache, FileBasedCache):
+            return len(self._cache._list_cache_files())
+        return None
+
+    def _record(self, field, amount=1, flush=True):
+        if not amount:
+            return
+        with self._lock:
+            self._pending[field] += amount
+            should_flush = sum(self._pending.values()) >= FLUSH_EVERY
+        if flush and should_flush:
+            self.flush_stats()
+
+    def flush_stats(self):
+        with self._lock:
+            pending, self._pending = self._pending, Counter()
+        for field, amount in pending.items():
+            key = STATS_KEY.format(field)
+            if not self._cache.add(key, amount, timeout=None):
+                try:
+                    self._cache.incr(key, amount)
+                except ValueError:
+                    self._cache.set(key, amount, timeout=None)
+
+    def stats(self):
+        """Суммарные счётчики; evictions дополняются данными сервера."""
+        self.flush_stats()
+        keys = [STATS_KEY.format(field) for field in STATS_FIELDS]
+        stored = self._cache.get_many(keys)
+        result = {field: stored.get(key, 0)
+                  for field, key in zip(STATS_FIELDS, keys)}
+        server_evictions = self._server_evictions()
+        if server_evictions is not None:
+            result['evictions'] = server_evictions
+        return result
+
+    def reset_stats(self):
+        with self._lock:
+            self._pending.clear()
+        self._cache.delete_many(
+            [STATS_KEY.format(field) for field in STATS_FIELDS])
+
+    def _server_evictions(self):
+        """Число вытеснений по данным memcached или redis, если доступно."""
+        client = getattr(self._cache, '_cache', None)
+        if hasattr(client, 'get_stats'):
+            try:
+                return sum(int(stats.get(b'evictions', stats.get(
+                    'evictions', 0))) for _, stats in client.get_stats())
+            except Exception:
+                return None
+        if hasattr(self._cache, 'client'):
+            try:
+                info = self._cache.client.get_client().info('stats')
+                return int(info['evicted_keys'])
+            except Exception:
+                return None
+        return None
+
+    def get(self, key, default=None, version=None):
+        sentinel = object()
+        value = self._cache.get(key, sentinel, version=version)
+        if value is sentinel:
+            self._record('misses')
+            record_cache('miss')
+            return default
+        self._record('hits')
+        record_cache('hit')
+        return value
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        found = self._cache.get_many(keys, version=version)
+        self._record('hits', len(found))
+        self._record('misses', len(keys) - len(found))
+        record_cache('hit', len(found))
+        record_cache('miss', len(keys) - len(found))
+        return found
+
+    def has_key(self, key, version=None):
+        return self._cache.has_key(key, version=version)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        return self._cache.add(key, value, timeout=timeout, version=version)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        return self._cache.set(key, value, timeout=timeout, version=version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        return self._cache.set_many(data, timeout=timeout, version=version)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self._cache.touch(key, timeout=timeout, version=version)
+
+    def delete(self, key, version=None):
+        return self._cache.delete(key, version=version)
+
+    def delete_many(self, keys, version=None):
+        return self._cache.delete_many(keys, version=version)
+
+    def incr(self, key, delta=1, version=None):
+        return self._cache.incr(key, delta=delta, version=version)
+
+    def decr(self, key, delta=1, version=None):
+        return self._cache.decr(key, delta=delta, version=version)
+
+    def clear(self):
+        return self._cache.clear()
+
+    def close(self, **kwargs):
+        if self._pending:
+            self.flush_stats()
+        return self._cache.close(**kwargs)
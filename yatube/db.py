@@ -0,0 +1,104 @@
+"""
+Постоянные соединения с БД и чтение лент с реплики.
+
+DatabaseMiddleware в начале запроса проверяет оставшиеся открытыми
+соединения (CONN_MAX_AGE) и закрывает мёртвые, чтобы запрос не упал
+на соединении, которое сервер БД уже разорвал.
+
+Если настроен алиас REPLICA, GET-запросы к представлениям из
+DATABASE_REPLICA_VIEWS читают с него, а все записи и остальные чтения
+идут в основную БД. После любого успешного изменяющего запроса
+(новый пост, комментарий, подписка, вход) посетитель получает куку
+STICKY_COOKIE на DATABASE_REPLICA_LAG секунд и до её истечения читает
+только из основной БД — так он сразу видит свои изменения, даже если
+реплика отстаёт.
+
+Каждое новое соединение с SQLite настраивается прагмами из
+SQLITE_PRAGMAS: в режиме WAL запись комментария не блокирует читателей.
+"""
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+REPLICA = 'replica'
+STICKY_COOKIE = 'read_primary'
+# Сессии читаются сразу после записи, поэтому всегда из основной БД.
+PRIMARY_ONLY_APPS = {'sessions'}
+
+_read_alias = ContextVar('read_alias', default=DEFAULT_DB_ALIAS)
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            return instance._state.db
+        if model._meta.app_label in PRIMARY_ONLY_APPS:
+            return DEFAULT_DB_ALIAS
+        return _read_alias.get()
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # На реплике те же данные, что и в основной БД.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+@receiver(connection_created)
+def set_sqlite_pragmas(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for name, value in settings.SQLITE_PRAGMAS.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+def check_connections():
+    """Закрывает постоянные соединения, которые перестали отвечать."""
+    for connection in connections.all():
+        if (connection.connection is not None
+                and connection.settings_dict['CONN_MAX_AGE']
+                and not connection.is_usable()):
+            connection.close()
+
+
+def use_replica(request):
+    return (REPLICA in connections.databases
+            and request.method in ('GET', 'HEAD')
+            and STICKY_COOKIE not in request.COOKIES
+            and request.resolver_match is not None
+            and request.resolver_match.view_name
+            in settings.DATABASE_REPLICA_VIEWS)
+
+
+class DatabaseMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if settings.DATABASE_HEALTH_CHECKS:
+            check_connections()
+        try:
+            response = self.get_response(request)
+        finally:
+            token = request.__dict__.pop('_read_alias_token', None)
+            if token is not None:
+                _read_alias.reset(token)
+        if (request.method not in ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+                and response.status_code < 400
+                and REPLICA in connections.databases):
+            response.set_cookie(STICKY_COOKIE, '1',
+                                max_age=settings.DATABASE_REPLICA_LAG,
+                                httponly=True, samesite='Lax')
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if use_replica(request):
+            request._read_alias_token = _read_alias.set(REPLICA)
@@ -0,0 +1,202 @@
+"""
+Метрики запросов в формате Prometheus.
+
+MetricsMiddleware считает все запросы по представлениям, а для доли
+METRICS_SAMPLE_RATE из них замеряет время ответа, число и время
+SQL-запросов, время рендеринга шаблонов, попадания и промахи кэша
+(их сообщает yatube.cache.InstrumentedCache). Остальные запросы
+проходят почти без накладных расходов, поэтому цена замеров делится
+на долю выборки. Метрики копятся в памяти процесса, каждый процесс
+отдаёт свои по адресу /metrics.
+"""
+import random
+import threading
+import time
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.db import connections
+from django.http import HttpResponse
+from django.template.backends.django import Template
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+_current = ContextVar('request_metrics', default=None)
+_lock = threading.Lock()
+
+
+def format_labels(names, values):
+    return ','.join(f'{name}="{value}"' for name, value in zip(names, values))
+
+
+class Counter:
+    def __init__(self, name, documentation, labels=('view',)):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.values = {}
+
+    def inc(self, *labels, amount=1):
+        with _lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def clear(self):
+        self.values.clear()
+
+    def render(self):
+        yield f'# HELP {self.name} {self.documentation}'
+        yield f'# TYPE {self.name} counter'
+        for labels, value in sorted(self.values.items()):
+            labels = format_labels(self.labels, labels)
+            yield f'{self.name}{{{labels}}} {value}'
+
+
+class Histogram:
+    def __init__(self, name, documentation, buckets):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = buckets
+        # view: [счётчики корзин..., сумма, число наблюдений]
+        self.series = {}
+
+    def observe(self, view, value):
+        with _lock:
+            series = self.series.setdefault(
+                view, [0] * (len(self.buckets) + 2))
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def clear(self):
+        self.series.clear()
+
+    def render(self):
+        yield f'# HELP {self.name} {self.documentation}'
+        yield f'# TYPE {self.name} histogram'
+        for view, series in sorted(self.series.items()):
+            *counts, total, count = series
+            for bound, bucket in zip(self.buckets + ('+Inf',),
+                                     counts + [count]):
+                yield (f'{self.name}_bucket{{view="{view}",le="{bound}"}} '
+                       f'{bucket}')
+            yield f'{self.name}_sum{{view="{view}"}} {total}'
+            yield f'{self.name}_count{{view="{view}"}} {count}'
+
+
+REQUESTS = Counter('yatube_requests_total', 'Все запросы.')
+DURATION = Histogram('yatube_request_duration_seconds',
+                     'Время ответа (выборка).', DURATION_BUCKETS)
+QUERIES = Histogram('yatube_db_queries',
+                    'SQL-запросов на ответ (выборка).', QUERY_BUCKETS)
+DB_DURATION = Histogram('yatube_db_duration_seconds',
+                        'Время SQL-запросов на ответ (выборка).',
+                        DURATION_BUCKETS)
+TEMPLATE_DURATION = Histogram('yatube_template_duration_seconds',
+                              'Время рендеринга шаблонов (выборка).',
+                              DURATION_BUCKETS)
+CACHE = Counter('yatube_cache_requests_total',
+                'Обращения к кэшу (выборка).', ('view', 'result'))
+METRICS = (REQUESTS, DURATION, QUERIES, DB_DURATION, TEMPLATE_DURATION,
+           CACHE)
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.rendering = False
+        self.cache = {'hit': 0, 'miss': 0}
+
+    def __call__(self, execute, sql, params, many, context):
+        """execute_wrapper: считает SQL-запросы и их время."""
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+            self.queries += 1
+
+
+def record_cache(result, amount=1):
+    """Попадания ('hit') и промахи ('miss') кэша в текущем запросе."""
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.cache[result] += amount
+
+
+def timed_render(render):
+    def wrapper(self, *args, **kwargs):
+        metrics = _current.get()
+        if metrics is None or metrics.rendering:
+            return render(self, *args, **kwargs)
+        metrics.rendering = True
+        started = time.perf_counter()
+        try:
+            return render(self, *args, **kwargs)
+        finally:
+            metrics.template_time += time.perf_counter() - started
+            metrics.rendering = False
+    wrapper.timed = True
+    return wrapper
+
+
+def view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match is not None else 'unresolved'
+
+
+class MetricsMiddleware:
+    """Должен стоять первым, чтобы время включало остальные middleware."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if not getattr(Template.render, 'timed', False):
+            Template.render = timed_render(Template.render)
+
+    def __call__(self, request):
+        if random.random() >= settings.METRICS_SAMPLE_RATE:
+            response = self.get_response(request)
+            REQUESTS.inc(view_name(request))
+            return response
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(metrics))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.observe(view_name(request), time.perf_counter() - started,
+                     metrics)
+        return response
+
+    def observe(self, view, duration, metrics):
+        REQUESTS.inc(view)
+        DURATION.observe(view, duration)
+        QUERIES.observe(view, metrics.queries)
+        DB_DURATION.observe(view, metrics.db_time)
+        TEMPLATE_DURATION.observe(view, metrics.template_time)
+        for result, amount in metrics.cache.items():
+            if amount:
+                CACHE.inc(view, result, amount=amount)
+
+
+def metrics_view(request):
+    if request.META.get('REMOTE_ADDR') not in settings.METRICS_ALLOWED_IPS:
+        raise PermissionDenied
+    lines = ['# HELP yatube_metrics_sample_rate Доля замеряемых запросов.',
+             '# TYPE yatube_metrics_sample_rate gauge',
+             f'yatube_metrics_sample_rate {settings.METRICS_SAMPLE_RATE}']
+    with _lock:
+        for metric in METRICS:
+            lines.extend(metric.render())
+    return HttpResponse('\n'.join(lines) + '\n',
+                        content_type='text/plain; version=0.0.4')
@@ -0,0 +1,72 @@
+"""
+Плагин pytest: тест падает, если в одном запросе к сайту один и тот же
+SQL-запрос повторился --max-duplicate-queries раз — типичный N+1.
+Считаются только запросы между request_started и request_finished,
+поэтому подготовка данных в фикстурах, setUp и теле теста не мешает.
+
+    pytest -p yatube.pytest_plugin --max-duplicate-queries=3
+
+Тестам, которым повторы нужны, ставится метка allow_duplicate_queries.
+"""
+import pytest
+
+from .querydetector import QueryRecorder
+
+
+def pytest_addoption(parser):
+    parser.addoption('--max-duplicate-queries', type=int, default=3,
+                     help='сколько одинаковых запросов уже считать N+1')
+
+
+def pytest_configure(config):
+    config.addinivalue_line(
+        'markers', 'allow_duplicate_queries: не проверять тест на N+1')
+
+
+class RequestQueryRecorder(QueryRecorder):
+    """Запоминает повторы по каждому запросу к сайту отдельно."""
+
+    def __init__(self, threshold):
+        super().__init__()
+        self.threshold = threshold
+        self.active = False
+        self.problems = []
+
+    def __call__(self, execute, sql, params, many, context):
+        if not self.active:
+            return execute(sql, params, many, context)
+        return super().__call__(execute, sql, params, many, context)
+
+    def request_started(self, **kwargs):
+        self.reset()
+        self.active = True
+
+    def request_finished(self, **kwargs):
+        if self.active:
+            duplicates = self.duplicates(self.threshold)
+            if duplicates:
+                self.problems.append(self.report(duplicates))
+        self.active = False
+        self.reset()
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_call(item):
+    if item.get_closest_marker('allow_duplicate_queries'):
+        yield
+        return
+    from django.core.signals import request_finished, request_started
+
+    recorder = RequestQueryRecorder(
+        item.config.getoption('max_duplicate_queries'))
+    request_started.connect(recorder.request_started)
+    request_finished.connect(recorder.request_finished)
+    try:
+        with recorder:
+            outcome = yield
+    finally:
+        request_started.disconnect(recorder.request_started)
+        request_finished.disconnect(recorder.request_finished)
+    if recorder.problems and outcome.excinfo is None:
+        pytest.fail('Повторяющиеся запросы:\n'
+                    + '\n'.join(recorder.problems), pytrace=False)
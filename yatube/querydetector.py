@@ -0,0 +1,151 @@
+"""
+Поиск повторяющихся и медленных SQL-запросов.
+
+QueryRecorder оборачивает курсоры всех соединений и группирует запросы
+по нормализованному SQL (параметры, числа и списки IN заменены на ?).
+Для первых двух запросов каждой группы запоминается стек: строки кода
+проекта и шаблоны со строкой тега, из которых пришёл запрос.
+
+QueryDetectorMiddleware включается настройкой QUERY_DETECTOR и пишет
+в лог yatube.queries предупреждение, если в ответе один и тот же запрос
+повторился QUERY_DETECTOR_DUPLICATES раз или все запросы заняли больше
+QUERY_DETECTOR_TIME_MS. Для тестов есть плагин yatube.pytest_plugin.
+"""
+import logging
+import os
+import re
+import time
+import traceback
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.template.base import Node
+
+logger = logging.getLogger('yatube.queries')
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STACK_DEPTH = 8
+IGNORED_DIRS = (os.path.dirname(os.__file__), os.sep + 'site-packages')
+# Служебные запросы транзакций не считаются повторами.
+IGNORED_STATEMENTS = ('SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK',
+                      'BEGIN', 'COMMIT', 'PRAGMA')
+NORMALIZE = (
+    (re.compile(r"'(?:[^']|'')*'"), '?'),
+    (re.compile(r'\b\d+\b'), '?'),
+    (re.compile(r'%s'), '?'),
+    (re.compile(r'\(\?(?:, \?)+\)'), '(...)'),
+    (re.compile(r'\s+'), ' '),
+)
+
+
+def normalize(sql):
+    for pattern, replacement in NORMALIZE:
+        sql = pattern.sub(replacement, sql)
+    return sql.strip()
+
+
+def query_stack():
+    """Откуда пришёл запрос: код проекта и теги шаблонов, снизу вверх."""
+    stack = []
+    for frame, lineno in traceback.walk_stack(None):
+        filename = frame.f_code.co_filename
+        node = frame.f_locals.get('self')
+        if (frame.f_code.co_name == 'render_annotated'
+                and isinstance(node, Node) and node.token is not None):
+            line = f'{node.origin.template_name}:{node.token.lineno}'
+        elif (filename.startswith(PROJECT_DIR)
+              and not any(part in filename for part in IGNORED_DIRS)
+              and filename != __file__):
+            line = (f'{os.path.relpath(filename, PROJECT_DIR)}:{lineno} '
+                    f'in {frame.f_code.co_name}')
+        else:
+            continue
+        if not stack or stack[-1] != line:
+            stack.append(line)
+    return stack[:STACK_DEPTH]
+
+
+class QueryGroup:
+    def __init__(self, sql):
+        self.sql = sql
+        self.count = 0
+        self.duration = 0.0
+        self.stacks = []
+
+
+class QueryRecorder:
+    """Контекстный менеджер, собирающий запросы всех соединений."""
+
+    def __init__(self):
+        self.groups = {}
+
+    def __enter__(self):
+        self._stack = ExitStack()
+        for connection in connections.all():
+            self._stack.enter_context(connection.execute_wrapper(self))
+        return self
+
+    def __exit__(self, *exc_info):
+        return self._stack.__exit__(*exc_info)
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            if not sql.lstrip().upper().startswith(IGNORED_STATEMENTS):
+                key = normalize(sql)
+                group = self.groups.setdefault(key, QueryGroup(key))
+                group.count += 1
+                group.duration += duration
+                if len(group.stacks) < 2:
+                    group.stacks.append(query_stack())
+
+    def reset(self):
+        self.groups = {}
+
+    @property
+    def count(self):
+        return sum(group.count for group in self.groups.values())
+
+    @property
+    def duration(self):
+        return sum(group.duration for group in self.groups.values())
+
+    def duplicates(self, threshold):
+        return sorted((group for group in self.groups.values()
+                       if group.count >= threshold),
+                      key=lambda group: -group.count)
+
+    def report(self, groups):
+        lines = [f'{self.count} запросов за {self.duration * 1000:.1f} мс']
+        for group in groups:
+            lines.append(f'{group.count}× {group.duration * 1000:.1f} мс '
+                         f'{group.sql}')
+            lines.extend(f'    {line}' for line in group.stacks[-1])
+        return '\n'.join(lines)
+
+
+class QueryDetectorMiddleware:
+    def __init__(self, get_response):
+        if not settings.QUERY_DETECTOR:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with QueryRecorder() as recorder:
+            response = self.get_response(request)
+        duplicates = recorder.duplicates(settings.QUERY_DETECTOR_DUPLICATES)
+        too_slow = (recorder.duration * 1000
+                    >= settings.QUERY_DETECTOR_TIME_MS)
+        if duplicates or too_slow:
+            match = request.resolver_match
+            view = match.view_name if match is not None else request.path
+            slowest = sorted(recorder.groups.values(),
+                             key=lambda group: -group.duration)[:3]
+            logger.warning('%s %s: %s', request.method, view,
+                           recorder.report(duplicates or slowest))
+        return response
@@ -47,20 +47,27 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'sorl.thumbnail',
-    'debug_toolbar',
 ]
 
 MIDDLEWARE = [
+    'yatube.metrics.MetricsMiddleware',
+    'yatube.querydetector.QueryDetectorMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'yatube.db.DatabaseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
+    'posts.pagecache.PageCacheMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'debug_toolbar.middleware.DebugToolbarMiddleware',
 ]
 
+# The toolbar is for local profiling only; production uses /metrics.
+if DEBUG:
+    INSTALLED_APPS.append('debug_toolbar')
+    MIDDLEWARE.append('debug_toolbar.middleware.DebugToolbarMiddleware')
+
 ROOT_URLCONF = 'yatube.urls'
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
 TEMPLATES = [
@@ -81,17 +88,76 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'yatube.wsgi.application'
+# yatube.asgi runs Django in a pool of this many threads.
+ASGI_THREADS = int(os.environ.get('ASGI_THREADS', 10))
 
 
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
 
+# DB_ENGINE selects one of DB_ENGINES. Connections are kept open for
+# DB_CONN_MAX_AGE seconds and checked at the start of every request by
+# yatube.db.DatabaseMiddleware. Setting DB_REPLICA_NAME adds a 'replica'
+# alias: GET requests to DATABASE_REPLICA_VIEWS read from it, everything
+# else goes to the primary, and so does every visitor who has written
+# something in the last DATABASE_REPLICA_LAG seconds.
+DB_ENGINES = {
+    'sqlite': 'django.db.backends.sqlite3',
+    'postgresql': 'django.db.backends.postgresql',
+    'mysql': 'django.db.backends.mysql',
+}
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'ENGINE': DB_ENGINES[os.environ.get('DB_ENGINE', 'sqlite')],
+        'NAME': os.environ.get('DB_NAME',
+                               os.path.join(BASE_DIR, 'db.sqlite3')),
+        'USER': os.environ.get('DB_USER', ''),
+        'PASSWORD': os.environ.get('DB_PASSWORD', ''),
+        'HOST': os.environ.get('DB_HOST', ''),
+        'PORT': os.environ.get('DB_PORT', ''),
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 60)),
     }
 }
+if os.environ.get('DB_REPLICA_NAME'):
+    DATABASES['replica'] = dict(
+        DATABASES['default'],
+        NAME=os.environ['DB_REPLICA_NAME'],
+        HOST=os.environ.get('DB_REPLICA_HOST', DATABASES['default']['HOST']),
+        PORT=os.environ.get('DB_REPLICA_PORT', DATABASES['default']['PORT']),
+        TEST={'MIRROR': 'default'},
+    )
+
+# Applied to every new SQLite connection by yatube.db. In WAL mode readers
+# are not blocked by a writer; synchronous=NORMAL is durable enough for WAL
+# (only the last commits may be lost on power failure); cache_size is in
+# KiB when negative; busy_timeout is in milliseconds.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'busy_timeout': 5000,
+    'cache_size': -20000,
+    'mmap_size': 256 * 1024 * 1024,
+}
+
+DATABASE_ROUTERS = ['yatube.db.PrimaryReplicaRouter']
+DATABASE_HEALTH_CHECKS = os.environ.get('DB_HEALTH_CHECKS', '1') == '1'
+DATABASE_REPLICA_LAG = int(os.environ.get('DB_REPLICA_LAG', 5))
+DATABASE_REPLICA_VIEWS = [
+    'posts:index',
+    'posts:group_posts',
+    'posts:profile',
+    'posts:post',
+    'posts:post_comments',
+    'posts:follow_index',
+    'posts:search',
+    'api:posts',
+    'api:post',
+    'api:comments',
+    'api:group_posts',
+    'api:profile',
+    'api:follow_posts',
+]
 
 
 # Password validation
@@ -144,12 +210,91 @@ LOGIN_REDIRECT_URL = 'posts:index'
 EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
+# Cache
+# CACHE_BACKEND selects one of CACHE_BACKENDS; the real backend is wrapped
+# by yatube.cache.InstrumentedCache, which collects hit/miss/eviction stats
+# (see `manage.py cache_stats`). Bump CACHE_VERSION to drop all old keys.
+CACHE_BACKENDS = {
+    'locmem': ('django.core.cache.backends.locmem.LocMemCache', ''),
+    'file': ('django.core.cache.backends.filebased.FileBasedCache',
+             os.path.join(BASE_DIR, 'cache')),
+    'db': ('django.core.cache.backends.db.DatabaseCache', 'yatube_cache'),
+    'memcached': ('django.core.cache.backends.memcached.MemcachedCache',
+                  '127.0.0.1:11211'),
+    'pylibmc': ('django.core.cache.backends.memcached.PyLibMCCache',
+                '127.0.0.1:11211'),
+    # Requires the optional django-redis package.
+    'redis': ('django_redis.cache.RedisCache', 'redis://127.0.0.1:6379/1'),
+}
+CACHE_BACKEND, CACHE_DEFAULT_LOCATION = CACHE_BACKENDS[
+    os.environ.get('CACHE_BACKEND', 'locmem')]
+
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'yatube.cache.InstrumentedCache',
+        'LOCATION': os.environ.get('CACHE_LOCATION', CACHE_DEFAULT_LOCATION),
+        'KEY_PREFIX': os.environ.get('CACHE_KEY_PREFIX', 'yatube'),
+        'VERSION': int(os.environ.get('CACHE_VERSION', 1)),
+        'TIMEOUT': int(os.environ.get('CACHE_TIMEOUT', 300)),
+        'OPTIONS': {
+            'BACKEND': CACHE_BACKEND,
+        },
     }
 }
 
 INTERNAL_IPS = [
     '127.0.0.1',
 ]
+
+# Request metrics (yatube.metrics): every request is counted, this share
+# of them is timed in detail. /metrics answers only to these addresses.
+METRICS_SAMPLE_RATE = float(os.environ.get('METRICS_SAMPLE_RATE', 0.05))
+METRICS_ALLOWED_IPS = (INTERNAL_IPS
+                       + os.environ.get('METRICS_ALLOWED_IPS', '').split())
+
+# Query detector (yatube.querydetector), off by default: logs to
+# 'yatube.queries' every response that repeats one SQL query
+# QUERY_DETECTOR_DUPLICATES times or spends QUERY_DETECTOR_TIME_MS in SQL.
+QUERY_DETECTOR = os.environ.get('QUERY_DETECTOR', '0') == '1'
+QUERY_DETECTOR_DUPLICATES = 3
+QUERY_DETECTOR_TIME_MS = 100
+
+# Follow timeline
+# Posts of authors with more followers than the threshold are not fanned
+# out on write; follow_index reads them directly instead.
+TIMELINE_FANOUT_THRESHOLD = 1000
+# How many recent posts of an author are copied into a new follower's feed.
+TIMELINE_BACKFILL_LIMIT = 1000
+
+# Shared page cache (posts.pagecache): how long index, group, profile
+# and post pages are kept; 0 disables it.
+PAGE_CACHE_TIMEOUT = int(os.environ.get('PAGE_CACHE_TIMEOUT', 600))
+
+# Search
+# Only this many best matches are ranked and paginated.
+SEARCH_MAX_RESULTS = 1000
+
+# Post images
+# Renditions built in the background for every post image: the card's
+# width x height crop scaled to each width, in every format.
+POST_IMAGE_RENDITIONS = {
+    'width': 960,
+    'height': 339,
+    'widths': (320, 640, 960, 1920),
+    'formats': ('webp', 'jpeg'),
+}
+# Upload limits, enforced by posts.uploadhandlers.ImageUploadHandler while
+# the file is still streaming in.
+POST_IMAGE_UPLOAD_FIELDS = ('image',)
+POST_IMAGE_MAX_BYTES = 10 * 1024 * 1024
+POST_IMAGE_MAX_DIMENSIONS = (8000, 8000)
+FILE_UPLOAD_HANDLERS = [
+    'posts.uploadhandlers.ImageUploadHandler',
+    'django.core.files.uploadhandler.MemoryFileUploadHandler',
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+# Size of the thumbnail worker pool; 0 builds thumbnails synchronously.
+THUMBNAIL_WORKERS = int(os.environ.get('THUMBNAIL_WORKERS', 2))
+# Seconds a post card with a thumbnail placeholder stays cached, and how long
+# a failed thumbnail build waits before the next render retries it.
+THUMBNAIL_RETRY_DELAY = int(os.environ.get('THUMBNAIL_RETRY_DELAY', 300))